@@ -1,10 +1,17 @@
 from io import StringIO
 from typing import Any
 
-from xdsl.ir import Operation
+import z3
+from xdsl.dialects.builtin import Builtin, ModuleOp
+from xdsl.dialects.irdl import IRDL
+from xdsl.dialects.pdl import PDL
+from xdsl.ir import MLContext, Operation
+from xdsl.parser import Parser
 from xdsl.printer import Printer
 from xdsl.utils.diagnostic import Diagnostic
 
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, IRDLExtension
+
 
 def assert_print_op(
     operation: Operation,
@@ -63,3 +70,34 @@ def assert_print_op(
 
     printer.print(operation)
     assert file.getvalue().strip() == expected.strip()
+
+
+def parse(program: str) -> ModuleOp:
+    """Parse a module using the builtin, IRDL, IRDL extension and PDL dialects."""
+    ctx = MLContext()
+    ctx.load_dialect(Builtin)
+    ctx.load_dialect(IRDL)
+    ctx.load_dialect(IRDLExtension)
+    ctx.load_dialect(PDL)
+    module = Parser(ctx, program).parse_module()
+    assert isinstance(module, ModuleOp)
+    return module
+
+
+def parse_check_subset(program: str) -> CheckSubsetOp:
+    """Parse a module, and get its last operation, an `irdl_ext.check_subset`."""
+    module = parse(program)
+    assert isinstance(check_subset := module.ops.last, CheckSubsetOp)
+    return check_subset
+
+
+def create_solver(*constraints: z3.BoolRef) -> z3.Solver:
+    """Create a solver asserting the given constraints."""
+    solver = z3.Solver()
+    solver.add(*constraints)
+    return solver
+
+
+def query(*constraints: z3.BoolRef) -> str:
+    """Get the SMT-LIB2 query asserting the given constraints."""
+    return create_solver(*constraints).to_smt2()
@@ -1,4 +1,6 @@
 // RUN: analyze-irdl-invariants %s %S/arith.irdl | filecheck %s
+// RUN: analyze-irdl-invariants %s %S/arith.irdl --encoding quantifier-free | filecheck %s
+// RUN: rm -rf %t && analyze-irdl-invariants %s %S/arith.irdl --cache-dir %t --no-fast-path --no-base-analysis > /dev/null && analyze-irdl-invariants %s %S/arith.irdl --cache-dir %t --no-fast-path --no-base-analysis --debug | filecheck %s --check-prefix=CACHED
 
 pdl.pattern @AddIAddConstant : benefit(0) {
     %type = pdl.type
@@ -28,4 +30,6 @@ pdl.pattern @AddIAddConstant : benefit(0) {
     }
 }
 
-// CHECK: PDL rewrite will not break IRDL invariants
\ No newline at end of file
+// CHECK: PDL rewrite will not break IRDL invariants
+// CACHED:      Using cached verdict
+// CACHED:      PDL rewrite will not break IRDL invariants
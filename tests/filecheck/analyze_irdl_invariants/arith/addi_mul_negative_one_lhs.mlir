@@ -1,4 +1,5 @@
 // RUN: analyze-irdl-invariants %s %S/arith.irdl | filecheck %s
+// RUN: analyze-irdl-invariants %s %S/arith.irdl -j 2 | filecheck %s
 
 // addi(muli(x, -1), y) -> subi(y, x)
 pdl.pattern @AddIMulNegativeOneLhs : benefit(0) {
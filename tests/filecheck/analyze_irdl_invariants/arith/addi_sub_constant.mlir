@@ -1,4 +1,5 @@
 // RUN: analyze-irdl-invariants %s %S/arith.irdl | filecheck %s
+// RUN: analyze-irdl-invariants %s %S/arith.irdl --incremental | filecheck %s
 
 // addi(subi(c0, x), c1) -> addi(c0 + c1, x)
 pdl.pattern @AddISubConstantLHS : benefit(0) {
@@ -1,4 +1,5 @@
 // RUN: analyze-irdl-invariants %s %S/arith.irdl | filecheck %s
+// RUN: analyze-irdl-invariants %s %S/arith.irdl --backend external --no-fast-path | filecheck %s
 
 // and extsi(x), extsi(y) -> extsi(and(x,y))
 pdl.pattern @AndOfExtSI : benefit(0) {
@@ -21,4 +21,4 @@ irdl_ext.check_subset {
   irdl_ext.yield %int1, %int2
 }
 
-// CHECK: lhs is a subset of rhs
+// CHECK: unsat: lhs is a subset of rhs
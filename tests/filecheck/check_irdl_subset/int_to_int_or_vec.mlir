@@ -29,4 +29,4 @@ irdl_ext.check_subset {
   irdl_ext.yield %res
 }
 
-// CHECK: lhs is a subset of rhs
+// CHECK: unsat: lhs is a subset of rhs
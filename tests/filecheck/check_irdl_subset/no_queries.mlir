@@ -0,0 +1,11 @@
+// RUN: not test-check-irdl-subset %s 2>&1 | filecheck %s
+
+// A file without queries is reported as an error
+
+irdl.dialect @builtin {
+  irdl.type @index {
+    irdl.parameters()
+  }
+}
+
+// CHECK: error: the input has no irdl_ext.check_subset operation
@@ -21,4 +21,4 @@ irdl_ext.check_subset {
   irdl_ext.yield %int, %int
 }
 
-// CHECK: lhs is not a subset of rhs
+// CHECK: sat: lhs is not a subset of rhs
@@ -80,10 +80,10 @@ pdl.pattern @MulSIExtendedRHSOne : benefit(0) {
 }
 
 // CHECK:  irdl_ext.check_subset {
-// CHECK-NEXT:    %match_root_index = irdl.parametric @builtin::@index<>
+// CHECK-NEXT:    %match_one_op_index = irdl.parametric @builtin::@index<>
 // CHECK-NEXT:    %0 = irdl.base "#int" {"base_name" = "#int"}
 // CHECK-NEXT:    %match_root_integer = irdl.parametric @builtin::@integer_type<%0>
-// CHECK-NEXT:    %match_root_t = irdl.any_of(%match_root_index, %match_root_integer)
+// CHECK-NEXT:    %match_root_t = irdl.any_of(%match_one_op_index, %match_root_integer)
 // CHECK-NEXT:    irdl_ext.yield {"name_hints" = ["match_x", "match_one_val", "match_root_result_1_", "match_root_result_0_"]} %match_root_t, %match_root_t, %match_root_t, %match_root_t
 // CHECK-NEXT:  } of {
 // CHECK-NEXT:    %rewrite_i1 = irdl.is i1
@@ -0,0 +1,121 @@
+from conftest import parse_check_subset
+from xdsl_pdl.analysis.base_analysis import check_subset_with_bases
+
+
+def test_disjoint_bases():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %1 = irdl.any
+          %vec = irdl.parametric @builtin::@vector<%0, %1>
+          irdl_ext.yield %vec
+        } of {
+          %0 = irdl.any
+          %int = irdl.parametric @builtin::@integer<%0>
+          %index = irdl.base @builtin::@index
+          %res = irdl.any_of(%int, %index)
+          irdl_ext.yield %res
+        }
+        """
+    )
+    verdict = check_subset_with_bases(check_subset)
+    assert verdict is not None
+    assert verdict.result == "sat"
+
+
+def test_rhs_accepts_every_base():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %int = irdl.parametric @builtin::@integer<%0>
+          %index = irdl.base @builtin::@index
+          %res = irdl.any_of(%int, %index)
+          irdl_ext.yield %res, %0
+        } of {
+          %int = irdl.base "!builtin.integer"
+          %index = irdl.base @builtin::@index
+          %vec = irdl.base @builtin::@vector
+          %res = irdl.any_of(%int, %index, %vec)
+          %1 = irdl.any
+          irdl_ext.yield %res, %1
+        }
+        """
+    )
+    verdict = check_subset_with_bases(check_subset)
+    assert verdict is not None
+    assert verdict.result == "unsat"
+
+
+def test_parametric_rhs_needs_solver():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %int = irdl.parametric @builtin::@integer<%0>
+          irdl_ext.yield %int
+        } of {
+          %0 = irdl.is i32
+          %int = irdl.parametric @builtin::@integer<%0>
+          irdl_ext.yield %int
+        }
+        """
+    )
+    assert check_subset_with_bases(check_subset) is None
+
+
+def test_shared_rhs_constraints_need_solver():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.base @builtin::@index
+          %1 = irdl.base @builtin::@index
+          irdl_ext.yield %0, %1
+        } of {
+          %0 = irdl.base @builtin::@index
+          %1 = irdl.all_of(%0)
+          %2 = irdl.all_of(%0)
+          irdl_ext.yield %1, %2
+        }
+        """
+    )
+    assert check_subset_with_bases(check_subset) is None
+
+
+def test_matched_rhs_values_are_checked():
+    # The matched values cannot be assigned, so the rhs accepts nothing
+    for matched in ("irdl.any_of()", "irdl.all_of(%index, %vec)"):
+        check_subset = parse_check_subset(f"""
+            irdl_ext.check_subset {{
+              %0 = irdl.base @builtin::@index
+              irdl_ext.yield %0
+            }} of {{
+              %0 = irdl.base @builtin::@index
+              %index = irdl.base @builtin::@index
+              %vec = irdl.base @builtin::@vector
+              %c = {matched}
+              irdl_ext.match %c
+              irdl_ext.yield %0
+            }}
+            """)
+        verdict = check_subset_with_bases(check_subset)
+        assert verdict is None or verdict.result == "sat"
+
+
+def test_matched_yielded_values_accept_every_base():
+    check_subset = parse_check_subset("""
+        irdl_ext.check_subset {
+          %0 = irdl.base @builtin::@index
+          irdl_ext.yield %0
+        } of {
+          %index = irdl.base @builtin::@index
+          %vec = irdl.base @builtin::@vector
+          %0 = irdl.any_of(%index, %vec)
+          irdl_ext.match %0
+          irdl_ext.yield %0
+        }
+        """)
+    verdict = check_subset_with_bases(check_subset)
+    assert verdict is not None
+    assert verdict.result == "unsat"
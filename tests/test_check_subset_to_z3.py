@@ -0,0 +1,172 @@
+import pytest
+import z3
+
+from xdsl.dialects.builtin import IndexType, IntAttr, StringAttr, SymbolRefAttr
+
+from conftest import parse
+from xdsl_pdl.analysis.check_subset_to_z3 import (
+    check_subset_to_z3,
+    convert_attr_to_z3_attr,
+    create_attribute_sort,
+)
+
+BUILTIN_IRDL = """
+irdl.dialect @builtin {
+  irdl.type @index
+  irdl.attribute @integer {
+    %0 = irdl.any
+    irdl.parameters(%0)
+  }
+}
+"""
+
+
+def test_attribute_sort_tables():
+    sort = create_attribute_sort(parse(BUILTIN_IRDL))
+    assert list(sort.constructors) == [
+        "unassigned",
+        "other",
+        "int",
+        "string",
+        "builtin.index",
+        "builtin.integer",
+    ]
+    assert len(sort.accessors["builtin.integer"]) == 1
+    assert len(sort.accessors["builtin.index"]) == 0
+    assert sort.recognizers["builtin.index"].arity() == 1
+
+
+def test_attribute_sort_is_memoized():
+    sort1 = create_attribute_sort(parse(BUILTIN_IRDL))
+    sort2 = create_attribute_sort(parse(BUILTIN_IRDL))
+    assert sort1 is sort2
+
+    other_sort = create_attribute_sort(parse("irdl.dialect @builtin {}"))
+    assert other_sort is not sort1
+    assert "builtin.index" not in other_sort.constructors
+
+
+CHECK_SUBSET_PROGRAM = """
+irdl.dialect @builtin {
+  irdl.attribute @integer {
+    %0 = irdl.any
+    irdl.parameters(%0)
+  }
+  irdl.attribute @vector {
+    %0 = irdl.any
+    %1 = irdl.any
+    irdl.parameters(%0, %1)
+  }
+}
+
+irdl_ext.check_subset {
+  %0 = irdl.any
+  %int = irdl.parametric @builtin::@integer<%0>
+  irdl_ext.yield %int
+} of {
+  %0 = irdl.any
+  %1 = irdl.any
+  %2 = irdl.any
+  %int = irdl.parametric @builtin::@integer<%0>
+  %vec = irdl.parametric @builtin::@vector<%1, %2>
+  %res = irdl.any_of(%int, %vec)
+  irdl_ext.yield %res
+}
+"""
+
+
+def test_quantifier_free_encoding():
+    solver = z3.Solver()
+    info = check_subset_to_z3(parse(CHECK_SUBSET_PROGRAM), solver)
+    assert solver.check() == z3.unsat
+    assert info.num_quantified_constants == 7
+    assert info.num_constructors == 6
+
+    solver = z3.Solver()
+    info = check_subset_to_z3(parse(CHECK_SUBSET_PROGRAM), solver, quantifier_free=True)
+    assert solver.check() == z3.unsat
+    assert info.num_quantified_constants == 3
+
+
+def test_attribute_sort_lowering_cache():
+    sort = create_attribute_sort(parse(BUILTIN_IRDL))
+    assert sort.get_constructor_name(SymbolRefAttr("builtin", ["index"])) == (
+        "builtin.index"
+    )
+    with pytest.raises(Exception, match="Cannot find symbol"):
+        sort.get_constructor_name(SymbolRefAttr("builtin", ["vector"]))
+
+    index1 = convert_attr_to_z3_attr(IndexType(), sort)
+    index2 = convert_attr_to_z3_attr(IndexType(), sort)
+    assert index1 is index2
+
+
+def test_bounded_attribute_sort():
+    program = parse(BUILTIN_IRDL + '\nirdl.is "foo"')
+    sort = create_attribute_sort(program, int_width=8)
+    assert sort is create_attribute_sort(program, int_width=8)
+    assert sort is not create_attribute_sort(program)
+    assert sort.string_values is not None
+    assert set(sort.string_values) == {"foo", "signless", "signed", "unsigned"}
+
+    assert z3.is_bv_value(convert_attr_to_z3_attr(IntAttr(127), sort).arg(0))
+    with pytest.raises(Exception, match="cannot be encoded"):
+        convert_attr_to_z3_attr(IntAttr(128), sort)
+    with pytest.raises(Exception, match="not a literal of the encoding"):
+        convert_attr_to_z3_attr(StringAttr("bar"), sort)
+
+
+def distinct_strings_program(num_strings: int) -> str:
+    """
+    Get a query whose lhs is a tuple of strings, and whose rhs is the tuples
+    where two strings are equal. The lhs is not a subset of the rhs, but its
+    counterexamples need `num_strings` distinct strings.
+    """
+    params = ", ".join(f"%{i}" for i in range(num_strings))
+    anys = "\n".join(f"  %s{i} = irdl.any" for i in range(num_strings))
+    strings = "\n".join(f'  %{i} = irdl.base "#string"' for i in range(num_strings))
+    cases: list[str] = []
+    for i in range(num_strings):
+        for j in range(i + 1, num_strings):
+            args = [f"%s{i}" if k == j else f"%s{k}" for k in range(num_strings)]
+            cases.append(
+                f"  %case{i}_{j} = irdl.parametric @builtin::@tuple<{', '.join(args)}>"
+            )
+    case_names = ", ".join(case.split()[0] for case in cases)
+    return f"""
+irdl.dialect @builtin {{
+  irdl.attribute @tuple {{
+{strings}
+    irdl.parameters({params})
+  }}
+}}
+
+irdl_ext.check_subset {{
+{strings}
+  %tuple = irdl.parametric @builtin::@tuple<{params}>
+  irdl_ext.yield %tuple
+}} of {{
+{anys}
+{chr(10).join(cases)}
+  %res = irdl.any_of({case_names})
+  irdl_ext.yield %res
+}}
+"""
+
+
+def test_bounded_encoding_has_enough_strings():
+    # The signedness strings are literals of every query, so 6 distinct strings
+    # need at least 3 strings that are not literals
+    program = distinct_strings_program(6)
+    solver = z3.Solver()
+    check_subset_to_z3(parse(program), solver, quantifier_free=True)
+    assert solver.check() == z3.sat
+
+    solver = z3.Solver()
+    check_subset_to_z3(parse(program), solver, quantifier_free=True, int_width=8)
+    assert solver.check() == z3.sat
+
+
+def test_bounded_encoding_rejects_large_queries():
+    with pytest.raises(Exception, match="may need more than the 1 strings"):
+        check_subset_to_z3(parse(distinct_strings_program(2)), z3.Solver(), int_width=2)
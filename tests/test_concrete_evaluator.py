@@ -0,0 +1,62 @@
+from conftest import parse_check_subset
+from xdsl_pdl.analysis.concrete_evaluator import compile_region, find_counterexample
+
+DEFINITIONS = [("builtin.index", 0), ("builtin.integer_attr", 2)]
+
+SUBSET_QUERY = """
+irdl_ext.check_subset {
+  %0 = irdl.base "#int"
+  %1 = irdl.is index
+  %attr = irdl.parametric @builtin::@integer_attr<%0, %1>
+  irdl_ext.yield %attr, %0
+} of {
+  %0 = irdl.any
+  %1 = irdl.any
+  %attr = irdl.parametric @builtin::@integer_attr<%0, %1>
+  %res = irdl.any_of(%attr, %1)
+  irdl_ext.yield %res, %0
+}
+"""
+
+
+def test_compiled_region():
+    check_subset = parse_check_subset(SUBSET_QUERY)
+    lhs = compile_region(check_subset.lhs.block)
+    index = ("builtin.index",)
+    attr = ("builtin.integer_attr", ("int", 3), index)
+    assert lhs.accepts([attr, ("int", 3)]) is True
+    assert lhs.accepts([attr, ("int", 4)]) is False
+    assert lhs.accepts([index, ("int", 3)]) is False
+
+    rhs = compile_region(check_subset.rhs.block)
+    assert rhs.accepts([attr, ("int", 3)]) is True
+    # Accepted by the second case of the `irdl.any_of`
+    assert rhs.accepts([index, ("int", 3)]) is True
+    assert rhs.accepts([("unassigned",), ("int", 3)]) is False
+
+
+def test_no_counterexample():
+    check_subset = parse_check_subset(SUBSET_QUERY)
+    assert find_counterexample(check_subset, DEFINITIONS) is None
+
+
+def test_counterexample():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %1 = irdl.any
+          %attr = irdl.parametric @builtin::@integer_attr<%0, %1>
+          irdl_ext.yield %attr
+        } of {
+          %0 = irdl.any
+          %1 = irdl.is index
+          %attr = irdl.parametric @builtin::@integer_attr<%0, %1>
+          irdl_ext.yield %attr
+        }
+        """
+    )
+    counterexample = find_counterexample(check_subset, DEFINITIONS)
+    assert counterexample is not None
+    assert counterexample.values[0][0] == "builtin.integer_attr"
+    assert counterexample.values[0][2] != ("builtin.index",)
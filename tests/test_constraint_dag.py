@@ -0,0 +1,114 @@
+from xdsl.dialects.builtin import ModuleOp, i32
+from xdsl.dialects.irdl import AnyOfOp, IsOp
+
+from conftest import parse
+from xdsl_pdl.analysis.constraint_dag import ConstraintDAG
+from xdsl_pdl.dialects.irdl_extension import YieldOp
+
+PROGRAM = """
+irdl_ext.check_subset {
+  %0 = irdl.any
+  %1 = irdl.is i32
+  %2 = irdl.any_of(%0, %1)
+  %3 = irdl.any
+  %4 = irdl.is i32
+  %5 = irdl.any_of(%3, %4)
+  %6 = irdl.is i64
+  %7 = irdl.any_of(%3, %6)
+  irdl_ext.yield %2, %5, %7
+} of {
+  %0 = irdl.any
+  irdl_ext.yield %0
+}
+"""
+
+
+def get_yielded_values(module: ModuleOp):
+    yield_op = next(op for op in module.walk() if isinstance(op, YieldOp))
+    return list(yield_op.operands)
+
+
+def test_structurally_equal_values_have_the_same_number():
+    dag = ConstraintDAG()
+    first, second, third = get_yielded_values(parse(PROGRAM))
+
+    assert dag.get_number(first) == dag.get_number(second)
+    assert dag.get_number(first) != dag.get_number(third)
+
+
+def test_invalidated_numbers_are_recomputed():
+    dag = ConstraintDAG()
+    first, second, third = get_yielded_values(parse(PROGRAM))
+    assert dag.get_number(second) != dag.get_number(third)
+
+    # Make the last `irdl.any_of` use `irdl.is i32` as well
+    third_op = third.owner
+    assert isinstance(third_op, AnyOfOp)
+    third_op.operands = [third_op.operands[0], second.owner.operands[1]]
+    dag.invalidate(third_op)
+
+    assert dag.get_number(first) == dag.get_number(third)
+
+
+def test_duplicates_are_found_by_operands():
+    dag = ConstraintDAG()
+    module = parse(PROGRAM)
+    is_i32_ops = [
+        op for op in module.walk() if isinstance(op, IsOp) and op.expected == i32
+    ]
+    any_of_ops = [op for op in module.walk() if isinstance(op, AnyOfOp)]
+
+    assert dag.find_duplicate(is_i32_ops[0]) is None
+    assert dag.find_duplicate(is_i32_ops[1]) is is_i32_ops[0]
+    # The `irdl.any_of` operations have different operands
+    assert dag.find_duplicate(any_of_ops[0]) is None
+    assert dag.find_duplicate(any_of_ops[1]) is None
+
+
+def test_rooted_dags_are_invalidated_when_uses_change():
+    dag = ConstraintDAG()
+    first, second, third = get_yielded_values(parse(PROGRAM))
+    assert dag.is_rooted_dag_with_one_use(first)
+    # `irdl.any` is used by both the second and third `irdl.any_of`
+    assert not dag.is_rooted_dag_with_one_use(second)
+
+    # Make the last `irdl.any_of` use the `irdl.is i64` only
+    third_op = third.owner
+    assert isinstance(third_op, AnyOfOp)
+    any_value = third_op.operands[0]
+    third_op.operands = [third_op.operands[1]]
+    dag.invalidate(third_op)
+    dag.invalidate_uses(any_value)
+
+    assert dag.is_rooted_dag_with_one_use(second)
+    assert dag.is_rooted_dag_with_one_use(third)
+
+
+def test_base_masks():
+    # Wider than a machine word, to check that masks are not truncated
+    names = [f"@test::@t{index}" for index in range(100)]
+    bases = "\n".join(
+        f'%b{index} = irdl.base {name} {{"base_ref" = {name}}}'
+        for index, name in enumerate(names)
+    )
+    args = ", ".join(f"%b{index}" for index in range(100))
+    module = parse(f"""
+        irdl_ext.check_subset {{
+          {bases}
+          %wide = irdl.any_of({args})
+          %last = irdl.all_of(%wide, %b99)
+          %none = irdl.all_of(%b0, %b99)
+          %any = irdl.any
+          %top = irdl.any_of(%b0, %any)
+          irdl_ext.yield %last, %none, %top
+        }} of {{
+          %0 = irdl.any
+          irdl_ext.yield %0
+        }}
+        """)
+    dag = ConstraintDAG()
+    last, none, top = get_yielded_values(module)
+
+    assert dag.get_base_names(dag.get_base_mask(last)) == {"test.t99"}
+    assert dag.get_base_mask(none) == 0
+    assert dag.get_base_mask(top) is None
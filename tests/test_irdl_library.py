@@ -0,0 +1,114 @@
+from xdsl.ir import MLContext
+
+from conftest import parse
+from xdsl_pdl.passes.pdl_to_irdl import (
+    IRDLLibrary,
+    PDLToIRDLPass,
+    convert_pattern_to_irdl,
+    embed_irdl_attr_verifiers,
+)
+
+IRDL_PROGRAM = """
+irdl.dialect @builtin {
+  irdl.type @index
+  irdl.type @integer_type {
+    %bitwidth = irdl.base "#int"
+    irdl.parameters(%bitwidth)
+  }
+}
+
+irdl.dialect @arith {
+  irdl.operation @addi {
+    %index = irdl.base @builtin::@index
+    %integer = irdl.base @builtin::@integer_type
+    %t = irdl.any_of(%index, %integer)
+    irdl.operands(%t, %t)
+    irdl.results(%t)
+  }
+}
+"""
+
+PATTERN = """
+pdl.pattern @AddCommute : benefit(0) {
+  %t = pdl.type
+  %x = pdl.operand : %t
+  %y = pdl.operand : %t
+  %op = pdl.operation "arith.addi"(%x, %y : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+  pdl.rewrite %op {
+    %new_op = pdl.operation "arith.addi"(%y, %x : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+    pdl.replace %op with %new_op
+  }
+}
+"""
+
+
+def test_library_conversion_matches_inlined_conversion():
+    inlined = parse(IRDL_PROGRAM + PATTERN)
+    PDLToIRDLPass().apply(MLContext(), inlined)
+
+    library = IRDLLibrary.from_module(parse(IRDL_PROGRAM))
+    # The library is shared by the programs of all patterns
+    for _ in range(2):
+        program = parse(PATTERN)
+        convert_pattern_to_irdl(program, library)
+        assert len(program.ops) == 1
+        assert str(program.ops.last) == str(inlined.ops.last)
+    assert list(library.templates) == ["arith.addi"]
+
+
+def test_template_instantiation():
+    library = IRDLLibrary.from_module(parse(IRDL_PROGRAM))
+    template = library.get_template("arith.addi")
+    constraints = template.instantiate(None)
+    assert [op.results[0].name_hint for op in constraints] == [
+        "index",
+        "integer",
+        "t",
+    ]
+    assert template.operands == (2, 2)
+    assert template.results == (2,)
+    assert tuple(constraints[2].operands) == (
+        constraints[0].results[0],
+        constraints[1].results[0],
+    )
+
+    prefixed = template.instantiate("op")
+    assert [op.results[0].name_hint for op in prefixed] == [
+        "op_index",
+        "op_integer",
+        "op_t",
+    ]
+    assert all(op.parent is None for op in prefixed)
+
+
+RECURSIVE_IRDL_PROGRAM = """
+irdl.dialect @test {
+  irdl.type @list {
+    %element = irdl.any
+    %tail = irdl.base @list
+    irdl.parameters(%element, %tail)
+  }
+}
+"""
+
+
+def test_bounded_unfolding():
+    library = IRDLLibrary.from_module(parse(RECURSIVE_IRDL_PROGRAM))
+    program = parse("""
+        irdl_ext.check_subset {
+          %0 = irdl.base @test::@list
+          irdl_ext.yield %0
+        } of {
+          %0 = irdl.any
+          irdl_ext.yield %0
+        }
+        """)
+    statistics = embed_irdl_attr_verifiers(program, library, max_depth=2)
+    # The lhs list and its tail are unfolded, but not the tail of its tail
+    assert statistics.num_unfolded == 2
+    assert statistics.num_truncated == 1
+    assert statistics.max_depth == 2
+    # Each unfolding adds two parameter constraints, the parametric constraint,
+    # and the conjunction of both
+    assert statistics.num_ops_after == statistics.num_ops_before + 2 * 4
+    assert len(library.attribute_templates) == 1
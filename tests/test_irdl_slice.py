@@ -0,0 +1,83 @@
+from xdsl.dialects.builtin import Builtin, Float32Type, IntegerType, ModuleOp
+from xdsl.dialects.irdl import IRDL, IsOp
+from xdsl.ir import MLContext
+from xdsl.parser import Parser
+
+from xdsl_pdl.analysis.irdl_slice import get_reachable_definitions
+from xdsl_pdl.passes.pdl_to_irdl import IRDLLibrary
+
+IRDL_PROGRAM = """
+irdl.dialect @builtin {
+  irdl.type @index
+  irdl.attribute @signedness {
+    %0 = irdl.any
+    irdl.parameters(%0)
+  }
+  irdl.type @integer_type {
+    %bitwidth = irdl.base "#int"
+    %signedness = irdl.base @signedness
+    irdl.parameters(%bitwidth, %signedness)
+  }
+  irdl.type @vector {
+    %shape = irdl.any
+    %element = irdl.base @integer_type
+    irdl.parameters(%shape, %element)
+  }
+  irdl.type @tensor {
+    %shape = irdl.any
+    %element = irdl.any
+    irdl.parameters(%shape, %element)
+  }
+}
+
+irdl.dialect @arith {
+  irdl.operation @addi {
+    %index = irdl.base @builtin::@index
+    %vector = irdl.base @builtin::@vector
+    %t = irdl.any_of(%index, %vector)
+    irdl.operands(%t, %t)
+    irdl.results(%t)
+  }
+  irdl.operation @negf {
+    %tensor = irdl.base @builtin::@tensor
+    irdl.operands(%tensor)
+    irdl.results(%tensor)
+  }
+}
+"""
+
+
+def get_library() -> IRDLLibrary:
+    ctx = MLContext()
+    ctx.load_dialect(Builtin)
+    ctx.load_dialect(IRDL)
+    module = Parser(ctx, IRDL_PROGRAM).parse_module()
+    assert isinstance(module, ModuleOp)
+    return IRDLLibrary.from_module(module)
+
+
+def test_operation_slice():
+    # The integer type and signedness are only referenced by the vector element
+    assert get_reachable_definitions(get_library(), ["arith.addi"]) == {
+        "builtin.index",
+        "builtin.vector",
+        "builtin.integer_type",
+        "builtin.signedness",
+    }
+    assert get_reachable_definitions(get_library(), ["arith.negf"]) == {
+        "builtin.tensor"
+    }
+
+
+def test_constant_slice():
+    constant = IsOp(IntegerType(32))
+    assert get_reachable_definitions(get_library(), constraints=[constant]) == {
+        "builtin.integer_type",
+        "builtin.signedness",
+    }
+
+
+def test_unsupported_constant_is_not_sliced():
+    # The definitions used by a constant without a term are not known
+    constant = IsOp(Float32Type())
+    assert get_reachable_definitions(get_library(), ["arith.addi"], [constant]) is None
@@ -0,0 +1,176 @@
+import sys
+
+from xdsl.dialects.builtin import i32
+from xdsl.dialects.irdl import AllOfOp, AnyOfOp, IsOp
+
+from conftest import parse
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, EqOp, YieldOp
+from xdsl_pdl.passes.optimize_irdl import optimize_irdl
+
+
+def test_only_check_subset_is_optimized():
+    module = parse("""
+        irdl.dialect @test {
+          irdl.type @foo {
+            %0 = irdl.any
+            %1 = irdl.all_of(%0)
+            irdl.parameters(%1)
+          }
+        }
+
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %1 = irdl.all_of(%0)
+          irdl_ext.yield %1
+        } of {
+          %0 = irdl.any
+          %1 = irdl.is i32
+          irdl_ext.eq %0, %1
+          irdl_ext.yield %0
+        }
+        """)
+    statistics = optimize_irdl(module)
+
+    dialect, check_subset = module.ops
+    assert isinstance(check_subset, CheckSubsetOp)
+    assert any(isinstance(op, AllOfOp) for op in dialect.walk())
+    assert not any(isinstance(op, AllOfOp | EqOp) for op in check_subset.walk())
+    assert statistics.num_rewrites > 0
+    assert statistics.num_iterations >= statistics.num_rewrites
+
+
+def test_cyclic_eq_is_not_merged():
+    # Merging the operands of the `irdl_ext.eq` would make the `irdl.any_of`
+    # use itself
+    module = parse("""
+        irdl_ext.check_subset {
+          %0 = irdl.is i32
+          %1 = irdl.is i64
+          %2 = irdl.all_of(%0)
+          %3 = irdl.any_of(%2, %1)
+          irdl_ext.eq %3, %2
+          irdl_ext.yield %3
+        } of {
+          %0 = irdl.any
+          irdl_ext.yield %0
+        }
+        """)
+    optimize_irdl(module)
+    module.verify()
+
+
+def test_deep_equivalent_dags_are_merged():
+    # Both arguments of the `irdl.any_of` are chains deeper than the recursion
+    # limit
+    depth = sys.getrecursionlimit() + 100
+    chains: list[str] = []
+    for chain in ("a", "b"):
+        chains.append(f"%{chain}0 = irdl.any")
+        for index in range(1, depth):
+            chains.append(
+                f"%{chain}{index} = irdl.parametric @test::@foo<%{chain}{index - 1}>"
+            )
+    ops = "\n".join(chains)
+    module = parse(f"""
+        irdl_ext.check_subset {{
+          {ops}
+          %0 = irdl.any_of(%a{depth - 1}, %b{depth - 1})
+          irdl_ext.yield %0
+        }} of {{
+          %0 = irdl.any
+          irdl_ext.yield %0
+        }}
+        """)
+    optimize_irdl(module)
+
+    check_subset = module.ops.first
+    assert isinstance(check_subset, CheckSubsetOp)
+    assert not any(isinstance(op, AnyOfOp) for op in check_subset.walk())
+    assert len(check_subset.lhs.block.ops) == depth + 1
+
+
+DNF_PROGRAM = """
+    irdl_ext.check_subset {
+      %0 = irdl.is i32
+      %1 = irdl.is i64
+      %2 = irdl.any_of(%0, %1)
+      %3 = irdl.is i32
+      %4 = irdl.all_of(%2, %3)
+      irdl_ext.yield %4
+    } of {
+      %0 = irdl.any
+      irdl_ext.yield %0
+    }
+    """
+
+
+def test_all_of_is_distributed_to_remove_contradictions():
+    module = parse(DNF_PROGRAM)
+    statistics = optimize_irdl(module)
+
+    check_subset = module.ops.first
+    assert isinstance(check_subset, CheckSubsetOp)
+    assert statistics.num_expansions == 1
+    assert not any(isinstance(op, AllOfOp | AnyOfOp) for op in check_subset.walk())
+    yielded = check_subset.lhs.block.ops.last
+    assert isinstance(yielded, YieldOp)
+    assert isinstance(yielded.operands[0].owner, IsOp)
+    assert yielded.operands[0].owner.expected == i32
+    assert statistics.num_ops_after < statistics.num_ops_before
+
+
+def test_all_of_is_not_distributed_over_budget():
+    statistics = optimize_irdl(parse(DNF_PROGRAM), dnf_budget=1)
+
+    assert statistics.num_expansions == 0
+    assert statistics.num_expansions_over_budget == 1
+
+
+def test_all_of_is_not_distributed_without_contradictions():
+    module = parse("""
+        irdl_ext.check_subset {
+          %0 = irdl.is i32
+          %1 = irdl.is i64
+          %2 = irdl.any_of(%0, %1)
+          %3 = irdl.base "#int"
+          %4 = irdl.all_of(%2, %3)
+          irdl_ext.yield %4
+        } of {
+          %0 = irdl.any
+          irdl_ext.yield %0
+        }
+        """)
+    statistics = optimize_irdl(module)
+
+    assert statistics.num_expansions == 0
+    assert any(isinstance(op, AnyOfOp) for op in module.walk())
+
+
+def test_all_of_is_drops_the_constraints_it_satisfies():
+    module = parse("""
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          irdl_ext.yield %0
+        } of {
+          %0 = irdl.base "#int"
+          %1 = irdl.parametric @builtin::@integer_type<%0>
+          %2 = irdl.is i32
+          %3 = irdl.all_of(%1, %2)
+          %4 = irdl.is i32
+          %5 = irdl.any_of(%4)
+          %6 = irdl.base "#int"
+          %7 = irdl.all_of(%5, %6)
+          irdl_ext.yield %3, %7
+        }
+        """)
+    optimize_irdl(module)
+
+    check_subset = module.ops.first
+    assert isinstance(check_subset, CheckSubsetOp)
+    yielded = check_subset.rhs.block.ops.last
+    assert isinstance(yielded, YieldOp)
+    satisfied, contradiction = yielded.operands
+    assert isinstance(satisfied.owner, IsOp)
+    assert satisfied.owner.expected == i32
+    assert isinstance(contradiction.owner, AnyOfOp)
+    assert not contradiction.owner.args
@@ -0,0 +1,154 @@
+import z3
+
+from xdsl.dialects.builtin import SymbolRefAttr
+from xdsl.dialects.pdl import PatternOp
+
+from conftest import parse
+from xdsl_pdl.analysis.check_subset_to_z3 import (
+    SubsetQueryInfo,
+    create_attribute_sort,
+    get_string_literals,
+)
+from xdsl_pdl.analysis.pdl_to_z3 import _ConstraintEncoder, pattern_to_z3
+from xdsl_pdl.passes.pdl_to_irdl import IRDLLibrary
+
+IRDL_PROGRAM = """
+irdl.dialect @builtin {
+  irdl.type @index
+  irdl.type @integer_type {
+    %bitwidth = irdl.base "#int"
+    irdl.parameters(%bitwidth)
+  }
+}
+
+irdl.dialect @arith {
+  irdl.operation @addi {
+    %index = irdl.base @builtin::@index
+    %integer = irdl.base @builtin::@integer_type
+    %t = irdl.any_of(%index, %integer)
+    irdl.operands(%t, %t)
+    irdl.results(%t)
+  }
+  irdl.operation @index_cast {
+    %index = irdl.base @builtin::@index
+    %integer = irdl.base @builtin::@integer_type
+    irdl.operands(%integer)
+    irdl.results(%index)
+  }
+}
+"""
+
+
+def encode_pattern(pattern: str, solver: z3.Solver) -> SubsetQueryInfo:
+    irdl_program = parse(IRDL_PROGRAM)
+    pattern_op = parse(pattern).ops.first
+    assert isinstance(pattern_op, PatternOp)
+    attribute_sort = create_attribute_sort(
+        irdl_program,
+        string_literals=get_string_literals(irdl_program)
+        | get_string_literals(pattern_op),
+    )
+    return pattern_to_z3(
+        pattern_op, IRDLLibrary.from_module(irdl_program), solver, attribute_sort
+    )
+
+
+def check_pattern(pattern: str) -> z3.CheckSatResult:
+    solver = z3.Solver()
+    encode_pattern(pattern, solver)
+    return solver.check()
+
+
+def test_commutation_is_safe():
+    assert check_pattern("""
+        pdl.pattern @AddCommute : benefit(0) {
+          %t = pdl.type
+          %x = pdl.operand : %t
+          %y = pdl.operand : %t
+          %op = pdl.operation "arith.addi"(%x, %y : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+          pdl.rewrite %op {
+            %new_op = pdl.operation "arith.addi"(%y, %x : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+            pdl.replace %op with %new_op
+          }
+        }
+        """) == z3.unsat
+
+
+def test_cast_may_break_invariants():
+    # The matched operands may be indices, which index_cast does not accept
+    assert check_pattern("""
+        pdl.pattern @AddCast : benefit(0) {
+          %t = pdl.type
+          %x = pdl.operand : %t
+          %y = pdl.operand : %t
+          %op = pdl.operation "arith.addi"(%x, %y : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+          pdl.rewrite %op {
+            %new_op = pdl.operation "arith.index_cast"(%x : !pdl.value) -> (%t : !pdl.type)
+            pdl.replace %op with %new_op
+          }
+        }
+        """) == z3.sat
+
+
+def test_unchanged_operations_are_not_quantified():
+    commute = """
+        pdl.pattern @AddCommute : benefit(0) {
+          %t = pdl.type
+          %x = pdl.operand : %t
+          %y = pdl.operand : %t
+          %op = pdl.operation "arith.addi"(%x, %y : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+          pdl.rewrite %op {
+            %new_op = pdl.operation "arith.addi"(%y, %x : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+            pdl.replace %op with %new_op
+          }
+        }
+        """
+    # The inner addition is matched, but not rewritten
+    nested_commute = """
+        pdl.pattern @AddCommute : benefit(0) {
+          %t = pdl.type
+          %x = pdl.operand : %t
+          %y = pdl.operand : %t
+          %inner = pdl.operation "arith.addi"(%x, %y : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+          %z = pdl.result 0 of %inner
+          %op = pdl.operation "arith.addi"(%z, %y : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+          pdl.rewrite %op {
+            %new_op = pdl.operation "arith.addi"(%y, %z : !pdl.value, !pdl.value) -> (%t : !pdl.type)
+            pdl.replace %op with %new_op
+          }
+        }
+        """
+    info = encode_pattern(commute, z3.Solver())
+    nested_info = encode_pattern(nested_commute, z3.Solver())
+    assert nested_info.num_quantified_constants == info.num_quantified_constants
+
+
+def test_conjunction_of_parametrics_is_merged():
+    irdl_program = parse(IRDL_PROGRAM)
+    attribute_sort = create_attribute_sort(irdl_program)
+    constants: list[z3.ExprRef] = []
+    constraints: list[z3.BoolRef] = []
+
+    def create_constant(name_hint: str | None) -> z3.ExprRef:
+        constants.append(z3.Const(f"v{len(constants)}", attribute_sort.sort))
+        return constants[-1]
+
+    encoder = _ConstraintEncoder(
+        attribute_sort,
+        IRDLLibrary.from_module(irdl_program),
+        create_constant,
+        constraints.append,
+    )
+    integer_type = SymbolRefAttr("builtin", ["integer_type"])
+    first = encoder.parametric(integer_type, [encoder.any()])
+    second = encoder.parametric(integer_type, [encoder.any()])
+    merged = encoder.all_of([first, second])
+    assert encoder.parametrics[merged.get_id()][0] == "builtin.integer_type"
+
+    # With another conjunct, only the merged parametric is constrained
+    index = encoder.base("!builtin.index")
+    conjunction = encoder.all_of([first, second, index])
+    assert conjunction.get_id() not in encoder.parametrics
+    conjunction_constraint = str(constraints[-1])
+    assert str(first) not in conjunction_constraint
+    assert str(second) not in conjunction_constraint
@@ -0,0 +1,82 @@
+import shutil
+
+import pytest
+import z3
+
+from conftest import create_solver
+from xdsl_pdl.analysis.smt_backend import (
+    ExternalSolverBackend,
+    InProcessBackend,
+    SMTBackend,
+    default_solver_command,
+    parse_solver_output,
+)
+
+requires_z3_binary = pytest.mark.skipif(
+    shutil.which("z3") is None, reason="the z3 binary is not installed"
+)
+
+
+def test_parse_solver_output():
+    assert parse_solver_output("sat\n(model)\n") == ("sat", "(model)")
+    assert parse_solver_output('unsat\n(error "no model")\n') == ("unsat", None)
+    assert parse_solver_output("") == ("unknown", None)
+    assert parse_solver_output("(error)") == ("unknown", None)
+
+
+@requires_z3_binary
+def test_external_backend():
+    x = z3.Int("x")
+    backend = ExternalSolverBackend(default_solver_command(), jobs=2)
+    queries = [(0, create_solver(x > 2)), (1, create_solver(x > 2, x < 1))]
+    verdicts = dict(backend.solve_all(queries))
+    assert verdicts[0].result == "sat"
+    assert verdicts[0].model is not None
+    assert verdicts[1].result == "unsat"
+
+
+def test_external_backend_invalid_output():
+    x = z3.Int("x")
+    backend = ExternalSolverBackend(["true"])
+    assert backend.solve(create_solver(x > 2)).result == "unknown"
+
+
+@requires_z3_binary
+def test_external_backend_timeout():
+    x = z3.Int("x")
+    backend = ExternalSolverBackend(timeout=0)
+    assert backend.solve(create_solver(x > 2)).result == "unknown"
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SMTBackend()  # type: ignore
+
+
+def test_in_process_backend():
+    x = z3.Int("x")
+    backend = InProcessBackend()
+    queries = [(0, create_solver(x > 2)), (1, create_solver(x > 2, x < 1))]
+    verdicts = dict(backend.solve_all(queries))
+    assert verdicts[0].result == "sat"
+    assert verdicts[0].model is not None
+    assert verdicts[0].solver_statistics
+    assert verdicts[1].result == "unsat"
+    assert verdicts[1].model is None
+
+
+def test_in_process_backend_reuses_solver():
+    x = z3.Int("x")
+    solver = z3.Solver()
+    solver.add(x > 2)
+
+    def queries():
+        for key, constraint in enumerate([x < 3, x < 4]):
+            solver.push()
+            solver.add(constraint)
+            yield key, solver
+            solver.pop()
+
+    verdicts = dict(InProcessBackend().solve_all(queries()))
+    assert verdicts[0].result == "unsat"
+    assert verdicts[1].result == "sat"
@@ -0,0 +1,60 @@
+import z3
+
+from conftest import create_solver, query
+from xdsl_pdl.analysis.solver_portfolio import (
+    PortfolioBackend,
+    SolverConfig,
+    solve_with_fallback_portfolio,
+    solve_with_portfolio,
+)
+
+CONFIGS = (
+    SolverConfig("default"),
+    SolverConfig("seed-1", params={"smt.random_seed": 1}),
+)
+
+
+def test_portfolio_sat():
+    x = z3.Int("x")
+    result = solve_with_portfolio(query(x > 2), CONFIGS)
+    assert result.result == "sat"
+    assert result.model is not None
+    assert result.config in ("default", "seed-1")
+
+
+def test_portfolio_unsat():
+    x = z3.Int("x")
+    result = solve_with_portfolio(query(x > 2, x < 1), CONFIGS)
+    assert result.result == "unsat"
+
+
+def test_portfolio_timeout():
+    x = z3.Int("x")
+    result = solve_with_portfolio(query(x > 2), CONFIGS, timeout=0)
+    assert result.result == "unknown"
+
+
+def test_fallback_portfolio_solves_in_process():
+    x = z3.Int("x")
+    solver = z3.Solver()
+    solver.add(x > 2)
+    result = solve_with_fallback_portfolio(solver, 10, CONFIGS)
+    assert result.result == "sat"
+    assert result.config == "in-process"
+
+
+def test_fallback_portfolio_races_after_delay():
+    x = z3.Int("x")
+    solver = z3.Solver()
+    solver.add(x > 2, x < 1)
+    result = solve_with_fallback_portfolio(solver, 0, CONFIGS)
+    assert result.result == "unsat"
+    assert result.config in ("default", "seed-1")
+
+
+def test_portfolio_backend():
+    x = z3.Int("x")
+    backend = PortfolioBackend(0, CONFIGS)
+    verdict = backend.solve(create_solver(x > 2, x < 1))
+    assert verdict.result == "unsat"
+    assert verdict.config in ("default", "seed-1")
@@ -0,0 +1,90 @@
+from conftest import parse_check_subset
+from xdsl_pdl.analysis.structural_check import check_subset_structurally
+
+
+def test_identical_regions():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %int = irdl.parametric @builtin::@integer<%0>
+          irdl_ext.yield %int, %0
+        } of {
+          %a = irdl.any
+          %b = irdl.parametric @builtin::@integer<%a>
+          irdl_ext.yield %b, %a
+        }
+        """
+    )
+    verdict = check_subset_structurally(check_subset)
+    assert verdict is not None
+    assert verdict.result == "unsat"
+
+
+def test_rhs_implied_by_lhs():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %int = irdl.parametric @builtin::@integer<%0>
+          irdl_ext.yield %int, %0
+        } of {
+          %0 = irdl.base @builtin::@integer
+          %1 = irdl.any
+          irdl_ext.yield %0, %1
+        }
+        """
+    )
+    verdict = check_subset_structurally(check_subset)
+    assert verdict is not None
+    assert verdict.result == "unsat"
+
+
+def test_rhs_base_not_implied():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %int = irdl.parametric @builtin::@integer<%0>
+          irdl_ext.yield %int
+        } of {
+          %0 = irdl.base @builtin::@vector
+          irdl_ext.yield %0
+        }
+        """
+    )
+    assert check_subset_structurally(check_subset) is None
+
+
+def test_rhs_value_yielded_twice():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          %1 = irdl.any
+          irdl_ext.yield %0, %1
+        } of {
+          %0 = irdl.any
+          irdl_ext.yield %0, %0
+        }
+        """
+    )
+    verdict = check_subset_structurally(check_subset)
+    assert verdict is None or verdict.result == "sat"
+
+
+def test_obvious_counterexample():
+    check_subset = parse_check_subset(
+        """
+        irdl_ext.check_subset {
+          %0 = irdl.any
+          irdl_ext.yield %0
+        } of {
+          %0 = irdl.is i32
+          irdl_ext.yield %0
+        }
+        """
+    )
+    verdict = check_subset_structurally(check_subset)
+    assert verdict is not None
+    assert verdict.result == "sat"
@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from conftest import parse
+from xdsl_pdl.analysis import verdict_cache
+from xdsl_pdl.analysis.verdict_cache import CachedVerdict, VerdictCache, get_query_key
+
+
+def check_subset_program(name: str) -> str:
+    return f"""
+irdl_ext.check_subset {{
+  %{name} = irdl.any
+  irdl_ext.yield %{name}
+}} of {{
+  %{name} = irdl.is i32
+  irdl_ext.yield %{name}
+}}
+"""
+
+
+def test_query_key_is_alpha_renamed():
+    key1 = get_query_key(parse(check_subset_program("x")), {})
+    key2 = get_query_key(parse(check_subset_program("y")), {})
+    assert key1 == key2
+    key3 = get_query_key(parse(check_subset_program("x")), {"encoding": "other"})
+    assert key1 != key3
+
+
+def test_query_key_depends_on_the_encoder(monkeypatch: pytest.MonkeyPatch):
+    key1 = get_query_key(parse(check_subset_program("x")), {})
+    monkeypatch.setattr(verdict_cache, "get_encoder_fingerprint", lambda: "other")
+    key2 = get_query_key(parse(check_subset_program("x")), {})
+    assert key1 != key2
+
+
+def test_cache_lookup(tmp_path: Path):
+    cache = VerdictCache(tmp_path)
+    assert cache.lookup("key") is None
+    cache.store("key", CachedVerdict("sat", "[x = 1]"))
+    assert cache.lookup("key") == CachedVerdict("sat", "[x = 1]")
+    cache.store("key", CachedVerdict("unsat", reason="no lhs base"))
+    assert cache.lookup("key") == CachedVerdict("unsat", reason="no lhs base")
+
+
+def test_cache_eviction(tmp_path: Path):
+    cache = VerdictCache(tmp_path, max_size=100)
+    cache.store("key1", CachedVerdict("sat", "a" * 40))
+    os.utime(tmp_path / "key1.json", (0, 0))
+    cache.store("key2", CachedVerdict("sat", "b" * 40))
+    assert cache.lookup("key1") is None
+    assert cache.lookup("key2") is not None
+
+
+def test_cache_size_is_kept_up_to_date(tmp_path: Path):
+    cache = VerdictCache(tmp_path)
+    cache.store("key1", CachedVerdict("sat", "a" * 40))
+    cache.store("key2", CachedVerdict("unsat"))
+    cache.store("key1", CachedVerdict("unsat"))
+    reopened = VerdictCache(tmp_path)
+    assert (cache.size, cache.num_entries) == (reopened.size, reopened.num_entries)
+    assert cache.num_entries == 2
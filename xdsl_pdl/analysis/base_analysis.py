@@ -0,0 +1,108 @@
+"""
+Decide `irdl_ext.check_subset` queries with an abstract interpretation of both
+regions over the lattice of attribute bases, without creating an SMT query.
+"""
+
+from __future__ import annotations
+
+from xdsl.dialects.irdl import AllOfOp, AnyOfOp, AnyOp, BaseOp
+from xdsl.ir import Operation, SSAValue
+
+from xdsl_pdl.analysis.constraint_dag import ConstraintDAG
+from xdsl_pdl.analysis.structural_check import StructuralVerdict, get_yield
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, MatchOp, YieldOp
+
+
+def _get_defining_ops(value: SSAValue) -> set[Operation]:
+    """Get the operations a value transitively depends on, including its own."""
+    ops: set[Operation] = set()
+    values_to_walk = [value]
+    while values_to_walk:
+        op = values_to_walk.pop().owner
+        if not isinstance(op, Operation) or op in ops:
+            continue
+        ops.add(op)
+        values_to_walk.extend(op.operands)
+    return ops
+
+
+def _has_only_base_constraints(check_subset: CheckSubsetOp, dag: ConstraintDAG) -> bool:
+    """
+    Check that the rhs only constrains the bases of its yielded values, and that
+    the constraints of each yielded value are independent of the other ones.
+    In that case, the abstract base set of each rhs yielded value is exactly the
+    set of values it accepts.
+    This requires that every rhs constraint, and every value checked by an
+    `irdl_ext.match`, is part of the DAG of a yielded value, and that no rhs
+    value has an empty base set, as such a value cannot be matched.
+    """
+    for op in check_subset.rhs.ops:
+        if not isinstance(op, AnyOp | BaseOp | AnyOfOp | AllOfOp | MatchOp | YieldOp):
+            return False
+
+    # Two yielded values sharing a constraint may be forced to be equal
+    walked_ops: set[Operation] = set()
+    for arg in get_yield(check_subset.rhs.block).args:
+        ops = _get_defining_ops(arg)
+        if not walked_ops.isdisjoint(ops):
+            return False
+        walked_ops |= ops
+
+    for op in check_subset.rhs.ops:
+        if isinstance(op, YieldOp):
+            continue
+        if isinstance(op, MatchOp):
+            if op.arg.owner not in walked_ops:
+                return False
+            continue
+        if op not in walked_ops:
+            return False
+        if any(dag.get_base_mask(result) == 0 for result in op.results):
+            return False
+    return True
+
+
+def check_subset_with_bases(check_subset: CheckSubsetOp) -> StructuralVerdict | None:
+    """
+    Try to decide if the lhs of a `irdl_ext.check_subset` is a subset of its
+    rhs by comparing the base sets of the values yielded at each position.
+    A yielded value is never unassigned, so it always has one of the bases of its
+    abstract base set.
+
+    The query is satisfiable when, at some position, no lhs base is accepted by
+    the rhs. This assumes that the lhs is satisfiable, which is the case of any
+    pattern that can match.
+    The query is unsatisfiable when the rhs only constrains the bases of its
+    yielded values, and accepts every lhs base at every position.
+    Return None if the query needs the solver.
+    """
+    dag = ConstraintDAG()
+    lhs_yield = get_yield(check_subset.lhs.block)
+    rhs_yield = get_yield(check_subset.rhs.block)
+    yielded_bases = [
+        (
+            dag.get_base_names(dag.get_base_mask(lhs_arg)),
+            dag.get_base_names(dag.get_base_mask(rhs_arg)),
+        )
+        for lhs_arg, rhs_arg in zip(lhs_yield.args, rhs_yield.args, strict=True)
+    ]
+
+    for index, (lhs_bases, rhs_bases) in enumerate(yielded_bases):
+        if not lhs_bases or rhs_bases is None:
+            continue
+        if lhs_bases.isdisjoint(rhs_bases):
+            return StructuralVerdict(
+                "sat",
+                f"the lhs value at position {index} has bases "
+                f"{sorted(lhs_bases)}, but the rhs only accepts "
+                f"{sorted(rhs_bases)}",
+            )
+
+    if not _has_only_base_constraints(check_subset, dag):
+        return None
+    for lhs_bases, rhs_bases in yielded_bases:
+        if rhs_bases is None:
+            continue
+        if lhs_bases is None or not lhs_bases <= rhs_bases:
+            return None
+    return StructuralVerdict("unsat", "the rhs accepts every base of the lhs")
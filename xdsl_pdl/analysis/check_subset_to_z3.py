@@ -3,8 +3,10 @@ Create an SMT query to check if a group of IRDL
 variables represent a subset of other IRDL variables.
 """
 
-from typing import Any, Callable, Sequence
-from xdsl.traits import SymbolTable
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Sequence, TypeAlias, cast
 from xdsl.utils.hints import isa
 import z3
 
@@ -16,6 +18,7 @@ from xdsl.dialects.builtin import (
     Signedness,
     SignednessAttr,
     StringAttr,
+    SymbolRefAttr,
 )
 from xdsl.dialects.irdl import (
     AllOfOp,
@@ -29,18 +32,22 @@ from xdsl.dialects.irdl import (
     DialectOp,
 )
 
-from xdsl.ir import Attribute, Operation, SSAValue
+from xdsl.dialects import pdl
+from xdsl.ir import Attribute, Operation, ParametrizedAttribute, SSAValue
 from xdsl.parser import IndexType, ModuleOp
 from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, EqOp, MatchOp, YieldOp
 
 
-def add_attribute_constructors_from_irdl(
-    attribute_sort: z3.DatatypeSort, module: ModuleOp
-):
+def get_attribute_definitions(
+    module: ModuleOp, names: Collection[str] | None = None
+) -> tuple[tuple[str, int], ...]:
     """
-    Add an attribute datatype constructor for each attribute and type definition
-    found in the IRDL program.
+    Get the name and number of parameters of each attribute and type definition
+    found in the IRDL program, or only of the definitions in `names` if given.
+    This is the only information the Attribute datatype depends on, so it is
+    also used as the fingerprint of the datatype.
     """
+    definitions: list[tuple[str, int]] = []
     for attr_def in module.walk():
         if not isinstance(attr_def, TypeOp | AttributeOp):
             continue
@@ -50,25 +57,230 @@ def add_attribute_constructors_from_irdl(
         dialect_def = attr_def.parent_op()
         assert isinstance(dialect_def, DialectOp)
         name = dialect_def.sym_name.data + "." + attr_def.sym_name.data
+        if names is not None and name not in names:
+            continue
+        definitions.append((name, num_parameters))
+    return tuple(definitions)
+
+
+def add_attribute_constructors_from_irdl(
+    attribute_sort: z3.DatatypeSort,
+    module: ModuleOp,
+    names: Collection[str] | None = None,
+):
+    """
+    Add an attribute datatype constructor for each attribute and type definition
+    found in the IRDL program, or only for the definitions in `names` if given.
+    """
+    for name, num_parameters in get_attribute_definitions(module, names):
         attribute_sort.declare(
             name,
             *[(f"{name}_arg_{i}", attribute_sort) for i in range(num_parameters)],
         )
 
 
-def create_z3_attribute(attribute_sort: Any, attr_name: str, *parameters: Any) -> Any:
-    if parameters:
-        return attribute_sort.__dict__[attr_name](*parameters)
-    return attribute_sort.__dict__[attr_name]
+# The strings that signedness attributes are encoded with.
+SIGNEDNESS_STRINGS = ("signless", "signed", "unsigned")
+
+
+def _add_string_literals(attr: Attribute, literals: set[str]):
+    if isinstance(attr, StringAttr):
+        literals.add(attr.data)
+    elif isinstance(attr, ArrayAttr):
+        for element in cast(ArrayAttr[Attribute], attr).data:
+            _add_string_literals(element, literals)
+    elif isinstance(attr, ParametrizedAttribute):
+        for parameter in attr.parameters:
+            _add_string_literals(parameter, literals)
 
 
-def convert_attr_to_z3_attr(attr: Attribute, attribute_sort: Any) -> Any:
+def get_string_literals(module: Operation) -> set[str]:
+    """
+    Get the strings found in the constant attributes of an IRDL or PDL program,
+    including the strings used to encode signedness attributes.
+    """
+    literals = set(SIGNEDNESS_STRINGS)
+    for op in module.walk():
+        if isinstance(op, IsOp):
+            _add_string_literals(op.expected, literals)
+        elif isinstance(op, pdl.AttributeOp) and op.value is not None:
+            _add_string_literals(op.value, literals)
+        elif isinstance(op, pdl.TypeOp) and op.constantType is not None:
+            _add_string_literals(op.constantType, literals)
+    return literals
+
+
+@dataclass(frozen=True)
+class AttributeSort:
+    """
+    The z3 Attribute datatype of an IRDL program, with its constructors,
+    recognizers, and accessors indexed by constructor name.
+    It also caches the lowering of symbol references and builtin attributes, so
+    they are only resolved once per IRDL specification.
+    """
+
+    sort: Any
+    constructors: dict[str, Any]
+    recognizers: dict[str, Any]
+    accessors: dict[str, list[Any]]
+
+    unassigned: Any
+    """The value of the `unassigned` constructor."""
+
+    int_width: int | None = None
+    """
+    The width of the bit-vectors encoding integers, or None if integers are
+    encoded with unbounded integers.
+    """
+
+    string_values: dict[str, Any] | None = None
+    """
+    The bit-vectors encoding each string literal, or None if strings are encoded
+    with the z3 string theory. The other bit-vectors encode the other strings.
+    """
+
+    symbol_names: dict[SymbolRefAttr, str] = field(default_factory=dict)
+    """The constructor name of each attribute definition symbol already resolved."""
+
+    converted_attrs: dict[Attribute, Any] = field(default_factory=dict)
+    """The z3 value of each builtin attribute already converted."""
+
+    @staticmethod
+    def from_datatype(
+        sort: Any,
+        int_width: int | None = None,
+        string_values: dict[str, Any] | None = None,
+    ) -> AttributeSort:
+        constructors: dict[str, Any] = {}
+        recognizers: dict[str, Any] = {}
+        accessors: dict[str, list[Any]] = {}
+        for index in range(sort.num_constructors()):
+            constructor = sort.constructor(index)
+            name = constructor.name()
+            constructors[name] = constructor
+            recognizers[name] = sort.recognizer(index)
+            accessors[name] = [
+                sort.accessor(index, arg) for arg in range(constructor.arity())
+            ]
+        return AttributeSort(
+            sort,
+            constructors,
+            recognizers,
+            accessors,
+            constructors["unassigned"](),
+            int_width,
+            string_values,
+        )
+
+    def get_constructor_name(self, symbol: SymbolRefAttr) -> str:
+        """
+        Get the constructor name of an attribute or type definition, given the
+        symbol `@dialect::@name` referencing it.
+        """
+        if (name := self.symbol_names.get(symbol)) is not None:
+            return name
+        if len(symbol.nested_references.data) != 1:
+            raise Exception(f"Cannot find symbol {symbol}")
+        name = symbol.root_reference.data + "." + symbol.nested_references.data[0].data
+        if name not in self.constructors:
+            raise Exception(f"Cannot find symbol {symbol}")
+        self.symbol_names[symbol] = name
+        return name
+
+    def get_int_value(self, value: int) -> Any:
+        """Get the z3 value encoding an integer."""
+        if self.int_width is None:
+            return z3.IntVal(value)
+        # Only equalities are used on integers, so the bit-vector encoding is
+        # exact as long as two distinct integers are not encoded the same way.
+        bound = 2 ** (self.int_width - 1)
+        if not -bound <= value < bound:
+            raise Exception(
+                f"Integer {value} cannot be encoded in a {self.int_width}-bit "
+                "bit-vector"
+            )
+        return z3.BitVecVal(value, self.int_width)
+
+    def get_string_value(self, value: str) -> Any:
+        """Get the z3 value encoding a string."""
+        if self.string_values is None:
+            return z3.StringVal(value)
+        if value not in self.string_values:
+            raise Exception(f"String {value!r} is not a literal of the encoding")
+        return self.string_values[value]
+
+    def check_num_values(self, num_values: int):
+        """
+        Check that the bounded encoding has enough strings that are not
+        literals for a query with this number of values, see
+        `get_num_other_strings`.
+        """
+        if self.int_width is None or self.string_values is None:
+            return
+        num_other_strings = get_num_other_strings(
+            self.int_width, len(self.string_values)
+        )
+        if num_values > num_other_strings:
+            raise Exception(
+                f"A query with {num_values} values may need more than the "
+                f"{num_other_strings} strings that are not literals of the "
+                f"{self.int_width}-bit encoding"
+            )
+
+
+def get_num_other_strings(int_width: int, num_literals: int) -> int:
+    """
+    Get the number of strings that are not literals of the program in the
+    bounded encoding, where strings are encoded as bit-vectors of `int_width`
+    bits, and the first bit-vectors encode the literals.
+
+    Strings are only compared for equality, with each other and with literals.
+    A counterexample to a query can then be changed to only use the literals
+    and the strings that have to be distinct, by mapping each other string to
+    a literal: the rhs constraints only use positive equalities between
+    strings, so they are not satisfied by the new lhs values either. Only the
+    strings that are terms of values of the query can be told apart by its
+    constraints, so one other string per value of the query is enough, which
+    `AttributeSort.check_num_values` checks.
+    """
+    return 2**int_width - num_literals
+
+
+# Attribute datatypes that were already created, indexed by the attribute
+# definitions they were created from, and by the bounded encoding parameters.
+_attribute_sorts: dict[
+    tuple[tuple[tuple[str, int], ...], int | None, tuple[str, ...]], AttributeSort
+] = {}
+
+
+def create_z3_attribute(
+    attribute_sort: AttributeSort, attr_name: str, *parameters: Any
+) -> Any:
+    return attribute_sort.constructors[attr_name](*parameters)
+
+
+def convert_attr_to_z3_attr(attr: Attribute, attribute_sort: AttributeSort) -> Any:
+    if (converted := attribute_sort.converted_attrs.get(attr)) is not None:
+        return converted
+    converted = _convert_attr_to_z3_attr(attr, attribute_sort)
+    attribute_sort.converted_attrs[attr] = converted
+    return converted
+
+
+# A concrete attribute, as the name of its constructor in the Attribute datatype
+# followed by its parameters. Integers and strings are `("int", value)` and
+# `("string", value)`.
+AttributeTerm: TypeAlias = tuple[Any, ...]
+
+
+def convert_attr_to_term(attr: Attribute) -> AttributeTerm:
+    """Convert an xDSL attribute to a value of the Attribute datatype."""
     if attr == IndexType():
-        return attribute_sort.__dict__["builtin.index"]
+        return ("builtin.index",)
     if isinstance(attr, IntegerType):
-        bitwidth = convert_attr_to_z3_attr(attr.width, attribute_sort)
-        signedness = convert_attr_to_z3_attr(attr.signedness, attribute_sort)
-        return attribute_sort.__dict__["builtin.integer_type"](bitwidth, signedness)
+        bitwidth = convert_attr_to_term(attr.width)
+        signedness = convert_attr_to_term(attr.signedness)
+        return ("builtin.integer_type", bitwidth, signedness)
     if isinstance(attr, SignednessAttr):
         match attr.data:
             case Signedness.SIGNLESS:
@@ -77,22 +289,42 @@ def convert_attr_to_z3_attr(attr: Attribute, attribute_sort: Any) -> Any:
                 opcode = "signed"
             case Signedness.UNSIGNED:
                 opcode = "unsigned"
-        opcode_attr = convert_attr_to_z3_attr(StringAttr(opcode), attribute_sort)
-        return attribute_sort.__dict__["builtin.signedness"](opcode_attr)
+        return ("builtin.signedness", convert_attr_to_term(StringAttr(opcode)))
     if isa(attr, AnyIntegerAttr):
-        value = convert_attr_to_z3_attr(attr.value, attribute_sort)
-        type = convert_attr_to_z3_attr(attr.type, attribute_sort)
-        return attribute_sort.__dict__["builtin.integer_attr"](value, type)
+        value = convert_attr_to_term(attr.value)
+        type = convert_attr_to_term(attr.type)
+        return ("builtin.integer_attr", value, type)
     if isinstance(attr, StringAttr):
-        return attribute_sort.__dict__["string"](z3.StringVal(attr.data))
+        return ("string", attr.data)
     if isinstance(attr, IntAttr):
-        return attribute_sort.__dict__["int"](attr.data)
+        return ("int", attr.data)
     raise Exception(f"Unknown attribute {attr}")
 
 
+def _convert_term_to_z3_attr(term: AttributeTerm, attribute_sort: AttributeSort) -> Any:
+    name, *parameters = term
+    if name == "int":
+        return create_z3_attribute(
+            attribute_sort, "int", attribute_sort.get_int_value(parameters[0])
+        )
+    if name == "string":
+        return create_z3_attribute(
+            attribute_sort, "string", attribute_sort.get_string_value(parameters[0])
+        )
+    return create_z3_attribute(
+        attribute_sort,
+        name,
+        *(_convert_term_to_z3_attr(param, attribute_sort) for param in parameters),
+    )
+
+
+def _convert_attr_to_z3_attr(attr: Attribute, attribute_sort: AttributeSort) -> Any:
+    return _convert_term_to_z3_attr(convert_attr_to_term(attr), attribute_sort)
+
+
 def get_constraint_as_z3(
     op: Operation,
-    attribute_sort: Any,
+    attribute_sort: AttributeSort,
     values_to_z3: dict[SSAValue, z3.ExprRef],
     create_value: Callable[[SSAValue], z3.ExprRef],
     add_constraint: Callable[[Any], None],
@@ -132,31 +364,16 @@ def get_constraint_as_z3(
             attribute_name = op.base_name.data[1:]
         else:
             assert op.base_ref is not None
-            base_attr_def = SymbolTable.lookup_symbol(op, op.base_ref)
-            if not isinstance(base_attr_def, AttributeOp | TypeOp):
-                raise Exception(f"Cannot find symbol {op.base_ref}")
-            dialect_def = base_attr_def.parent_op()
-            assert isinstance(dialect_def, DialectOp)
-            attribute_name = (
-                dialect_def.sym_name.data + "." + base_attr_def.sym_name.data
-            )
+            attribute_name = attribute_sort.get_constructor_name(op.base_ref)
         values_to_z3[op.output] = create_value(op.output)
-        is_base = attribute_sort.__dict__["is_" + attribute_name](
-            values_to_z3[op.output]
-        )
+        is_base = attribute_sort.recognizers[attribute_name](values_to_z3[op.output])
         add_constraint(
             z3.Or(is_base, values_to_z3[op.output] == attribute_sort.unassigned)
         )
         return
     if isinstance(op, ParametricOp):
-        base_attr_def = SymbolTable.lookup_symbol(op, op.base_type)
-        if not isinstance(base_attr_def, AttributeOp | TypeOp):
-            raise Exception(f"Cannot find symbol {op.base_type}")
-        dialect_def = base_attr_def.parent_op()
-        assert isinstance(dialect_def, DialectOp)
-
+        attribute_name = attribute_sort.get_constructor_name(op.base_type)
         parameters = [values_to_z3[arg] for arg in op.args]
-        attribute_name = dialect_def.sym_name.data + "." + base_attr_def.sym_name.data
 
         values_to_z3[op.output] = create_value(op.output)
         add_constraint(
@@ -186,16 +403,49 @@ def get_constraint_as_z3(
     assert False, f"Unsupported op {op.name}"
 
 
-def check_subset_to_z3(program: ModuleOp, solver: z3.Solver):
-    assert isinstance(main := program.ops.last, CheckSubsetOp)
+def create_attribute_sort(
+    module: ModuleOp,
+    int_width: int | None = None,
+    string_literals: set[str] | None = None,
+    names: Collection[str] | None = None,
+) -> AttributeSort:
+    """
+    Create the Attribute datatype corresponding to the attribute and type
+    definitions of an IRDL program.
+    The datatype only depends on the IRDL definitions, so it is memoized, and
+    all queries against the same IRDL specification share it.
+    If `int_width` is set, integers are encoded as bit-vectors of that width,
+    and strings as bit-vectors of that width, the first of which encode the
+    string literals found in the program and in `string_literals`. This bounded
+    encoding is decidable by bit-blasting.
+    If `names` is given, only the definitions with these names are added to the
+    datatype, and the other attributes are encoded as `other` attributes.
+    """
+    definitions = get_attribute_definitions(module, names)
+    literals: tuple[str, ...] = ()
+    if int_width is not None:
+        literals = tuple(
+            sorted(get_string_literals(module) | (string_literals or set()))
+        )
+    key = (definitions, int_width, literals)
+    if (cached_sort := _attribute_sorts.get(key)) is not None:
+        return cached_sort
 
-    # Set name_hints on values that don't have one and that are used in YieldOp
-    for op in program.walk():
-        if isinstance(op, YieldOp) and "name_hints" in op.attributes:
-            assert isa(op.attributes["name_hints"], ArrayAttr[StringAttr])
-            for index, arg in enumerate(op.args):
-                if not arg.name_hint:
-                    arg.name_hint = op.attributes["name_hints"].data[index].data
+    int_sort = z3.IntSort()
+    string_sort = z3.StringSort()
+    string_values = None
+    if int_width is not None:
+        int_sort = z3.BitVecSort(int_width)
+        if get_num_other_strings(int_width, len(literals)) <= 0:
+            raise Exception(
+                f"The {len(literals)} string literals cannot be encoded in a "
+                f"{int_width}-bit bit-vector"
+            )
+        string_sort = z3.BitVecSort(int_width)
+        string_values = {
+            literal: z3.BitVecVal(index, int_width)
+            for index, literal in enumerate(literals)
+        }
 
     # The Attribute datatype is an union of all possible attributes found in the
     # IRDL program, plus an "Other" attribute that correspond to any other
@@ -205,11 +455,187 @@ def check_subset_to_z3(program: ModuleOp, solver: z3.Solver):
     # instance.
     attribute_sort: Any = z3.Datatype("Attribute")
     attribute_sort.declare("unassigned")
-    attribute_sort.declare("other", ("other_arg_0", z3.IntSort()))
-    attribute_sort.declare("int", ("int_arg_0", z3.IntSort()))
-    attribute_sort.declare("string", ("string_arg_0", z3.StringSort()))
-    add_attribute_constructors_from_irdl(attribute_sort, program)
-    attribute_sort = attribute_sort.create()
+    attribute_sort.declare("other", ("other_arg_0", int_sort))
+    attribute_sort.declare("int", ("int_arg_0", int_sort))
+    attribute_sort.declare("string", ("string_arg_0", string_sort))
+    add_attribute_constructors_from_irdl(attribute_sort, module, names)
+    sort = AttributeSort.from_datatype(
+        attribute_sort.create(), int_width, string_values
+    )
+    _attribute_sorts[key] = sort
+    return sort
+
+
+# Maximum number of cases the quantifier-free encoding may split an existential
+# query into. Past that, the remaining constants stay existentially quantified.
+MAX_QUANTIFIER_FREE_CASES = 256
+
+
+def _flatten_conjunction(constraints: Sequence[Any]) -> list[Any]:
+    """Split the `z3.And` in a list of constraints, and remove `True` constraints."""
+    result: list[Any] = []
+    worklist = list(reversed(constraints))
+    while worklist:
+        constraint = worklist.pop()
+        if z3.is_and(constraint):
+            worklist.extend(reversed(constraint.children()))
+        elif not z3.is_true(constraint):
+            result.append(constraint)
+    return result
+
+
+def _occurs_in(constant: Any, expr: Any) -> bool:
+    """Check if a z3 constant appears in a z3 expression."""
+    worklist = [expr]
+    visited: set[int] = set()
+    while worklist:
+        current = worklist.pop()
+        if current.get_id() in visited:
+            continue
+        visited.add(current.get_id())
+        if current.eq(constant):
+            return True
+        worklist.extend(current.children())
+    return False
+
+
+def _find_definition(
+    constants: list[Any], constraints: list[Any]
+) -> tuple[int, Any, Any] | None:
+    """
+    Find a constraint `c == t` where `c` is one of the given constants, and `t`
+    does not depend on `c`. Return the constraint index, `c`, and `t`.
+    """
+    constant_ids = {constant.get_id() for constant in constants}
+    for index, constraint in enumerate(constraints):
+        if not z3.is_eq(constraint):
+            continue
+        lhs, rhs = constraint.children()
+        for constant, term in ((lhs, rhs), (rhs, lhs)):
+            if constant.get_id() not in constant_ids:
+                continue
+            if not _occurs_in(constant, term):
+                return index, constant, term
+    return None
+
+
+def _find_case_split(constants: list[Any], constraints: list[Any]) -> int | None:
+    """
+    Find a disjunction where each case defines one of the given constants,
+    such as the ones created by `irdl.any_of`. Return its index.
+    """
+    for index, constraint in enumerate(constraints):
+        if not z3.is_or(constraint):
+            continue
+        if all(
+            _find_definition(constants, _flatten_conjunction([case])) is not None
+            for case in constraint.children()
+        ):
+            return index
+    return None
+
+
+def _eliminate_existentials(
+    constants: list[Any],
+    constraints: list[Any],
+    remaining_constants: list[Any],
+    num_cases: list[int],
+) -> Any:
+    """
+    Return a formula equivalent to `Exists(constants, And(constraints))`, where
+    the constants that are defined by an equality are replaced by their
+    definition, and where disjunctions of definitions are split into cases.
+    Constants that cannot be eliminated are added to `remaining_constants`.
+    """
+    constants = list(constants)
+    constraints = _flatten_conjunction(constraints)
+
+    # Replace each constant defined by an equality by its definition.
+    while (definition := _find_definition(constants, constraints)) is not None:
+        index, constant, term = definition
+        del constraints[index]
+        constants = [c for c in constants if not c.eq(constant)]
+        constraints = _flatten_conjunction(
+            [z3.simplify(z3.substitute(c, (constant, term))) for c in constraints]
+        )
+        if any(z3.is_false(constraint) for constraint in constraints):
+            return z3.BoolVal(False)
+
+    # Split the query on disjunctions of definitions, if the number of cases
+    # stays in the budget.
+    if (index := _find_case_split(constants, constraints)) is not None:
+        cases = constraints[index].children()
+        if num_cases[0] + len(cases) - 1 <= MAX_QUANTIFIER_FREE_CASES:
+            num_cases[0] += len(cases) - 1
+            others = constraints[:index] + constraints[index + 1 :]
+            return z3.Or(
+                [
+                    _eliminate_existentials(
+                        constants, [case, *others], remaining_constants, num_cases
+                    )
+                    for case in cases
+                ]
+            )
+
+    # Only keep the constants that are still used
+    constants = [
+        constant
+        for constant in constants
+        if any(_occurs_in(constant, constraint) for constraint in constraints)
+    ]
+    if not constants:
+        return z3.And(constraints)
+    remaining_constants.extend(constants)
+    return z3.Exists(constants, z3.And(constraints))
+
+
+@dataclass
+class SubsetQueryInfo:
+    """Information about the SMT query created for an `irdl_ext.check_subset`."""
+
+    num_quantified_constants: int
+    """Number of existentially quantified constants left in the query."""
+
+    num_constraints: int
+    """Number of constraints created for the rhs of the query."""
+
+    num_constructors: int
+    """Number of constructors of the Attribute datatype used by the query."""
+
+
+def check_subset_to_z3(
+    program: ModuleOp,
+    solver: z3.Solver,
+    attribute_sort: AttributeSort | None = None,
+    quantifier_free: bool = False,
+    int_width: int | None = None,
+    check_subset: CheckSubsetOp | None = None,
+) -> SubsetQueryInfo:
+    """
+    Add to the solver the constraints that are satisfiable if and only if the
+    lhs of the `irdl_ext.check_subset` operation is not a subset of its rhs.
+    The operation is the last one of the program, unless `check_subset` is given.
+    If no attribute sort is given, it is created from the IRDL definitions found
+    in the program, with the bounded encoding of `int_width` if it is set.
+    If `quantifier_free` is set, the rhs constants are instantiated with the lhs
+    terms they are equal to, and `irdl.any_of` are split into cases, so the
+    query does not contain an existential quantifier when all rhs constraints
+    are functional.
+    """
+    main = check_subset if check_subset is not None else program.ops.last
+    assert isinstance(main, CheckSubsetOp)
+
+    # Set name_hints on values that don't have one and that are used in YieldOp
+    for op in main.walk():
+        if isinstance(op, YieldOp) and "name_hints" in op.attributes:
+            assert isa(op.attributes["name_hints"], ArrayAttr[StringAttr])
+            for index, arg in enumerate(op.args):
+                if not arg.name_hint:
+                    arg.name_hint = op.attributes["name_hints"].data[index].data
+
+    if attribute_sort is None:
+        attribute_sort = create_attribute_sort(program, int_width)
+    sort = attribute_sort.sort
 
     # Mapping from IRDL attribute values to their corresponding z3 value
     values_to_z3: dict[SSAValue, z3.ExprRef] = {}
@@ -219,7 +645,7 @@ def check_subset_to_z3(program: ModuleOp, solver: z3.Solver):
     def create_z3_constant(val: SSAValue) -> Any:
         nonlocal name_index
         name_index += 1
-        return z3.Const((val.name_hint or "tmp") + str(name_index), attribute_sort)
+        return z3.Const((val.name_hint or "tmp") + str(name_index), sort)
 
     # Walk the lhs, and create the z3 expressions of each constraint
     for op in main.lhs.walk():
@@ -259,4 +685,37 @@ def check_subset_to_z3(program: ModuleOp, solver: z3.Solver):
 
     for lhs_arg, rhs_arg in zip(lhs_yield.args, rhs_yield.args):
         constraints.append(values_to_z3[lhs_arg] == values_to_z3[rhs_arg])
-    solver.add(z3.Not(z3.Exists(constants, z3.And(constraints))))
+
+    attribute_sort.check_num_values(name_index)
+    return add_rhs_to_solver(
+        solver, attribute_sort, constants, constraints, quantifier_free
+    )
+
+
+def add_rhs_to_solver(
+    solver: z3.Solver,
+    attribute_sort: AttributeSort,
+    constants: list[Any],
+    constraints: list[Any],
+    quantifier_free: bool = False,
+) -> SubsetQueryInfo:
+    """
+    Add to the solver that the rhs constraints, over the rhs constants, cannot
+    be satisfied. The rhs constraints should include the equality of the values
+    yielded by both sides.
+    """
+    if not quantifier_free:
+        solver.add(z3.Not(z3.Exists(constants, z3.And(constraints))))
+        return SubsetQueryInfo(
+            len(constants), len(constraints), len(attribute_sort.constructors)
+        )
+
+    remaining_constants: list[Any] = []
+    solver.add(
+        z3.Not(
+            _eliminate_existentials(constants, constraints, remaining_constants, [1])
+        )
+    )
+    return SubsetQueryInfo(
+        len(remaining_constants), len(constraints), len(attribute_sort.constructors)
+    )
@@ -0,0 +1,411 @@
+"""
+Evaluate IRDL constraints over concrete attributes, to find counterexamples to
+`irdl_ext.check_subset` queries without creating an SMT query.
+
+The evaluator follows the semantics of the SMT encoding of `check_subset_to_z3`:
+values are terms of the Attribute datatype, and any value may be unassigned,
+except the ones that are matched or yielded.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+from dataclasses import dataclass
+from typing import Callable, Iterable, Sequence
+
+from xdsl.dialects.builtin import IndexType, IntegerAttr, IntegerType, Signedness
+from xdsl.dialects.irdl import AllOfOp, AnyOfOp, AnyOp, BaseOp, IsOp, ParametricOp
+from xdsl.ir import Attribute, Block, Operation, SSAValue
+
+from xdsl_pdl.analysis.check_subset_to_z3 import AttributeTerm, convert_attr_to_term
+from xdsl_pdl.analysis.constraint_dag import get_base_name
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, EqOp, MatchOp, YieldOp
+from xdsl_pdl.passes.optimize_irdl import get_bases
+
+UNASSIGNED: AttributeTerm = ("unassigned",)
+
+
+class _RequireAssigned:
+    """The state of a value that is not bound yet, but cannot be unassigned."""
+
+
+# The state of a value during matching: either bound to a term, free (None), or
+# free but required to be assigned.
+_REQUIRE_ASSIGNED = _RequireAssigned()
+_Environment = list[AttributeTerm | _RequireAssigned | None]
+_Matcher = Callable[[_Environment], bool]
+
+
+class UnknownMatch(Exception):
+    """Raised when the evaluator cannot decide if a region accepts some values."""
+
+
+def _bind(env: _Environment, index: int, term: AttributeTerm) -> bool:
+    current = env[index]
+    if current is None or (current is _REQUIRE_ASSIGNED and term != UNASSIGNED):
+        env[index] = term
+        return True
+    return current == term
+
+
+def _require_assigned(env: _Environment, index: int) -> bool:
+    current = env[index]
+    if current is None:
+        env[index] = _REQUIRE_ASSIGNED
+        return True
+    return current != UNASSIGNED
+
+
+def _is_bound(state: AttributeTerm | _RequireAssigned | None) -> bool:
+    return state is not None and state is not _REQUIRE_ASSIGNED
+
+
+def _compile_op(
+    op: Operation, indices: dict[SSAValue, int], next: _Matcher
+) -> _Matcher:
+    """
+    Compile the constraint of an operation into a matcher, that checks the
+    constraint against the values bound by the users of the operation, binds the
+    operands accordingly, and calls the matcher of the previous operations.
+    Operations that have a choice copy the environment for each alternative.
+    """
+    if isinstance(op, MatchOp):
+        arg = indices[op.arg]
+        return lambda env: _require_assigned(env, arg) and next(env)
+
+    if isinstance(op, EqOp):
+        args = [indices[arg] for arg in op.args]
+
+        def match_eq(env: _Environment) -> bool:
+            bound = [env[arg] for arg in args if _is_bound(env[arg])]
+            if not bound:
+                if len(set(args)) > 1:
+                    raise UnknownMatch("irdl_ext.eq on unbound values")
+                return next(env)
+            term = bound[0]
+            assert isinstance(term, tuple)
+            return all(_bind(env, arg, term) for arg in args) and next(env)
+
+        return match_eq
+
+    if isinstance(op, AnyOp):
+        return next
+
+    result = indices[op.results[0]]
+
+    if isinstance(op, IsOp):
+        try:
+            expected = convert_attr_to_term(op.expected)
+        except Exception as e:
+            raise UnknownMatch(str(e))
+
+        def match_is(env: _Environment) -> bool:
+            current = env[result]
+            if _is_bound(current) and current != expected:
+                return False
+            return next(env)
+
+        return match_is
+
+    if isinstance(op, BaseOp):
+        if op.base_ref is not None:
+            base_name = get_base_name(op.base_ref)
+        else:
+            assert op.base_name is not None
+            base_name = get_base_name(op.base_name.data)
+
+        def match_base(env: _Environment) -> bool:
+            current = env[result]
+            if isinstance(current, tuple) and current != UNASSIGNED:
+                if current[0] != base_name:
+                    return False
+            return next(env)
+
+        return match_base
+
+    if isinstance(op, ParametricOp):
+        base_name = get_base_name(op.base_type)
+        args = [indices[arg] for arg in op.args]
+
+        def match_parametric(env: _Environment) -> bool:
+            current = env[result]
+            if current is None:
+                return next(env)
+            if current is _REQUIRE_ASSIGNED:
+                return all(_require_assigned(env, arg) for arg in args) and next(env)
+            assert isinstance(current, tuple)
+            if current == UNASSIGNED:
+                # One of the parameters is unassigned
+                for arg in args:
+                    if env[arg] is None or env[arg] == UNASSIGNED:
+                        new_env = env.copy()
+                        new_env[arg] = UNASSIGNED
+                        if next(new_env):
+                            return True
+                return False
+            if current[0] != base_name or len(current) != len(args) + 1:
+                return False
+            return all(
+                _bind(env, arg, param) for arg, param in zip(args, current[1:])
+            ) and next(env)
+
+        return match_parametric
+
+    if isinstance(op, AnyOfOp):
+        args = [indices[arg] for arg in op.args]
+
+        def match_any_of(env: _Environment) -> bool:
+            current = env[result]
+            if current is None or current == UNASSIGNED:
+                return next(env)
+            for arg in args:
+                new_env = env.copy()
+                if current is _REQUIRE_ASSIGNED:
+                    matched = _require_assigned(new_env, arg)
+                else:
+                    assert isinstance(current, tuple)
+                    matched = _bind(new_env, arg, current)
+                if matched and next(new_env):
+                    return True
+            return False
+
+        return match_any_of
+
+    if isinstance(op, AllOfOp):
+        args = [indices[arg] for arg in op.args]
+
+        def match_all_of(env: _Environment) -> bool:
+            current = env[result]
+            if current is None or current == UNASSIGNED:
+                return next(env)
+            if current is _REQUIRE_ASSIGNED:
+                if not args:
+                    return next(env)
+                if len(set(args)) == 1:
+                    return _require_assigned(env, args[0]) and next(env)
+                bound = [env[arg] for arg in args if _is_bound(env[arg])]
+                if not bound:
+                    raise UnknownMatch("irdl.all_of on unbound values")
+                if UNASSIGNED in bound:
+                    return False
+                current = bound[0]
+            assert isinstance(current, tuple)
+            return all(_bind(env, arg, current) for arg in args) and next(env)
+
+        return match_all_of
+
+    raise UnknownMatch(f"Unsupported operation {op.name}")
+
+
+@dataclass
+class CompiledRegion:
+    """
+    A constraint region compiled into closures, that checks if the region can
+    yield given concrete values.
+    """
+
+    num_values: int
+    yielded: list[int]
+    """The index of the value yielded at each position."""
+
+    matcher: _Matcher
+
+    def accepts(self, values: Sequence[AttributeTerm]) -> bool | None:
+        """
+        Check if some assignment of the region values satisfies the region
+        constraints, and yields the given values.
+        Return None if the evaluator cannot decide it.
+        """
+        env: _Environment = [None] * self.num_values
+        for index, value in zip(self.yielded, values, strict=True):
+            if value == UNASSIGNED or not _bind(env, index, value):
+                return False
+        try:
+            return self.matcher(env)
+        except (UnknownMatch, RecursionError):
+            return None
+
+
+def compile_region(block: Block) -> CompiledRegion:
+    """
+    Compile a constraint region once, so it can be evaluated on many values.
+    The operations are matched from the last one to the first one, so the
+    value of an operation is known from its users when its constraint is checked.
+    """
+    indices: dict[SSAValue, int] = {}
+    for op in block.ops:
+        for result in op.results:
+            indices[result] = len(indices)
+
+    assert isinstance(yield_op := block.last_op, YieldOp)
+    matcher: _Matcher = lambda env: True
+    try:
+        for op in block.ops:
+            if op is not yield_op:
+                matcher = _compile_op(op, indices, matcher)
+    except UnknownMatch as error:
+
+        def match_unsupported(env: _Environment) -> bool:
+            raise error
+
+        matcher = match_unsupported
+
+    return CompiledRegion(
+        len(indices), [indices[arg] for arg in yield_op.args], matcher
+    )
+
+
+SMALL_INTEGERS = (0, 1, -1, 2, 8, 32)
+SMALL_SHAPES = (1, 4)
+
+
+def _get_subterms(term: AttributeTerm) -> Iterable[AttributeTerm]:
+    yield term
+    for param in term[1:]:
+        if isinstance(param, tuple):
+            yield from _get_subterms(param)
+
+
+def get_small_attributes(
+    definitions: Iterable[tuple[str, int]], constants: Iterable[Attribute] = ()
+) -> list[AttributeTerm]:
+    """
+    Get small concrete attributes to look for counterexamples with: i1, i8, i32,
+    index, integer attributes of these types, vectors and tensors of these types,
+    the constants of the query, and an instance of each definition.
+    Attributes whose constructors are not defined by the IRDL program are not
+    returned.
+    """
+    arities = dict(definitions)
+    arities |= {"other": 1, "int": 1, "string": 1}
+
+    scalar_types: list[Attribute] = [IndexType()]
+    for width in (1, 8, 32):
+        scalar_types.append(IntegerType(width))
+    scalar_types.append(IntegerType(32, Signedness.SIGNED))
+    scalar_types.append(IntegerType(32, Signedness.UNSIGNED))
+
+    candidates: list[Attribute] = [*scalar_types]
+    for value in (0, 1):
+        for scalar_type in scalar_types:
+            candidates.append(IntegerAttr(value, scalar_type))
+    candidates.extend(constants)
+
+    terms: list[AttributeTerm] = []
+    for candidate in candidates:
+        try:
+            terms.extend(_get_subterms(convert_attr_to_term(candidate)))
+        except Exception:
+            continue
+    terms.extend(("int", value) for value in SMALL_INTEGERS)
+    terms.append(("other", 0))
+    # Instances of every definition, whose parameters are attributes that are
+    # not constrained by the definitions
+    terms.extend((name, *([("other", 0)] * arity)) for name, arity in arities.items())
+
+    scalar_terms: list[AttributeTerm] = []
+    for scalar_type in scalar_types:
+        try:
+            scalar_terms.append(convert_attr_to_term(scalar_type))
+        except Exception:
+            continue
+    for container in ("builtin.vector", "builtin.tensor"):
+        if arities.get(container) != 2:
+            continue
+        for shape in SMALL_SHAPES:
+            for scalar_term in scalar_terms:
+                terms.append((container, ("int", shape), scalar_term))
+
+    def is_defined(term: AttributeTerm) -> bool:
+        return all(arities.get(t[0]) == len(t) - 1 for t in _get_subterms(term))
+
+    return [term for term in dict.fromkeys(terms) if is_defined(term)]
+
+
+@dataclass
+class Counterexample:
+    """Values yielded by the lhs of a query, but not by its rhs."""
+
+    values: tuple[AttributeTerm, ...]
+    num_samples: int
+    """The number of values that were checked before finding this one."""
+
+    def __str__(self) -> str:
+        return ", ".join(_term_to_str(value) for value in self.values)
+
+
+def _term_to_str(term: AttributeTerm) -> str:
+    name, *params = term
+    if name in ("int", "string"):
+        return repr(params[0])
+    if not params:
+        return name
+    return f"{name}<{', '.join(_term_to_str(param) for param in params)}>"
+
+
+def find_counterexample(
+    check_subset: CheckSubsetOp,
+    definitions: Iterable[tuple[str, int]],
+    max_samples: int = 1000,
+    seed: int = 0,
+) -> Counterexample | None:
+    """
+    Look for values that the lhs of a `irdl_ext.check_subset` yields, and that
+    the rhs does not, by evaluating both regions over small concrete attributes.
+    All combinations are checked if there are at most `max_samples` of them,
+    otherwise `max_samples` combinations are randomly sampled.
+    A counterexample proves that the query is satisfiable. Not finding one
+    proves nothing.
+    """
+    lhs_block = check_subset.lhs.block
+    rhs_block = check_subset.rhs.block
+    lhs = compile_region(lhs_block)
+    rhs = compile_region(rhs_block)
+
+    constants = [
+        op.expected
+        for op in itertools.chain(lhs_block.ops, rhs_block.ops)
+        if isinstance(op, IsOp)
+    ]
+    attributes = get_small_attributes(definitions, constants)
+
+    # Positions yielding the same lhs value are sampled together, and each value
+    # is only sampled among the attributes that have one of its bases.
+    assert isinstance(lhs_yield := lhs_block.last_op, YieldOp)
+    lhs_values = list(dict.fromkeys(lhs_yield.args))
+    candidates: list[list[AttributeTerm]] = []
+    for value in lhs_values:
+        if isinstance(value.owner, IsOp):
+            try:
+                candidates.append([convert_attr_to_term(value.owner.expected)])
+            except Exception:
+                return None
+            continue
+        bases = get_bases(value)
+        candidates.append(
+            [term for term in attributes if bases is None or term[0] in bases]
+        )
+    positions = [lhs_values.index(arg) for arg in lhs_yield.args]
+
+    num_combinations = 1
+    for value_candidates in candidates:
+        num_combinations *= len(value_candidates)
+    if num_combinations == 0:
+        return None
+
+    samples: Iterable[tuple[AttributeTerm, ...]]
+    if num_combinations <= max_samples:
+        samples = itertools.product(*candidates)
+    else:
+        rng = random.Random(seed)
+        samples = (
+            tuple(rng.choice(value_candidates) for value_candidates in candidates)
+            for _ in range(max_samples)
+        )
+
+    for num_samples, sample in enumerate(samples, 1):
+        values = tuple(sample[position] for position in positions)
+        if lhs.accepts(values) is True and rhs.accepts(values) is False:
+            return Counterexample(values, num_samples)
+    return None
@@ -0,0 +1,317 @@
+"""
+Hash-consed view of the IRDL constraints optimized by `optimize-irdl`, so that
+equal constraints are found with dictionary lookups rather than by walking and
+comparing their DAGs pairwise, and the shape and bases of the DAG of a value
+are only computed once.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Hashable, TypeAlias
+
+from xdsl.dialects import irdl
+from xdsl.dialects.builtin import StringAttr, SymbolRefAttr
+from xdsl.ir import Attribute, Block, Operation, SSAValue
+
+# The bases a value may have, as a bitmask of base identifiers, or None if the
+# value may have any base.
+BaseMask: TypeAlias = int | None
+
+
+def get_base_name(base: SymbolRefAttr | str) -> str:
+    """
+    Get the `dialect.name` of a base, given either as a symbol reference to its
+    definition, or as a `!dialect.name` or `#dialect.name` string.
+    Both forms are normalized, so that bases coming from `irdl.base` and
+    `irdl.parametric` operations can be compared.
+    """
+    if isinstance(base, str):
+        return base[1:]
+    names = [base.root_reference.data]
+    names.extend(nested.data for nested in base.nested_references.data)
+    return ".".join(names)
+
+
+def meet_base_masks(bases_lhs: BaseMask, bases_rhs: BaseMask) -> BaseMask:
+    if bases_lhs is None:
+        return bases_rhs
+    if bases_rhs is None:
+        return bases_lhs
+    return bases_lhs & bases_rhs
+
+
+def join_base_masks(bases_lhs: BaseMask, bases_rhs: BaseMask) -> BaseMask:
+    if bases_lhs is None or bases_rhs is None:
+        return None
+    return bases_lhs | bases_rhs
+
+
+def _get_attribute_key(attr: Attribute) -> Hashable:
+    # Some attributes, such as dictionaries, are not hashable
+    try:
+        hash(attr)
+    except TypeError:
+        return str(attr)
+    return attr
+
+
+def _get_attributes_key(op: Operation) -> tuple[Hashable, ...]:
+    return tuple(
+        (name, _get_attribute_key(attr)) for name, attr in sorted(op.attributes.items())
+    )
+
+
+@dataclass
+class ConstraintDAG:
+    """
+    Hash-consed numbers of the values of IRDL constraints.
+
+    Two values have the same structural number if they are defined by
+    operations with the same name and attributes, whose operands have the same
+    structural numbers. Numbers are interned, so they are equal exactly when
+    the trees obtained by unfolding both DAGs are equal. They do not account
+    for the sharing of values inside the DAGs, which `is_dag_equivalent` checks.
+
+    The purity and the bases of values, and whether they are rooted DAGs with
+    a single use, are cached as well. Bases are bitmasks, where each base name
+    is given a bit the first time it is found.
+
+    Numbers are computed once, without recursion, and are kept until
+    `invalidate` is called on an operation whose operands changed, or
+    `invalidate_uses` on a value whose uses changed. The DAG of a value is
+    always numbered before its other properties are cached, so invalidation can
+    stop at the operations that are not numbered.
+    """
+
+    numbers: dict[SSAValue, int] = field(default_factory=dict)
+    """The structural number of each value whose number was computed."""
+
+    purities: dict[SSAValue, bool] = field(default_factory=dict)
+    """Whether each numbered value is pure, see `is_pure`."""
+
+    base_masks: dict[SSAValue, BaseMask] = field(default_factory=dict)
+    """The bases of each numbered value, see `get_base_mask`."""
+
+    base_ids: dict[str, int] = field(default_factory=dict)
+    """The bit of each base name, as `dialect.name`."""
+
+    base_names: list[str] = field(default_factory=list)
+    """The base name of each bit."""
+
+    rooted_dags: dict[SSAValue, bool] = field(default_factory=dict)
+    """
+    Whether each value is a rooted DAG with a single use, for the values where
+    it was checked, see `is_rooted_dag_with_one_use`.
+    """
+
+    keys: dict[Hashable, int] = field(default_factory=dict)
+    """The number given to each structural key."""
+
+    representatives: dict[Hashable, Operation] = field(default_factory=dict)
+    """
+    The first operation found for each operation name, attributes and operands,
+    for the operations of a block.
+    """
+
+    def _intern(self, key: Hashable) -> int:
+        return self.keys.setdefault(key, len(self.keys))
+
+    def get_number(self, value: SSAValue) -> int:
+        """Get the structural number of a value."""
+        if (number := self.numbers.get(value)) is not None:
+            return number
+
+        # Number the operands before their users, with an explicit stack as
+        # the DAGs may be deeper than the recursion limit
+        stack = [value]
+        while stack:
+            current = stack[-1]
+            if current in self.numbers:
+                stack.pop()
+                continue
+            op = current.owner
+            if not isinstance(op, Operation):
+                # Block arguments are only equal to themselves
+                self.numbers[current] = self._intern(current)
+                self.purities[current] = False
+                self.base_masks[current] = None
+                stack.pop()
+                continue
+            missing = [
+                operand for operand in op.operands if operand not in self.numbers
+            ]
+            if missing:
+                stack.extend(missing)
+                continue
+            key = (
+                op.name,
+                _get_attributes_key(op),
+                tuple(self.numbers[operand] for operand in op.operands),
+                op.results.index(current),
+            )
+            self.numbers[current] = self._intern(key)
+            self.purities[current] = isinstance(op, irdl.IsOp) or (
+                isinstance(op, irdl.ParametricOp)
+                and all(self.purities[operand] for operand in op.operands)
+            )
+            self.base_masks[current] = self._compute_base_mask(op)
+            stack.pop()
+        return self.numbers[value]
+
+    def _get_base_mask(self, base: SymbolRefAttr | str) -> int:
+        name = get_base_name(base)
+        if (base_id := self.base_ids.get(name)) is None:
+            base_id = len(self.base_names)
+            self.base_ids[name] = base_id
+            self.base_names.append(name)
+        return 1 << base_id
+
+    def _compute_base_mask(self, op: Operation) -> BaseMask:
+        """Get the bases of an operation result, once its operands are numbered."""
+        if isinstance(op, irdl.BaseOp):
+            if op.base_ref is not None:
+                return self._get_base_mask(op.base_ref)
+            assert op.base_name is not None
+            return self._get_base_mask(op.base_name.data)
+        if isinstance(op, irdl.ParametricOp):
+            return self._get_base_mask(op.base_type)
+        if isinstance(op, irdl.AllOfOp):
+            bases: BaseMask = None
+            for operand in op.operands:
+                bases = meet_base_masks(bases, self.base_masks[operand])
+            return bases
+        if isinstance(op, irdl.AnyOfOp):
+            bases: BaseMask = 0
+            for operand in op.operands:
+                bases = join_base_masks(bases, self.base_masks[operand])
+            return bases
+        if isinstance(op, irdl.IsOp):
+            # TODO: Add support for known types
+            if isinstance(op.expected, StringAttr):
+                return self._get_base_mask("!builtin.string")
+            return None
+        return None
+
+    def get_base_mask(self, value: SSAValue) -> BaseMask:
+        """Get the bases a value may have, as a bitmask."""
+        self.get_number(value)
+        return self.base_masks[value]
+
+    def get_base_names(self, bases: BaseMask) -> set[str] | None:
+        """Get the names of the bases of a bitmask."""
+        if bases is None:
+            return None
+        return {
+            name for index, name in enumerate(self.base_names) if bases >> index & 1
+        }
+
+    def is_pure(self, value: SSAValue) -> bool:
+        """
+        Check if a value is defined by an `irdl.is`, or by an `irdl.parametric`
+        whose arguments are pure.
+        """
+        self.get_number(value)
+        return self.purities[value]
+
+    def is_rooted_dag_with_one_use(self, value: SSAValue) -> bool:
+        """
+        Check if a value is pure, or has a single use, and the values of the DAG
+        defining it are only used inside the DAG, unless they are pure.
+        """
+        if (rooted_dag := self.rooted_dags.get(value)) is not None:
+            return rooted_dag
+        if self.is_pure(value):
+            self.rooted_dags[value] = True
+            return True
+        assert isinstance(value.owner, Operation)
+        if len(value.uses) != 1:
+            self.rooted_dags[value] = False
+            return False
+
+        values_to_walk = [value]
+        walked_values = {value}
+
+        operations: set[Operation] = set()
+
+        while values_to_walk:
+            value_to_walk = values_to_walk.pop()
+            assert isinstance(value_to_walk.owner, Operation)
+            operations.add(value_to_walk.owner)
+            for operand in value_to_walk.owner.operands:
+                if operand in walked_values:
+                    continue
+                walked_values.add(operand)
+                values_to_walk.append(operand)
+
+        rooted_dag = True
+        for operation in operations:
+            assert len(operation.results) == 1
+            result = operation.results[0]
+            if result == value or self.purities[result]:
+                continue
+            if any(use.operation not in operations for use in result.uses):
+                rooted_dag = False
+                break
+
+        self.rooted_dags[value] = rooted_dag
+        return rooted_dag
+
+    def invalidate(self, op: Operation):
+        """
+        Forget the numbers of an operation whose operands changed, and of the
+        operations using it, directly or not.
+        """
+        worklist = [op]
+        while worklist:
+            current = worklist.pop()
+            for result in current.results:
+                self.rooted_dags.pop(result, None)
+                self.purities.pop(result, None)
+                self.base_masks.pop(result, None)
+                if self.numbers.pop(result, None) is None:
+                    # Users of a value are only numbered after the value
+                    continue
+                worklist.extend(use.operation for use in result.uses)
+
+    def invalidate_uses(self, value: SSAValue):
+        """
+        Forget the properties of a value whose uses changed, and of the values
+        whose DAG contains it.
+        """
+        if isinstance(value.owner, Operation):
+            self.invalidate(value.owner)
+            return
+        for use in value.uses:
+            self.invalidate(use.operation)
+
+    def forget(self, op: Operation):
+        """Forget the numbers of an erased operation."""
+        for result in op.results:
+            self.numbers.pop(result, None)
+            self.purities.pop(result, None)
+            self.base_masks.pop(result, None)
+            self.rooted_dags.pop(result, None)
+
+    def find_duplicate(self, op: Operation) -> Operation | None:
+        """
+        Get another operation of the block of an operation, with the same name,
+        attributes and operands. The operation is registered for later lookups
+        if there is none.
+        """
+        block = op.parent_block()
+        key = self._get_duplicate_key(op, block)
+        representative = self.representatives.get(key)
+        if (
+            representative is not None
+            and representative is not op
+            and representative.parent_block() is block
+            and self._get_duplicate_key(representative, block) == key
+        ):
+            return representative
+        self.representatives[key] = op
+        return None
+
+    @staticmethod
+    def _get_duplicate_key(op: Operation, block: Block | None) -> Hashable:
+        return (block, op.name, _get_attributes_key(op), tuple(op.operands))
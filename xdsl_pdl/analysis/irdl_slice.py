@@ -0,0 +1,116 @@
+"""
+Slice an IRDL specification to the attribute and type definitions that a
+pattern can reference, so that the Attribute datatype of its query only has
+constructors for these definitions.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from xdsl.dialects import irdl, pdl
+from xdsl.ir import Attribute, Operation
+
+from xdsl_pdl.analysis.check_subset_to_z3 import AttributeTerm, convert_attr_to_term
+from xdsl_pdl.analysis.constraint_dag import get_base_name
+from xdsl_pdl.passes.pdl_to_irdl import IRDLLibrary
+
+
+def get_pattern_operation_names(pattern: pdl.PatternOp) -> set[str]:
+    """Get the names of the operations matched or created by a PDL pattern."""
+    return {
+        op.opName.data
+        for op in pattern.walk()
+        if isinstance(op, pdl.OperationOp) and op.opName is not None
+    }
+
+
+def _add_term_names(term: AttributeTerm, names: set[str]):
+    name, *parameters = term
+    if name in ("int", "string"):
+        return
+    names.add(name)
+    for parameter in parameters:
+        _add_term_names(parameter, names)
+
+
+class _UnsupportedConstant(Exception):
+    """A constant attribute that the encoding does not support."""
+
+
+def _get_attribute_names(attr: Attribute) -> set[str]:
+    """Get the definitions used by the encoding of a constant attribute."""
+    try:
+        term = convert_attr_to_term(attr)
+    except Exception as e:
+        raise _UnsupportedConstant(attr) from e
+    names: set[str] = set()
+    _add_term_names(term, names)
+    return names
+
+
+def _get_referenced_names(constraint: Operation, dialect: str | None) -> set[str]:
+    """
+    Get the names of the definitions referenced by a constraint. References
+    without a dialect are relative to `dialect`, the dialect of the definition
+    the constraint is in.
+    """
+    if isinstance(constraint, irdl.IsOp):
+        return _get_attribute_names(constraint.expected)
+    if isinstance(constraint, irdl.BaseOp):
+        if constraint.base_name is not None:
+            return {get_base_name(constraint.base_name.data)}
+        assert constraint.base_ref is not None
+        ref = constraint.base_ref
+    elif isinstance(constraint, irdl.ParametricOp):
+        ref = constraint.base_type
+    else:
+        return set()
+    if not ref.nested_references.data and dialect is not None:
+        return {dialect + "." + ref.root_reference.data}
+    return {get_base_name(ref)}
+
+
+def get_reachable_definitions(
+    library: IRDLLibrary,
+    op_names: Iterable[str] = (),
+    constraints: Iterable[Operation] = (),
+) -> set[str] | None:
+    """
+    Get the names of the attribute and type definitions of an IRDL library that
+    are transitively referenced by the constraints of the given operation
+    definitions, or by the given constraints.
+    The parameter constraints of a referenced definition are themselves
+    referenced, as the definition may be unfolded in a query.
+    Return None if a constant attribute cannot be converted to a term, in which
+    case the definitions it uses are not known, and nothing should be sliced.
+    """
+    reachable: set[str] = set()
+
+    def add_references(ops: Iterable[Operation], dialect: str | None) -> list[str]:
+        new_names: list[str] = []
+        for op in ops:
+            for name in _get_referenced_names(op, dialect):
+                if name not in reachable:
+                    reachable.add(name)
+                    new_names.append(name)
+        return new_names
+
+    try:
+        worklist = add_references(constraints, None)
+        for op_name in op_names:
+            if (op_def := library.operations.get(op_name)) is not None:
+                dialect = op_name.split(".", 1)[0]
+                worklist.extend(add_references(op_def.body.walk(), dialect))
+
+        while worklist:
+            name = worklist.pop()
+            # Builtin constructors, such as `int`, have no definition
+            if (attr_def := library.attributes.get(name)) is None:
+                continue
+            dialect = name.split(".", 1)[0]
+            worklist.extend(add_references(attr_def.body.walk(), dialect))
+    except _UnsupportedConstant:
+        return None
+
+    return reachable & library.attributes.keys()
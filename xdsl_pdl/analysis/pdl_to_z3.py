@@ -0,0 +1,477 @@
+"""
+Encode a PDL pattern directly as the SMT query checking that its rewrite does
+not break the IRDL invariants, without creating its `irdl_ext.check_subset`
+operation.
+The query is the one `check_subset_to_z3` creates for the converted pattern
+before it is optimized, except that conjunctions of parametric constraints are
+merged as they are created, as `OptimizeIRDL` does. Without this, the solver
+gives up on most queries. This engine can then be compared against the
+IR-based pipeline.
+The rhs values that the rewrite leaves untouched are bound to their lhs terms
+instead of being encoded again, so only the rewritten part is quantified.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Sequence
+
+import z3
+from xdsl.dialects import irdl
+from xdsl.dialects.builtin import IntegerType, StringAttr, SymbolRefAttr
+from xdsl.dialects.pdl import (
+    ApplyNativeConstraintOp,
+    ApplyNativeRewriteOp,
+    AttributeOp,
+    OperandOp,
+    OperationOp,
+    PatternOp,
+    ReplaceOp,
+    ResultOp,
+    RewriteOp,
+    TypeOp,
+)
+from xdsl.ir import Attribute, Operation, SSAValue
+
+from xdsl_pdl.analysis.check_subset_to_z3 import (
+    AttributeSort,
+    SubsetQueryInfo,
+    add_rhs_to_solver,
+    convert_attr_to_z3_attr,
+    create_z3_attribute,
+)
+from xdsl_pdl.dialects import transfer
+from xdsl_pdl.passes.pdl_to_irdl import ConstraintTemplate, IRDLLibrary
+
+INTEGER_ATTR = SymbolRefAttr("builtin", ["integer_attr"])
+
+
+@dataclass
+class _ConstraintEncoder:
+    """
+    Create the z3 values and constraints of IRDL constraints, with the same
+    encoding as `get_constraint_as_z3`, for one side of the query.
+    """
+
+    attribute_sort: AttributeSort
+    library: IRDLLibrary
+    create_constant: Callable[[str | None], Any]
+    add_constraint: Callable[[Any], None]
+
+    max_unfolding_depth: int | None = None
+    """The maximum number of nested attribute definitions to unfold."""
+
+    parametrics: dict[int, tuple[str, list[Any]]] = field(default_factory=dict)
+    """
+    The constructor and arguments of the values created by parametric
+    constraints, indexed by the z3 id of the value.
+    """
+
+    def any(self, name_hint: str | None = None) -> Any:
+        return self.create_constant(name_hint)
+
+    def any_of(self, args: Sequence[Any]) -> Any:
+        value = self.create_constant(None)
+        unassigned = self.attribute_sort.unassigned
+        self.add_constraint(
+            z3.Or([value == arg for arg in args] + [value == unassigned])
+        )
+        return value
+
+    def all_of(self, args: Sequence[Any]) -> Any:
+        # Parametric constraints of the same definition are merged into one
+        # parametric constraint, with the conjunction of their arguments
+        merged: list[Any] = []
+        for arg in args:
+            for index, other in enumerate(merged):
+                arg_parametric = self.parametrics.get(arg.get_id())
+                other_parametric = self.parametrics.get(other.get_id())
+                if arg_parametric is None or other_parametric is None:
+                    continue
+                name, arg_args = arg_parametric
+                other_name, other_args = other_parametric
+                if name != other_name:
+                    continue
+                merged[index] = self._parametric(
+                    name,
+                    [self.all_of([a, b]) for a, b in zip(other_args, arg_args)],
+                )
+                break
+            else:
+                merged.append(arg)
+        if len(merged) == 1:
+            return merged[0]
+
+        value = self.create_constant(None)
+        unassigned = self.attribute_sort.unassigned
+        self.add_constraint(
+            z3.Or(z3.And([value == arg for arg in merged]), value == unassigned)
+        )
+        return value
+
+    def is_(self, attr: Attribute) -> Any:
+        return convert_attr_to_z3_attr(attr, self.attribute_sort)
+
+    def eq(self, lhs: Any, rhs: Any):
+        self.add_constraint(lhs == rhs)
+
+    def match(self, value: Any):
+        self.add_constraint(value != self.attribute_sort.unassigned)
+
+    def base(self, base: SymbolRefAttr | str, depth: int = 0) -> Any:
+        """
+        Constrain the base of a value, given either as a reference to its
+        definition, which is unfolded, or as a `!dialect.name` string.
+        """
+        if isinstance(base, str):
+            return self._base(base[1:])
+        # The parameter constraints of an unfolded definition imply its base
+        if self._can_unfold(depth):
+            return self._unfold(base, depth)
+        return self._base(self.attribute_sort.get_constructor_name(base))
+
+    def parametric(self, base: SymbolRefAttr, args: Sequence[Any], depth: int = 0):
+        name = self.attribute_sort.get_constructor_name(base)
+        value = self._parametric(name, args)
+        if self._can_unfold(depth):
+            return self.all_of([value, self._unfold(base, depth)])
+        return value
+
+    def _base(self, name: str) -> Any:
+        value = self.create_constant(None)
+        is_base = self.attribute_sort.recognizers[name](value)
+        self.add_constraint(z3.Or(is_base, value == self.attribute_sort.unassigned))
+        return value
+
+    def _parametric(self, name: str, args: Sequence[Any]) -> Any:
+        value = self.create_constant(None)
+        unassigned = self.attribute_sort.unassigned
+        self.add_constraint(
+            value
+            == z3.If(
+                z3.Or(*[arg == unassigned for arg in args]),
+                unassigned,
+                create_z3_attribute(self.attribute_sort, name, *args),
+            )
+        )
+        self.parametrics[value.get_id()] = (name, list(args))
+        return value
+
+    def _can_unfold(self, depth: int) -> bool:
+        return self.max_unfolding_depth is None or depth < self.max_unfolding_depth
+
+    def _unfold(self, base: SymbolRefAttr, depth: int) -> Any:
+        """
+        Create the parametric constraint of a definition with its parameter
+        constraints, as `EmbedIRDLAttrPattern`.
+        """
+        template = self.library.get_attribute_template(base)
+        values = self.instantiate(template.constraints, depth + 1)
+        name = self.attribute_sort.get_constructor_name(template.base_type)
+        return self._parametric(name, [values[slot] for slot in template.parameters])
+
+    def instantiate(
+        self, constraints: Sequence[ConstraintTemplate], depth: int = 0
+    ) -> list[Any]:
+        """Create the values of constraint templates, in slot order."""
+        values: list[Any] = []
+        for constraint in constraints:
+            args = [values[slot] for slot in constraint.operands]
+            attributes = constraint.attributes
+            if constraint.op_type is irdl.AnyOp:
+                values.append(self.any(constraint.name_hint))
+            elif constraint.op_type is irdl.AnyOfOp:
+                values.append(self.any_of(args))
+            elif constraint.op_type is irdl.AllOfOp:
+                values.append(self.all_of(args))
+            elif constraint.op_type is irdl.IsOp:
+                values.append(self.is_(attributes["expected"]))
+            elif constraint.op_type is irdl.BaseOp:
+                if "base_ref" in attributes:
+                    base = attributes["base_ref"]
+                    assert isinstance(base, SymbolRefAttr)
+                    values.append(self.base(base, depth))
+                else:
+                    base_name = attributes["base_name"]
+                    assert isinstance(base_name, StringAttr)
+                    values.append(self.base(base_name.data, depth))
+            elif constraint.op_type is irdl.ParametricOp:
+                base = attributes["base_type"]
+                assert isinstance(base, SymbolRefAttr)
+                values.append(self.parametric(base, args, depth))
+            else:
+                raise Exception(f"Unsupported constraint {constraint.op_type.name}")
+        return values
+
+
+@dataclass
+class _PatternSideEncoder:
+    """
+    Encode the constraints of one side of a PDL pattern, which is either the
+    matched program, or the program after the rewrite.
+    """
+
+    encoder: _ConstraintEncoder
+
+    replacements: dict[Operation, Operation] = field(default_factory=dict)
+    """The operations replaced by the rewrite, and their replacement."""
+
+    values: dict[SSAValue, Any] = field(default_factory=dict)
+    """The z3 value of the attribute or type each PDL value represents."""
+
+    encoded: set[Operation] = field(default_factory=set)
+
+    def get_value(self, value: SSAValue) -> Any:
+        if value not in self.values:
+            assert isinstance(value.owner, Operation)
+            self.encode(value.owner)
+        return self.values[value]
+
+    def get_result_value(self, op: Operation, index: int) -> Any:
+        """Get the value of the type of an operation result, after replacement."""
+        op = self.replacements.get(op, op)
+        assert isinstance(op, OperationOp)
+        return self.get_value(op.type_values[index])
+
+    def encode(self, op: Operation):
+        """Encode an operation, after the operations defining its operands."""
+        if op in self.encoded:
+            return
+        self.encoded.add(op)
+        encoder = self.encoder
+
+        if isinstance(op, TypeOp):
+            if op.constantType is None:
+                value = encoder.any(op.result.name_hint)
+            elif op.constantType == transfer.IntegerType():
+                value = encoder.base("!builtin.integer_type")
+            else:
+                value = encoder.is_(op.constantType)
+            self.values[op.result] = value
+            return
+        if isinstance(op, OperandOp):
+            if op.value_type is None:
+                self.values[op.value] = encoder.any(op.value.name_hint)
+            else:
+                self.values[op.value] = self.get_value(op.value_type)
+            return
+        if isinstance(op, AttributeOp):
+            if op.value is not None:
+                self.values[op.output] = encoder.is_(op.value)
+            elif op.value_type is not None:
+                # Typed attributes are assumed to be integer attributes
+                value = encoder.any(op.output.name_hint)
+                value_type = self.get_value(op.value_type)
+                self.values[op.output] = encoder.parametric(
+                    INTEGER_ATTR, [value, value_type]
+                )
+            else:
+                self.values[op.output] = encoder.any(op.output.name_hint)
+            return
+        if isinstance(op, ApplyNativeConstraintOp):
+            self._encode_native_constraint(op)
+            return
+        if isinstance(op, OperationOp):
+            if op.opName is None:
+                raise Exception("All PDL operations are expected to have a name.")
+            template = encoder.library.get_template(op.opName.data)
+            constraints = encoder.instantiate(template.constraints)
+            slots = [*template.operands, *template.results]
+            pdl_values = [*op.operand_values, *op.type_values]
+            for slot, pdl_value in zip(slots, pdl_values, strict=True):
+                encoder.eq(constraints[slot], self.get_value(pdl_value))
+                encoder.match(constraints[slot])
+            return
+        if isinstance(op, ResultOp):
+            assert isinstance(owner := op.parent_.owner, Operation)
+            self.values[op.val] = self.get_result_value(owner, op.index.value.data)
+            return
+        if isinstance(op, ApplyNativeRewriteOp):
+            self._encode_native_rewrite(op)
+            return
+        raise Exception(f"Unsupported operation in the pdl pattern: {op.name}")
+
+    def _encode_native_constraint(self, op: ApplyNativeConstraintOp):
+        encoder = self.encoder
+        vector = SymbolRefAttr("builtin", ["vector"])
+        tensor = SymbolRefAttr("builtin", ["tensor"])
+        match op.constraint_name.data:
+            case "is_vector":
+                base = encoder.base(vector)
+            case "is_tensor":
+                base = encoder.base(tensor)
+            case "is_vector_or_tensor":
+                base = encoder.any_of([encoder.base(vector), encoder.base(tensor)])
+            case _:
+                return
+        encoder.eq(base, self.get_value(op.args[0]))
+
+    def _encode_native_rewrite(self, op: ApplyNativeRewriteOp):
+        encoder = self.encoder
+        args = [self.get_value(arg) for arg in op.args]
+        match op.constraint_name.data:
+            case "get_zero" | "get_zero_attr":
+                value = encoder.parametric(INTEGER_ATTR, [encoder.any(), args[0]])
+            case "addi" | "subi" | "muli":
+                value = args[0]
+            case "get_width":
+                value = encoder.parametric(INTEGER_ATTR, [encoder.any(), args[1]])
+            case "invert_arith_cmpi_predicate":
+                i64 = encoder.is_(IntegerType(64))
+                value = encoder.parametric(INTEGER_ATTR, [encoder.any(), i64])
+            case name:
+                raise Exception(f"Unknown native rewrite {name}")
+        self.values[op.res[0]] = value
+
+
+def _get_yielded_values(pattern: PatternOp) -> list[SSAValue | tuple[Operation, int]]:
+    """
+    Get the PDL values compared between both sides: the operands and operation
+    results of the matched program, in program order. Results that are not
+    accessed with a `pdl.result` are compared too, as `add_missing_pdl_result`
+    adds them right after their operation. These are given as an operation and
+    a result index.
+    """
+    accessed_results: set[tuple[Operation, int]] = set()
+    for op in pattern.walk():
+        if isinstance(op, ResultOp):
+            assert isinstance(owner := op.parent_.owner, Operation)
+            accessed_results.add((owner, op.index.value.data))
+
+    yielded: list[SSAValue | tuple[Operation, int]] = []
+    for op in pattern.body.ops:
+        if isinstance(op, OperandOp):
+            yielded.append(op.value)
+        elif isinstance(op, ResultOp):
+            yielded.append(op.val)
+        elif isinstance(op, OperationOp):
+            # Missing results are inserted after the operation in reverse order
+            for index in reversed(range(len(op.type_values))):
+                if (op, index) not in accessed_results:
+                    yielded.append((op, index))
+    return yielded
+
+
+def _get_unchanged_ops(
+    matched_ops: Sequence[Operation], replaced_ops: Collection[Operation]
+) -> list[Operation]:
+    """
+    Get the matched operations that are left untouched by the rewrite: they are
+    not replaced, and only depend on untouched operations. Their constraints
+    are the same on both sides of the query.
+    """
+    changed: set[Operation] = set()
+    unchanged: list[Operation] = []
+    for op in matched_ops:
+        if op in replaced_ops or any(
+            operand.owner in changed for operand in op.operands
+        ):
+            changed.add(op)
+        else:
+            unchanged.append(op)
+    return unchanged
+
+
+def pattern_to_z3(
+    pattern: PatternOp,
+    library: IRDLLibrary,
+    solver: z3.Solver,
+    attribute_sort: AttributeSort,
+    quantifier_free: bool = False,
+    max_unfolding_depth: int | None = None,
+) -> SubsetQueryInfo:
+    """
+    Add to the solver the constraints that are satisfiable if and only if the
+    rewrite of the pattern may create a program that does not verify the IRDL
+    definitions of the library, as `check_subset_to_z3` does for the
+    converted pattern.
+    """
+    rewrite = pattern.body.ops.last
+    if not isinstance(rewrite, RewriteOp) or rewrite.body is None:
+        raise Exception("Error: expected a rewrite region at the end of the pattern")
+    if rewrite.root is None:
+        raise Exception("Error: expected a root operation in the rewrite")
+    matched_ops = [op for op in pattern.body.ops if op is not rewrite]
+    yielded = _get_yielded_values(pattern)
+
+    name_index = 0
+
+    def create_constant(name_hint: str | None) -> Any:
+        nonlocal name_index
+        name_index += 1
+        return z3.Const((name_hint or "tmp") + str(name_index), attribute_sort.sort)
+
+    # The lhs is the matched program, whose constraints are asserted
+    lhs = _PatternSideEncoder(
+        _ConstraintEncoder(
+            attribute_sort, library, create_constant, solver.add, max_unfolding_depth
+        )
+    )
+    for op in matched_ops:
+        lhs.encode(op)
+
+    # The rhs is the program after the rewrite, whose constants are quantified
+    constants: list[Any] = []
+    constraints: list[Any] = []
+
+    def create_rhs_constant(name_hint: str | None) -> Any:
+        constant = create_constant(name_hint)
+        constants.append(constant)
+        return constant
+
+    rhs = _PatternSideEncoder(
+        _ConstraintEncoder(
+            attribute_sort,
+            library,
+            create_rhs_constant,
+            constraints.append,
+            max_unfolding_depth,
+        )
+    )
+    rewrite_ops = list(rewrite.body.ops)
+    for op in rewrite_ops:
+        if isinstance(op, ReplaceOp) and op.repl_operation is not None:
+            assert isinstance(replaced := op.op_value.owner, Operation)
+            assert isinstance(replacement := op.repl_operation.owner, Operation)
+            rhs.replacements[replaced] = replacement
+    # The values left untouched by the rewrite are bound to their lhs terms, as
+    # their rhs constraints would be a quantified copy of the lhs ones, which
+    # are already asserted. Only the rewritten part of the program is quantified.
+    for op in _get_unchanged_ops(matched_ops, rhs.replacements.keys()):
+        rhs.encoded.add(op)
+        for result in op.results:
+            if result in lhs.values:
+                rhs.values[result] = lhs.values[result]
+    for op in [*matched_ops, *rewrite_ops]:
+        # Replaced operations are erased from the rewritten program
+        if op not in rhs.replacements and not isinstance(op, ReplaceOp):
+            rhs.encode(op)
+
+    # Both sides yield their values, which are never unassigned
+    def get_yielded_value(side: _PatternSideEncoder, value: Any) -> Any:
+        if isinstance(value, SSAValue):
+            return side.get_value(value)
+        return side.get_result_value(*value)
+
+    lhs_yielded = [get_yielded_value(lhs, value) for value in yielded]
+    rhs_yielded = [get_yielded_value(rhs, value) for value in yielded]
+    # The constraints on values bound to their lhs term already hold
+    rhs_yielded_changed = [
+        rhs_value
+        for lhs_value, rhs_value in zip(lhs_yielded, rhs_yielded)
+        if not lhs_value.eq(rhs_value)
+    ]
+    for side, side_yielded in ((lhs, lhs_yielded), (rhs, rhs_yielded_changed)):
+        encoder = side.encoder
+        for value in side_yielded:
+            encoder.match(value)
+        for value in side_yielded:
+            encoder.eq(value, encoder.create_constant(None))
+    for lhs_value, rhs_value in zip(lhs_yielded, rhs_yielded):
+        if not lhs_value.eq(rhs_value):
+            constraints.append(lhs_value == rhs_value)
+
+    attribute_sort.check_num_values(name_index)
+    return add_rhs_to_solver(
+        solver, attribute_sort, constants, constraints, quantifier_free
+    )
@@ -0,0 +1,88 @@
+"""
+Statistics about the encoding and solving of `irdl_ext.check_subset` queries.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import IO
+
+import z3
+
+
+@dataclass
+class QueryStatistics:
+    """Statistics of a single query, written as one JSON line per query."""
+
+    file: str
+    """The file the query comes from."""
+
+    query: str
+    """The name of the query, such as the name of the PDL pattern it checks."""
+
+    verdict: str
+    """Either "sat", "unsat", or "unknown"."""
+
+    cached: bool = False
+    """Whether the verdict was found in the verdict cache, without solving."""
+
+    decided_structurally: bool = False
+    """Whether the verdict was found by the structural fast path, without solving."""
+
+    decided_by_bases: bool = False
+    """Whether the verdict was found by the base analysis, without solving."""
+
+    decided_by_evaluation: bool = False
+    """Whether a counterexample was found by concrete evaluation, without solving."""
+
+    num_unfolded_definitions: int = 0
+    """Number of attribute definitions unfolded in the query."""
+
+    num_truncated_unfoldings: int = 0
+    """Number of attribute definitions left folded because of the depth bound."""
+
+    unfolding_depth: int = 0
+    """Deepest nesting of unfolded attribute definitions."""
+
+    num_ops_before_unfolding: int | None = None
+    num_ops_after_unfolding: int | None = None
+
+    num_optimization_iterations: int = 0
+    """Number of operations matched against the IRDL optimization patterns."""
+
+    num_optimization_rewrites: int = 0
+    """Number of rewrites applied by the IRDL optimization patterns."""
+
+    num_ops_before_optimization: int | None = None
+    num_ops_after_optimization: int | None = None
+
+    num_dnf_expansions: int = 0
+    """Number of `irdl.all_of` distributed over an `irdl.any_of` argument."""
+
+    num_dnf_expansions_over_budget: int = 0
+    """Number of `irdl.all_of` not distributed because of the DNF budget."""
+
+    encoding_time: float = 0.0
+    """Time to create the SMT query, in seconds."""
+
+    solve_time: float = 0.0
+    """Time to solve the SMT query, in seconds."""
+
+    num_quantified_constants: int | None = None
+    num_constraints: int | None = None
+
+    num_constructors: int | None = None
+    """Number of constructors of the Attribute datatype."""
+
+    solver_statistics: dict[str, int | float] = field(default_factory=dict)
+    """The statistics reported by z3, such as conflicts and memory usage."""
+
+    def write(self, file: IO[str]):
+        file.write(json.dumps(asdict(self)) + "\n")
+
+
+def get_solver_statistics(solver: z3.Solver) -> dict[str, int | float]:
+    """Get the statistics of the last check of a solver."""
+    statistics = solver.statistics()
+    return {key: statistics.get_key_value(key) for key in statistics.keys()}
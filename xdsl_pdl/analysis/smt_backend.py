@@ -0,0 +1,242 @@
+"""
+Solve SMT queries, either with the z3 Python API, or with solver processes
+running outside of the Python process, so that a solver crash or memory
+blow-up only loses one query.
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import IO, Generic, Iterable, Iterator, Sequence, TypeVar
+
+import z3
+
+from xdsl_pdl.analysis.query_statistics import get_solver_statistics
+
+_Key = TypeVar("_Key")
+
+
+@dataclass
+class SolverVerdict:
+    """The verdict of a query solved by a backend."""
+
+    result: str
+    """Either "sat", "unsat", or "unknown"."""
+
+    model: str | None = None
+
+    solve_time: float = 0.0
+    """Time the solver ran, in seconds."""
+
+    solver_statistics: dict[str, int | float] = field(default_factory=dict)
+    """The statistics of the solver, if the backend reports them."""
+
+    config: str | None = None
+    """The name of the solver configuration that found the verdict, if any."""
+
+
+class SMTBackend(ABC):
+    """
+    A way of solving SMT queries, given as z3 solvers holding the query
+    assertions.
+    """
+
+    @abstractmethod
+    def solve_all(
+        self, queries: Iterable[tuple[_Key, z3.Solver]]
+    ) -> Iterator[tuple[_Key, SolverVerdict]]:
+        """
+        Solve queries given with a key, and return each verdict with the key of
+        its query as soon as it is found. Verdicts may not be in query order.
+        Queries are only read from the iterable when they can be solved, so
+        they can be created while the previous ones are being solved. The
+        solver of a query is not used anymore once the next query is read, so
+        the same solver may be reused for the next query.
+        """
+        ...
+
+    def solve(self, solver: z3.Solver) -> SolverVerdict:
+        for _, verdict in self.solve_all([(None, solver)]):
+            return verdict
+        assert False, "The backend did not return a verdict"
+
+
+class InProcessBackend(SMTBackend):
+    """Solve queries one after the other with the z3 Python API."""
+
+    timeout: float | None
+    """Time limit of each query, in seconds. Queries out of time are unknown."""
+
+    def __init__(self, timeout: float | None = None):
+        self.timeout = timeout
+
+    def solve_all(
+        self, queries: Iterable[tuple[_Key, z3.Solver]]
+    ) -> Iterator[tuple[_Key, SolverVerdict]]:
+        for key, solver in queries:
+            if self.timeout is not None:
+                solver.set("timeout", int(self.timeout * 1000))
+            start = time.perf_counter()
+            result = solver.check()
+            solve_time = time.perf_counter() - start
+            model = str(solver.model()) if result == z3.sat else None
+            yield key, SolverVerdict(
+                str(result), model, solve_time, get_solver_statistics(solver)
+            )
+
+
+def default_solver_command() -> list[str]:
+    """
+    Get the command running the z3 binary bundled with the z3 Python package,
+    or the one found on PATH.
+    """
+    bin_dir = os.path.dirname(sys.executable)
+    z3_binary = shutil.which("z3", path=bin_dir) or shutil.which("z3")
+    if z3_binary is None:
+        raise FileNotFoundError("Cannot find the z3 binary")
+    return [z3_binary, "-smt2"]
+
+
+def parse_solver_output(output: str) -> tuple[str, str | None]:
+    """
+    Parse the output of a solver on a query ending with `(check-sat)` and
+    `(get-model)`. Return the verdict, and the model if the query is sat.
+    """
+    lines = output.strip().splitlines()
+    if not lines or lines[0].strip() not in ("sat", "unsat", "unknown"):
+        return "unknown", None
+    result = lines[0].strip()
+    if result != "sat":
+        return result, None
+    return result, "\n".join(lines[1:])
+
+
+@dataclass
+class _RunningSolver(Generic[_Key]):
+    key: _Key
+    process: subprocess.Popen[bytes]
+    query_file: str
+    output: IO[bytes]
+    start: float = field(default_factory=time.monotonic)
+
+
+class ExternalSolverBackend(SMTBackend):
+    """
+    Solve queries with a pool of solver processes, such as the z3 binary, or any
+    solver reading SMT-LIB2 files.
+    Each query is written as SMT-LIB2 to a temporary file whose path is appended
+    to the solver command, and the solver output is read once the process exits.
+    """
+
+    command: list[str]
+    jobs: int
+    """Maximum number of solver processes running at the same time."""
+
+    timeout: float | None
+    """Time limit of each query, in seconds. Queries out of time are unknown."""
+
+    memory_limit: int | None
+    """Address space limit of each solver process, in megabytes."""
+
+    def __init__(
+        self,
+        command: Sequence[str] | str | None = None,
+        jobs: int = 1,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ):
+        if command is None:
+            command = default_solver_command()
+        elif isinstance(command, str):
+            command = shlex.split(command)
+        self.command = list(command)
+        self.jobs = jobs
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+
+    def _limit_memory(self):
+        import resource
+
+        assert self.memory_limit is not None
+        limit = self.memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def _start(self, key: _Key, solver: z3.Solver) -> _RunningSolver[_Key]:
+        # The model is requested upfront, as the solver exits after the query
+        fd, query_file = tempfile.mkstemp(suffix=".smt2")
+        with os.fdopen(fd, "w") as f:
+            f.write("(set-option :produce-models true)\n")
+            f.write(solver.to_smt2())
+            f.write("\n(get-model)\n")
+        output = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            [*self.command, query_file],
+            stdin=subprocess.DEVNULL,
+            stdout=output,
+            stderr=subprocess.DEVNULL,
+            preexec_fn=self._limit_memory if self.memory_limit is not None else None,
+        )
+        return _RunningSolver(key, process, query_file, output)
+
+    def _finish(self, solver: _RunningSolver[_Key], timed_out: bool) -> SolverVerdict:
+        solve_time = time.monotonic() - solver.start
+        os.unlink(solver.query_file)
+        solver.output.seek(0)
+        output = solver.output.read().decode(errors="replace")
+        solver.output.close()
+        if timed_out:
+            return SolverVerdict("unknown", None, solve_time)
+        result, model = parse_solver_output(output)
+        return SolverVerdict(result, model, solve_time)
+
+    def solve_all(
+        self, queries: Iterable[tuple[_Key, z3.Solver]]
+    ) -> Iterator[tuple[_Key, SolverVerdict]]:
+        pending = iter(queries)
+        running: list[_RunningSolver[_Key]] = []
+        finished: list[tuple[_RunningSolver[_Key], bool]] = []
+        exhausted = False
+        try:
+            while running or not exhausted:
+                while not exhausted and len(running) < self.jobs:
+                    query = next(pending, None)
+                    if query is None:
+                        exhausted = True
+                    else:
+                        running.append(self._start(*query))
+
+                still_running: list[_RunningSolver[_Key]] = []
+                for solver in running:
+                    if (
+                        self.timeout is not None
+                        and time.monotonic() - solver.start >= self.timeout
+                    ):
+                        solver.process.kill()
+                        solver.process.wait()
+                        finished.append((solver, True))
+                    elif solver.process.poll() is not None:
+                        finished.append((solver, False))
+                    else:
+                        still_running.append(solver)
+                running = still_running
+
+                if not finished and running:
+                    time.sleep(0.005)
+                while finished:
+                    solver, timed_out = finished.pop()
+                    yield solver.key, self._finish(solver, timed_out)
+        finally:
+            for solver in running:
+                solver.process.kill()
+                solver.process.wait()
+                self._finish(solver, True)
+            for solver, _ in finished:
+                self._finish(solver, True)
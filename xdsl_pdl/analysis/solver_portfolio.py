@@ -0,0 +1,195 @@
+"""
+Solve SMT queries with a portfolio of z3 configurations running in parallel.
+Starting the solver processes takes longer than solving most queries, so the
+portfolio is only raced on queries a single solver does not solve quickly.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, Sequence, TypeVar
+
+import z3
+
+from xdsl_pdl.analysis.smt_backend import SMTBackend, SolverVerdict
+
+_Key = TypeVar("_Key")
+
+
+@dataclass(frozen=True)
+class SolverConfig:
+    """A z3 solver configuration."""
+
+    name: str
+
+    tactic: str | None = None
+    """The tactic the solver is built from. If None, the default solver is used."""
+
+    params: dict[str, Any] = field(default_factory=dict)
+    """Parameters set on the solver."""
+
+    def create_solver(self) -> z3.Solver:
+        if self.tactic is None:
+            solver = z3.Solver()
+        else:
+            solver = z3.Tactic(self.tactic).solver()
+        for key, value in self.params.items():
+            solver.set(key, value)
+        return solver
+
+
+DEFAULT_PORTFOLIO_DELAY = 1.0
+"""
+The time in seconds a query is given with a single solver, before racing the
+portfolio on it.
+"""
+
+DEFAULT_PORTFOLIO: tuple[SolverConfig, ...] = (
+    SolverConfig("default"),
+    SolverConfig("tactic-default", tactic="default"),
+    SolverConfig("no-mbqi", params={"smt.mbqi": False}),
+    SolverConfig("seed-1", params={"smt.random_seed": 1}),
+    SolverConfig("seed-2", params={"smt.random_seed": 2}),
+)
+
+
+@dataclass
+class PortfolioResult:
+    """The verdict of a query solved by a portfolio."""
+
+    result: str
+    """Either "sat", "unsat", or "unknown"."""
+
+    model: str | None = None
+
+    config: str | None = None
+    """The name of the configuration that found the verdict."""
+
+
+def _solve_in_process(
+    smt2: str, config: SolverConfig, results: multiprocessing.Queue[Any]
+):
+    try:
+        solver = config.create_solver()
+        solver.from_string(smt2)
+        result = solver.check()
+    except z3.Z3Exception:
+        result = z3.unknown
+    if result == z3.sat:
+        results.put(PortfolioResult("sat", str(solver.model()), config.name))
+    elif result == z3.unsat:
+        results.put(PortfolioResult("unsat", None, config.name))
+    else:
+        results.put(PortfolioResult("unknown", None, config.name))
+
+
+def solve_with_portfolio(
+    smt2: str,
+    configs: Sequence[SolverConfig] = DEFAULT_PORTFOLIO,
+    timeout: float | None = None,
+) -> PortfolioResult:
+    """
+    Solve an SMT-LIB2 query with each configuration in its own process.
+    The first definite answer wins, and the other processes are killed.
+    If no configuration answers before the timeout (in seconds), or if they all
+    answer unknown, the verdict is unknown.
+    """
+    mp_context = multiprocessing.get_context("spawn")
+    results: multiprocessing.Queue[Any] = mp_context.Queue()
+    processes = [
+        mp_context.Process(target=_solve_in_process, args=(smt2, config, results))
+        for config in configs
+    ]
+    for process in processes:
+        process.start()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    verdict = PortfolioResult("unknown")
+    try:
+        for _ in processes:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                result: PortfolioResult = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if result.result != "unknown":
+                verdict = result
+                break
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+        for process in processes:
+            process.join()
+    return verdict
+
+
+def solve_with_fallback_portfolio(
+    solver: z3.Solver,
+    delay: float = DEFAULT_PORTFOLIO_DELAY,
+    configs: Sequence[SolverConfig] = DEFAULT_PORTFOLIO,
+    timeout: float | None = None,
+) -> PortfolioResult:
+    """
+    Solve the query of a solver in this process, and only race the portfolio on
+    it if the solver does not answer within `delay` seconds. The portfolio is
+    raced right away if `delay` is 0.
+    The timeout, in seconds, bounds the time spent in both steps.
+    """
+    start = time.monotonic()
+    if delay > 0:
+        first_timeout = delay if timeout is None else min(delay, timeout)
+        solver.set("timeout", max(1, int(first_timeout * 1000)))
+        result = solver.check()
+        if result == z3.sat:
+            return PortfolioResult("sat", str(solver.model()), "in-process")
+        if result == z3.unsat:
+            return PortfolioResult("unsat", None, "in-process")
+
+    remaining = None if timeout is None else timeout - (time.monotonic() - start)
+    if remaining is not None and remaining <= 0:
+        return PortfolioResult("unknown")
+    return solve_with_portfolio(solver.to_smt2(), configs, remaining)
+
+
+class PortfolioBackend(SMTBackend):
+    """
+    Solve queries one after the other, racing the portfolio on the queries that
+    are not solved within `delay` seconds in this process.
+    """
+
+    delay: float
+    configs: Sequence[SolverConfig]
+
+    timeout: float | None
+    """Time limit of each query, in seconds. Queries out of time are unknown."""
+
+    def __init__(
+        self,
+        delay: float = DEFAULT_PORTFOLIO_DELAY,
+        configs: Sequence[SolverConfig] = DEFAULT_PORTFOLIO,
+        timeout: float | None = None,
+    ):
+        self.delay = delay
+        self.configs = configs
+        self.timeout = timeout
+
+    def solve_all(
+        self, queries: Iterable[tuple[_Key, z3.Solver]]
+    ) -> Iterator[tuple[_Key, SolverVerdict]]:
+        for key, solver in queries:
+            start = time.perf_counter()
+            result = solve_with_fallback_portfolio(
+                solver, self.delay, self.configs, self.timeout
+            )
+            yield key, SolverVerdict(
+                result.result,
+                result.model,
+                time.perf_counter() - start,
+                config=result.config,
+            )
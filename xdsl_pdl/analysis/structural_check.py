@@ -0,0 +1,154 @@
+"""
+Decide obvious `irdl_ext.check_subset` queries syntactically, without creating
+an SMT query.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from xdsl.dialects.irdl import AnyOp, BaseOp, IsOp
+from xdsl.ir import Block, Operation, SSAValue
+
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, MatchOp, YieldOp
+from xdsl_pdl.passes.optimize_irdl import get_bases
+
+
+@dataclass
+class StructuralVerdict:
+    """The verdict of a query decided without the solver."""
+
+    result: str
+    """Either "sat" (lhs is not a subset of rhs) or "unsat" (lhs is a subset)."""
+
+    reason: str
+    """A human readable explanation of the verdict."""
+
+
+def get_yield(block: Block) -> YieldOp:
+    """Get the `irdl_ext.yield` terminating a region of a query."""
+    assert isinstance(yield_op := block.last_op, YieldOp)
+    return yield_op
+
+
+def _get_properties(op: Operation) -> tuple[object, ...]:
+    """Get the attributes and properties of an operation, without name hints."""
+    attributes = {
+        name: attr for name, attr in op.attributes.items() if name != "name_hints"
+    }
+    return (op.name, attributes, op.properties)
+
+
+def are_regions_equivalent(lhs: Block, rhs: Block) -> bool:
+    """
+    Check if two constraint blocks are identical up to the renaming of their
+    values, and to the name hints of their yields.
+    """
+    lhs_ops = list(lhs.ops)
+    rhs_ops = list(rhs.ops)
+    if len(lhs_ops) != len(rhs_ops):
+        return False
+
+    mapping: dict[SSAValue, SSAValue] = {}
+    for lhs_op, rhs_op in zip(lhs_ops, rhs_ops):
+        if _get_properties(lhs_op) != _get_properties(rhs_op):
+            return False
+        if len(lhs_op.operands) != len(rhs_op.operands):
+            return False
+        for lhs_operand, rhs_operand in zip(lhs_op.operands, rhs_op.operands):
+            if mapping.get(lhs_operand) is not rhs_operand:
+                return False
+        if len(lhs_op.results) != len(rhs_op.results):
+            return False
+        for lhs_result, rhs_result in zip(lhs_op.results, rhs_op.results):
+            mapping[lhs_result] = rhs_result
+    return True
+
+
+def _only_used_by_yield_and_match(value: SSAValue) -> bool:
+    return all(isinstance(use.operation, YieldOp | MatchOp) for use in value.uses)
+
+
+def _implied_by_lhs(lhs_value: SSAValue, rhs_value: SSAValue) -> bool:
+    """
+    Check if the rhs constraint on a yielded value is implied by the constraint
+    of the lhs value yielded at the same position.
+    The rhs value should not be constrained by anything else than its yield.
+    """
+    if not _only_used_by_yield_and_match(rhs_value):
+        return False
+    rhs_op = rhs_value.owner
+    if isinstance(rhs_op, AnyOp):
+        return True
+    if isinstance(rhs_op, BaseOp):
+        lhs_bases = get_bases(lhs_value)
+        rhs_bases = get_bases(rhs_value)
+        if not lhs_bases or not rhs_bases:
+            return False
+        return lhs_bases <= rhs_bases
+    return False
+
+
+def _is_rhs_weaker(check_subset: CheckSubsetOp) -> bool:
+    """
+    Check if every rhs yielded value is only constrained by a constraint that
+    the lhs already implies, such as `irdl.any`, or a base of the lhs value.
+    """
+    lhs_yield = get_yield(check_subset.lhs.block)
+    rhs_yield = get_yield(check_subset.rhs.block)
+
+    # The rhs should not contain constraints other than the ones on yielded values
+    for op in check_subset.rhs.ops:
+        if not isinstance(op, AnyOp | BaseOp | MatchOp | YieldOp):
+            return False
+
+    # Yielding the same rhs value twice requires the lhs values to be equal
+    rhs_to_lhs: dict[SSAValue, SSAValue] = {}
+    for lhs_arg, rhs_arg in zip(lhs_yield.args, rhs_yield.args, strict=True):
+        if rhs_to_lhs.setdefault(rhs_arg, lhs_arg) is not lhs_arg:
+            return False
+        if not _implied_by_lhs(lhs_arg, rhs_arg):
+            return False
+    return True
+
+
+def _find_obvious_counterexample(check_subset: CheckSubsetOp) -> str | None:
+    """
+    Find a counterexample when the lhs is unconstrained, apart from constant
+    values, and the rhs yields a constant that the lhs does not always yield.
+    """
+    for op in check_subset.lhs.ops:
+        if not isinstance(op, AnyOp | IsOp | MatchOp | YieldOp):
+            return None
+
+    lhs_yield = get_yield(check_subset.lhs.block)
+    rhs_yield = get_yield(check_subset.rhs.block)
+    for index, (lhs_arg, rhs_arg) in enumerate(zip(lhs_yield.args, rhs_yield.args)):
+        if not isinstance(rhs_op := rhs_arg.owner, IsOp):
+            continue
+        lhs_op = lhs_arg.owner
+        if isinstance(lhs_op, AnyOp) or (
+            isinstance(lhs_op, IsOp) and lhs_op.expected != rhs_op.expected
+        ):
+            return (
+                f"the lhs value at position {index} may differ from the rhs "
+                f"constant {rhs_op.expected}"
+            )
+    return None
+
+
+def check_subset_structurally(
+    check_subset: CheckSubsetOp,
+) -> StructuralVerdict | None:
+    """
+    Try to decide if the lhs of a `irdl_ext.check_subset` is a subset of its
+    rhs, only by looking at the structure of both regions.
+    Return None if the query needs the solver.
+    """
+    if are_regions_equivalent(check_subset.lhs.block, check_subset.rhs.block):
+        return StructuralVerdict("unsat", "lhs and rhs are identical")
+    if _is_rhs_weaker(check_subset):
+        return StructuralVerdict("unsat", "rhs is implied by the lhs")
+    if (reason := _find_obvious_counterexample(check_subset)) is not None:
+        return StructuralVerdict("sat", reason)
+    return None
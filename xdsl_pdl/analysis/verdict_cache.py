@@ -0,0 +1,201 @@
+"""
+On-disk cache of the verdicts of `irdl_ext.check_subset` queries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from functools import cache
+from io import StringIO
+from pathlib import Path
+
+import xdsl
+import z3
+
+from xdsl.parser import ModuleOp
+from xdsl.printer import Printer
+
+from xdsl_pdl.analysis.check_subset_to_z3 import get_attribute_definitions
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp
+
+CACHE_FORMAT_VERSION = 2
+"""The version of the cache keys and entries, to bump when their layout changes."""
+
+
+def default_cache_dir() -> Path:
+    """Get the default directory of the verdict cache."""
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "xdsl-pdl" / "verdicts"
+
+
+@cache
+def get_encoder_fingerprint() -> str:
+    """
+    Get a hash of the sources of this package, which convert, optimize, and
+    encode the queries. Verdicts computed by another version of the package are
+    then not reused, as they may differ.
+    """
+    package_dir = Path(__file__).parent.parent
+    fingerprint = hashlib.sha256()
+    for path in sorted(package_dir.rglob("*.py")):
+        fingerprint.update(str(path.relative_to(package_dir)).encode())
+        fingerprint.update(path.read_bytes())
+    return fingerprint.hexdigest()
+
+
+def get_query_key(
+    program: ModuleOp,
+    solver_config: dict[str, str],
+    check_subset: CheckSubsetOp | None = None,
+    definitions: tuple[tuple[str, int], ...] | None = None,
+) -> str:
+    """
+    Get the cache key of the `irdl_ext.check_subset` query of a program.
+    The query is the last operation of the program, unless `check_subset` is
+    given.
+    The query is printed without its SSA value names, so queries that are equal
+    up to renaming share the same key. The attribute definitions of the program
+    and the solver configuration are part of the key, as they change the SMT
+    query. The attribute definitions are taken from the program, unless they
+    are given, as when the IRDL specification is not part of the program.
+    The versions of the cache format, of this package, of xDSL and of z3 are
+    part of the key as well, so verdicts are recomputed when they change.
+    """
+    main = check_subset if check_subset is not None else program.ops.last
+    assert isinstance(main, CheckSubsetOp)
+
+    query = main.clone()
+    for op in query.walk():
+        for result in op.results:
+            result.name_hint = None
+        for region in op.regions:
+            for block in region.blocks:
+                for arg in block.args:
+                    arg.name_hint = None
+
+    stream = StringIO()
+    Printer(stream=stream).print_op(query)
+
+    key = hashlib.sha256()
+    key.update(stream.getvalue().encode())
+    if definitions is None:
+        definitions = get_attribute_definitions(program)
+    key.update(repr(definitions).encode())
+    key.update(json.dumps(solver_config, sort_keys=True).encode())
+    key.update(str(CACHE_FORMAT_VERSION).encode())
+    key.update(get_encoder_fingerprint().encode())
+    key.update(xdsl.__version__.encode())
+    key.update(z3.get_version_string().encode())
+    return key.hexdigest()
+
+
+@dataclass
+class CachedVerdict:
+    """
+    The verdict of a query, with the model when the solver found it
+    satisfiable, or the reason of the verdict when it was decided without the
+    solver. Unknown verdicts are not stored in the cache.
+    """
+
+    result: str
+    """Either "sat", "unsat", or "unknown"."""
+
+    model: str | None = None
+    """The model found by the solver, if the query is satisfiable."""
+
+    reason: str | None = None
+    """Why the verdict holds, if it was decided without the solver."""
+
+
+class VerdictCache:
+    """
+    A directory of cached verdicts, with one file per query.
+    When the cache exceeds its maximum size, the least recently used entries are
+    evicted. The modification time of an entry is used as its last access time.
+    The size of the cache is computed when it is opened, and then kept up to
+    date by `store`, so the directory is only scanned again on eviction. Entries
+    stored by other processes are only accounted for on eviction.
+    """
+
+    directory: Path
+    max_size: int
+    """Maximum size of the cache, in bytes."""
+
+    size: int
+    """Size of the entries of the cache, in bytes."""
+
+    num_entries: int
+    """Number of entries of the cache."""
+
+    def __init__(self, directory: Path, max_size: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = self._get_entries()
+        self.size = sum(size for _, size, _ in entries)
+        self.num_entries = len(entries)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / (key + ".json")
+
+    def lookup(self, key: str) -> CachedVerdict | None:
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            path.touch()
+        except (OSError, ValueError):
+            return None
+        return CachedVerdict(entry["result"], entry.get("model"), entry.get("reason"))
+
+    def store(self, key: str, verdict: CachedVerdict):
+        # Write the entry to a temporary file first, so concurrent readers never
+        # see a partially written entry.
+        path = self._entry_path(key)
+        try:
+            self.size -= path.stat().st_size
+            self.num_entries -= 1
+        except OSError:
+            pass
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "result": verdict.result,
+                    "model": verdict.model,
+                    "reason": verdict.reason,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+        self.size += path.stat().st_size
+        self.num_entries += 1
+        if self.size > self.max_size:
+            self.evict()
+
+    def _get_entries(self) -> list[tuple[float, int, Path]]:
+        """Get the last access time, size, and path of each entry."""
+        entries: list[tuple[float, int, Path]] = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its size."""
+        entries = self._get_entries()
+        self.size = sum(size for _, size, _ in entries)
+        self.num_entries = len(entries)
+        entries.sort()
+        for _, size, path in entries:
+            if self.size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            self.size -= size
+            self.num_entries -= 1
@@ -1,5 +1,6 @@
-from typing import TypeAlias
-from xdsl.parser import SymbolRefAttr
+import math
+from dataclasses import dataclass, field
+from typing import Iterable, Sequence, TypeAlias
 from xdsl.passes import ModulePass
 
 from xdsl.ir import Attribute, MLContext, Operation, SSAValue
@@ -7,17 +8,24 @@ from xdsl.dialects import irdl
 from xdsl.rewriter import InsertPoint, Rewriter
 from xdsl.traits import IsTerminator
 from z3 import v
+from xdsl_pdl.analysis.check_subset_to_z3 import AttributeTerm, convert_attr_to_term
+from xdsl_pdl.analysis.constraint_dag import (
+    BaseMask,
+    ConstraintDAG,
+    get_base_name,
+    meet_base_masks,
+)
 from xdsl_pdl.dialects import irdl_extension
-from xdsl.dialects.builtin import ModuleOp, StringAttr
+from xdsl.dialects.builtin import ModuleOp
 from xdsl.pattern_rewriter import (
-    GreedyRewritePatternApplier,
-    PatternRewriteWalker,
     PatternRewriter,
     RewritePattern,
     op_type_rewrite_pattern,
 )
 
-BaseInfo: TypeAlias = set[SymbolRefAttr | str] | None
+# The names of the bases a value may have, as `dialect.name`, or None if the
+# value may have any base.
+BaseInfo: TypeAlias = set[str] | None
 
 
 def meet_bases(bases_lhs: BaseInfo, bases_rhs: BaseInfo) -> BaseInfo:
@@ -34,93 +42,112 @@ def join_bases(bases_lhs: BaseInfo, bases_rhs: BaseInfo) -> BaseInfo:
     return bases_lhs | bases_rhs
 
 
-def get_bases(value: SSAValue) -> set[SymbolRefAttr | str] | None:
-    if not isinstance(value.owner, Operation):
-        return None
-    op = value.owner
-    if isinstance(op, irdl.BaseOp):
-        if op.base_ref is not None:
-            return {op.base_ref}
-        assert op.base_name is not None
-        return {op.base_name.data}
-    if isinstance(op, irdl.ParametricOp):
-        return {op.base_type}
-    if isinstance(op, irdl.AnyOp):
-        return None
-    if isinstance(op, irdl.AllOfOp):
-        bases: BaseInfo = None
-        for arg in op.args:
-            bases = meet_bases(bases, get_bases(arg))
-        return bases
-    if isinstance(op, irdl.AnyOfOp):
-        bases: BaseInfo = None
-        for arg in op.args:
-            bases = join_bases(bases, get_bases(arg))
-        return bases
-    if isinstance(op, irdl.IsOp):
-        # TODO: Add support for known types
-        if isinstance(op.expected, StringAttr):
-            return {"#builtin.string"}
-        return None
+def get_bases(value: SSAValue) -> BaseInfo:
+    """
+    Get the names of the bases a value may have.
+    Patterns use the cached bitmasks of `ConstraintDAG.get_base_mask` instead.
+    """
+    dag = ConstraintDAG()
+    return dag.get_base_names(dag.get_base_mask(value))
 
 
 def is_pure(value: SSAValue) -> bool:
-    if isinstance(value.owner, irdl.IsOp):
-        return True
-    if isinstance(value.owner, irdl.ParametricOp):
-        return all(is_pure(arg) for arg in value.owner.args)
-    return False
+    """
+    Check if a value is defined by an `irdl.is`, or by an `irdl.parametric`
+    whose arguments are pure.
+    Patterns use the cached `ConstraintDAG.is_pure` instead.
+    """
+    return ConstraintDAG().is_pure(value)
 
 
 def is_rooted_dag_with_one_use(value: SSAValue) -> bool:
-    if is_pure(value):
-        return True
-    assert isinstance(value.owner, Operation)
-    if len(value.uses) != 1:
-        return False
+    """
+    Check if a value is pure, or has a single use, and the values of the DAG
+    defining it are only used inside the DAG, unless they are pure.
+    Patterns use the cached `ConstraintDAG.is_rooted_dag_with_one_use` instead.
+    """
+    return ConstraintDAG().is_rooted_dag_with_one_use(value)
 
-    values_to_walk = [value]
-    walked_values = {value}
 
-    operations: list[Operation] = []
+def _get_term(attr: Attribute) -> AttributeTerm | None:
+    try:
+        return convert_attr_to_term(attr)
+    except Exception:
+        return None
 
-    while values_to_walk:
-        value_to_walk = values_to_walk.pop()
-        assert isinstance(value_to_walk.owner, Operation)
-        operations.append(value_to_walk.owner)
-        for operand in value_to_walk.owner.operands:
-            if operand in walked_values:
-                continue
-            walked_values.add(operand)
-            values_to_walk.append(operand)
 
-    for operation in operations:
-        assert len(operation.results) == 1
-        if operation.results[0] == value:
-            continue
-        if is_pure(operation.results[0]):
-            continue
-        for use in operation.results[0].uses:
-            if use.operation not in operations:
+def _accepts_term(
+    value: SSAValue, term: AttributeTerm, mappings: dict[SSAValue, AttributeTerm]
+) -> bool | None:
+    # A value matched to two different attributes might still be satisfied by
+    # choosing other arguments of the `irdl.any_of` it is nested in
+    if value in mappings:
+        return True if mappings[value] == term else None
+    op = value.owner
+    result: bool | None
+    if isinstance(op, irdl.AnyOp):
+        return True
+    if isinstance(op, irdl.IsOp):
+        expected = _get_term(op.expected)
+        return None if expected is None else expected == term
+    if isinstance(op, irdl.BaseOp):
+        if op.base_ref is not None:
+            base = op.base_ref
+        else:
+            assert op.base_name is not None
+            base = op.base_name.data
+        result = get_base_name(base) == term[0]
+    elif isinstance(op, irdl.ParametricOp):
+        if get_base_name(op.base_type) != term[0]:
+            return False
+        # Parameters past the ones named by the constraint are not constrained
+        parameters = term[1:]
+        if len(op.args) > len(parameters):
+            return None
+        if not all(isinstance(parameter, tuple) for parameter in parameters):
+            return None
+        for arg, parameter in zip(op.args, parameters):
+            result = _accepts_term(arg, parameter, mappings)
+            if result is not True:
+                return result
+        result = True
+    elif isinstance(op, irdl.AllOfOp):
+        result = True
+        for arg in op.args:
+            arg_result = _accepts_term(arg, term, mappings)
+            if arg_result is False:
                 return False
-
-    return True
+            if arg_result is None:
+                result = None
+    elif isinstance(op, irdl.AnyOfOp):
+        result = False
+        for arg in op.args:
+            # Values bound by an argument that is not taken are not bound
+            arg_mappings = dict(mappings)
+            arg_result = _accepts_term(arg, term, arg_mappings)
+            if arg_result is True:
+                mappings.update(arg_mappings)
+                result = True
+                break
+            if arg_result is None:
+                result = None
+    else:
+        return None
+    if result is True:
+        mappings[value] = term
+    return result
 
 
-def match_attribute(
-    value: SSAValue, attr: Attribute, mappings: dict[SSAValue, Attribute] = {}
-) -> bool:
-    if value in mappings:
-        return mappings[value] == attr
-    if isinstance(value.owner, irdl.IsOp):
-        return value.owner.expected == attr
-    if isinstance(value.owner, irdl.AnyOfOp):
-        for arg in value.owner.args:
-            if match_attribute(arg, attr, mappings):
-                mappings[value] = attr
-                return True
-        return False
-    assert False
+def accepts_attribute(value: SSAValue, attr: Attribute) -> bool | None:
+    """
+    Check if an attribute satisfies the constraint defining a value, with each
+    value of its DAG matched to a single attribute.
+    Return None if this cannot be decided without solving the constraint.
+    """
+    term = _get_term(attr)
+    if term is None:
+        return None
+    return _accepts_term(value, term, {})
 
 
 class RemoveUnusedOpPattern(RewritePattern):
@@ -151,7 +178,10 @@ class AnyOfSinglePattern(RewritePattern):
             return
 
 
+@dataclass
 class AllOfIsPattern(RewritePattern):
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AllOfOp, rewriter: PatternRewriter, /):
         is_op: Operation
@@ -167,10 +197,14 @@ class AllOfIsPattern(RewritePattern):
             if arg == is_arg:
                 new_args.append(arg)
                 continue
-            if not is_rooted_dag_with_one_use(arg):
+            if not self.dag.is_rooted_dag_with_one_use(arg):
+                new_args.append(arg)
+                continue
+            accepted = accepts_attribute(arg, is_op.expected)
+            if accepted is None:
                 new_args.append(arg)
                 continue
-            if match_attribute(is_arg, is_op.expected):
+            if accepted:
                 continue
 
             # Contradiction in the AllOf
@@ -185,75 +219,87 @@ class AllOfIsPattern(RewritePattern):
 def is_dag_equivalent(
     val1: SSAValue, val2: SSAValue, mappings: dict[SSAValue, SSAValue] | None = None
 ):
+    """
+    Check if the DAG defining a value is equal to the DAG defining another one,
+    with each value of the first DAG always matched to the same value of the
+    second one.
+    """
     if mappings is None:
         mappings = {}
-    if val1 in mappings:
-        return mappings[val1] == val2
 
-    assert isinstance(val1.owner, Operation)
-    assert isinstance(val2.owner, Operation)
-    op1 = val1.owner
-    op2 = val2.owner
+    # The DAGs are walked with an explicit stack, as they may be deeper than
+    # the recursion limit
+    pairs = [(val1, val2)]
+    while pairs:
+        val1, val2 = pairs.pop()
+        if val1 in mappings:
+            if mappings[val1] != val2:
+                return False
+            continue
 
-    if op1 == op2:
-        return True
+        assert isinstance(val1.owner, Operation)
+        assert isinstance(val2.owner, Operation)
+        op1 = val1.owner
+        op2 = val2.owner
 
-    if op1.attributes != op2.attributes:
-        return False
+        if op1 == op2:
+            continue
 
-    if len(op1.operands) != len(op2.operands):
-        return False
-    for operand1, operand2 in zip(op1.operands, op2.operands, strict=True):
-        if not is_dag_equivalent(operand1, operand2, mappings):
+        if op1.attributes != op2.attributes:
             return False
-    mappings[val1] = val2
+
+        if len(op1.operands) != len(op2.operands):
+            return False
+        mappings[val1] = val2
+        pairs.extend(reversed(list(zip(op1.operands, op2.operands, strict=True))))
     return True
 
 
+def find_equivalent_arg(dag: ConstraintDAG, args: Sequence[SSAValue]) -> int | None:
+    """
+    Get the index of an argument that is equivalent to a previous one, when
+    both are rooted DAGs with a single use.
+    Arguments are grouped by their structural number, so only arguments with
+    the same number are compared.
+    """
+    indices_by_number: dict[int, list[int]] = {}
+    for index, arg in enumerate(args):
+        if not dag.is_rooted_dag_with_one_use(arg):
+            continue
+        indices = indices_by_number.setdefault(dag.get_number(arg), [])
+        for previous_index in indices:
+            if is_dag_equivalent(args[previous_index], arg):
+                return index
+        indices.append(index)
+    return None
+
+
+@dataclass
 class AllOfEquivPattern(RewritePattern):
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AllOfOp, rewriter: PatternRewriter, /):
-        for index, arg in enumerate(op.args):
-            if not is_rooted_dag_with_one_use(arg):
-                continue
-            for index2, arg2 in list(enumerate(op.args))[index + 1 :]:
-                if not is_rooted_dag_with_one_use(arg2):
-                    continue
-                if not is_dag_equivalent(arg, arg2):
-                    continue
-
-                rewriter.replace_matched_op(
-                    irdl.AllOfOp(
-                        [
-                            *op.args[:index2],
-                            *op.args[index2 + 1 :],
-                        ]
-                    )
-                )
-                return
+        index = find_equivalent_arg(self.dag, op.args)
+        if index is None:
+            return
+        rewriter.replace_matched_op(
+            irdl.AllOfOp([*op.args[:index], *op.args[index + 1 :]])
+        )
 
 
+@dataclass
 class AnyOfEquivPattern(RewritePattern):
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AnyOfOp, rewriter: PatternRewriter, /):
-        for index, arg in enumerate(op.args):
-            if not is_rooted_dag_with_one_use(arg):
-                continue
-            for index2, arg2 in list(enumerate(op.args))[index + 1 :]:
-                if not is_rooted_dag_with_one_use(arg2):
-                    continue
-                if not is_dag_equivalent(arg, arg2):
-                    continue
-
-                rewriter.replace_matched_op(
-                    irdl.AnyOfOp(
-                        [
-                            *op.args[:index2],
-                            *op.args[index2 + 1 :],
-                        ]
-                    )
-                )
-                return
+        index = find_equivalent_arg(self.dag, op.args)
+        if index is None:
+            return
+        rewriter.replace_matched_op(
+            irdl.AnyOfOp([*op.args[:index], *op.args[index + 1 :]])
+        )
 
 
 class AllOfAnyPattern(RewritePattern):
@@ -405,8 +451,10 @@ class RemoveEqOpPattern(RewritePattern):
         else:
             assert False
 
-        # Merging both operations is harder in that case, so we don't do it for now
-        if earliest_use_index < max(index_lhs, index_rhs):
+        # Merging both operations is harder in that case, so we don't do it for now.
+        # This includes the case where one operand uses the other, where merging
+        # them would create a cycle.
+        if earliest_use_index <= max(index_lhs, index_rhs):
             return
 
         # Get the latest operation
@@ -435,7 +483,73 @@ class RemoveEqOpPattern(RewritePattern):
             ]
 
 
+@dataclass
+class OptimizationStatistics:
+    """How much work optimizing the IRDL constraints of a program took."""
+
+    num_iterations: int = 0
+    """Number of operations taken from the worklist and matched against patterns."""
+
+    num_rewrites: int = 0
+    """Number of patterns that rewrote the program."""
+
+    num_expansions: int = 0
+    """Number of `irdl.all_of` distributed over an `irdl.any_of` argument."""
+
+    num_expansions_over_budget: int = 0
+    """
+    Number of `irdl.all_of` that could be distributed over an `irdl.any_of`
+    argument, but whose expansion was larger than the budget.
+    """
+
+    num_ops_before: int = 0
+    num_ops_after: int = 0
+
+
+@dataclass
 class NestAllOfInAnyOfPattern(RewritePattern):
+    """
+    Distribute an `irdl.all_of` over one of its `irdl.any_of` arguments, if it is
+    only used there: "AllOf(AnyOf(x, y), z)" becomes
+    "AnyOf(AllOf(x, z), AllOf(y, z))".
+
+    The disjunctive normal form of an `irdl.all_of` can be exponentially larger,
+    so it is only expanded when one of the created `irdl.all_of` is a
+    contradiction, that the other patterns then remove, and when the product of
+    the widths of its `irdl.any_of` arguments is within the budget.
+    """
+
+    dag: ConstraintDAG
+
+    budget: int
+    """The maximum number of `irdl.all_of` in the expanded disjunctive normal form."""
+
+    statistics: OptimizationStatistics
+
+    over_budget: set[Operation] = field(default_factory=set)
+    """The `irdl.all_of` that were not expanded because of the budget."""
+
+    def is_contradiction(self, args: Sequence[SSAValue]) -> bool:
+        """
+        Check if an `irdl.all_of` of some arguments is removed by
+        `RemoveAllOfContradictionPatterns`, once its nested `irdl.all_of` are
+        flattened.
+        """
+        bases: BaseMask = None
+        expected: Attribute | None = None
+        for arg in args:
+            bases = meet_base_masks(bases, self.dag.get_base_mask(arg))
+            nested_args = (
+                arg.owner.operands if isinstance(arg.owner, irdl.AllOfOp) else [arg]
+            )
+            for nested_arg in nested_args:
+                if not isinstance(nested_arg.owner, irdl.IsOp):
+                    continue
+                if expected is not None and expected != nested_arg.owner.expected:
+                    return True
+                expected = nested_arg.owner.expected
+        return bases == 0
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AllOfOp, rewriter: PatternRewriter, /):
         for index, arg in enumerate(op.args):
@@ -443,6 +557,24 @@ class NestAllOfInAnyOfPattern(RewritePattern):
                 continue
             if len(arg.owner.output.uses) != 1:
                 continue
+            other_args = [*op.args[:index], *op.args[index + 1 :]]
+            if not any(
+                self.is_contradiction([*other_args, any_of_arg])
+                for any_of_arg in arg.owner.args
+            ):
+                continue
+
+            size = math.prod(
+                len(other_arg.owner.args)
+                for other_arg in op.args
+                if isinstance(other_arg.owner, irdl.AnyOfOp)
+            )
+            if size > self.budget:
+                if op not in self.over_budget:
+                    self.over_budget.add(op)
+                    self.statistics.num_expansions_over_budget += 1
+                return
+
             new_all_ofs: list[irdl.AllOfOp] = []
             for any_of_arg in arg.owner.args:
                 new_all_ofs.append(
@@ -452,15 +584,19 @@ class NestAllOfInAnyOfPattern(RewritePattern):
             rewriter.replace_matched_op(
                 irdl.AnyOfOp([new_all_of.output for new_all_of in new_all_ofs])
             )
+            self.statistics.num_expansions += 1
             return
 
 
+@dataclass
 class RemoveAllOfContradictionPatterns(RewritePattern):
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AllOfOp, rewriter: PatternRewriter, /):
-        bases = get_bases(op.output)
-        if bases == set():
+        if self.dag.get_base_mask(op.output) == 0:
             rewriter.replace_matched_op(irdl.AnyOfOp([]))
+            return
 
         is_value = None
         for arg in op.args:
@@ -474,29 +610,33 @@ class RemoveAllOfContradictionPatterns(RewritePattern):
                 return
 
 
+@dataclass
 class RemoveBaseFromAllOfInNestedAnyOfPattern(RewritePattern):
     """
     On a pattern like this: "AllOf(AnyOf(y, z), x)", if the AnyOf is only used in
     the AllOf, we can remove y or z if their bases are incompatible with x.
     """
 
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AllOfOp, rewriter: PatternRewriter, /):
         for any_of_arg in op.args:
             if not isinstance(any_of_arg.owner, irdl.AnyOfOp):
                 continue
-            if not is_rooted_dag_with_one_use(any_of_arg):
+            if not self.dag.is_rooted_dag_with_one_use(any_of_arg):
                 continue
 
             for arg in op.args:
                 if arg == any_of_arg:
                     continue
-                bases = get_bases(arg)
+                bases = self.dag.get_base_mask(arg)
                 if bases is None:
                     continue
                 new_any_of_args: list[SSAValue] = []
                 for arg_any_of in any_of_arg.owner.args:
-                    if meet_bases(bases, get_bases(arg_any_of)) != set():
+                    arg_any_of_bases = self.dag.get_base_mask(arg_any_of)
+                    if meet_base_masks(bases, arg_any_of_bases) != 0:
                         new_any_of_args.append(arg_any_of)
                 if len(new_any_of_args) == len(any_of_arg.owner.args):
                     continue
@@ -509,25 +649,25 @@ class RemoveDuplicateAnyOfAllOfPattern(RewritePattern):
 
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: irdl.AnyOfOp, rewriter: PatternRewriter, /):
+        # The index of the first `irdl.all_of` argument with each list of arguments
+        indices: dict[tuple[SSAValue, ...], int] = {}
         for index, arg in enumerate(op.args):
             if not isinstance(arg.owner, irdl.AllOfOp) or not len(arg.uses) == 1:
                 continue
-            for index2, arg2 in list(enumerate(op.args))[index + 1 :]:
-                if not isinstance(arg2.owner, irdl.AllOfOp) or not len(arg2.uses) == 1:
-                    continue
-                if arg.owner.args == arg2.owner.args:
-                    rewriter.replace_matched_op(
-                        irdl.AnyOfOp(
-                            [
-                                *op.args[:index2],
-                                *op.args[index2 + 1 :],
-                            ]
-                        )
-                    )
-                    return
+            all_of_args = tuple(arg.owner.args)
+            if all_of_args not in indices:
+                indices[all_of_args] = index
+                continue
+            rewriter.replace_matched_op(
+                irdl.AnyOfOp([*op.args[:index], *op.args[index + 1 :]])
+            )
+            return
 
 
+@dataclass
 class RemoveDuplicateMatchOpPattern(RewritePattern):
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(
         self, op: irdl_extension.CheckSubsetOp, rewriter: PatternRewriter, /
@@ -554,7 +694,10 @@ class RemoveDuplicateMatchOpPattern(RewritePattern):
                     if match_op2 is None:
                         continue
                     if match_op.arg == match_op2.arg:
+                        # The operation is detached, so the uses of its argument
+                        # are forgotten without the rewriter
                         match_op2.erase()
+                        self.dag.invalidate_uses(match_op.arg)
                         dedup_match_ops[index2] = None
 
             if None not in dedup_match_ops:
@@ -573,50 +716,253 @@ class RemoveDuplicateMatchOpPattern(RewritePattern):
                 )
 
 
+def is_before_in_block(op1: Operation, op2: Operation) -> bool:
+    """
+    Check if an operation is before another one of the same block. The block is
+    walked in both directions from the first operation, so the cost is
+    proportional to the distance between both operations.
+    """
+    next_op = op1.next_op
+    prev_op = op1.prev_op
+    while next_op is not None or prev_op is not None:
+        if next_op is op2:
+            return True
+        if prev_op is op2:
+            return False
+        next_op = next_op.next_op if next_op is not None else None
+        prev_op = prev_op.prev_op if prev_op is not None else None
+    assert False, "operations are not in the same block"
+
+
+@dataclass
 class CSEIsParametricPattern(RewritePattern):
+    dag: ConstraintDAG
+
     @op_type_rewrite_pattern
     def match_and_rewrite(
         self, op: irdl.IsOp | irdl.ParametricOp, rewriter: PatternRewriter, /
     ):
-        current_op = op.next_op
-        while current_op is not None:
-            if (
-                current_op.name == op.name
-                and list(current_op.operands) == list(op.operands)
-                and current_op.attributes == op.attributes
-            ):
-                rewriter.replace_op(current_op, [], [op.output])
-                return
-            current_op = current_op.next_op
+        duplicate = self.dag.find_duplicate(op)
+        if duplicate is None:
+            return
+        # Keep the earliest operation, which dominates the uses of both
+        if is_before_in_block(duplicate, op):
+            rewriter.replace_matched_op([], [duplicate.results[0]])
+        else:
+            rewriter.replace_op(duplicate, [], [op.output])
 
 
-class OptimizeIRDL(ModulePass):
-    def apply(self, ctx: MLContext, op: ModuleOp):
-        walker = PatternRewriteWalker(
-            GreedyRewritePatternApplier(
-                [
-                    RemoveUnusedOpPattern(),
-                    AllOfSinglePattern(),
-                    AnyOfSinglePattern(),
-                    AllOfAnyPattern(),
-                    AllOfBaseBasePattern(),
-                    AllOfParametricBasePattern(),
-                    AllOfParametricParametricPattern(),
-                    AllOfIdenticalPattern(),
-                    RemoveEqOpPattern(),
-                    AllOfNestedPattern(),
-                    AnyOfNestedPattern(),
-                    # NestAllOfInAnyOfPattern(),
-                    AllOfEquivPattern(),
-                    AnyOfEquivPattern(),
-                    AllOfIsPattern(),
-                    RemoveAllOfContradictionPatterns(),
-                    RemoveDuplicateAnyOfAllOfPattern(),
-                    RemoveBaseFromAllOfInNestedAnyOfPattern(),
-                    RemoveDuplicateMatchOpPattern(),
-                    CSEIsParametricPattern(),
-                ]
-            )
+REMOVE_UNUSED_OP_PATTERN = RemoveUnusedOpPattern()
+
+# The default maximum number of `irdl.all_of` in the disjunctive normal form of
+# an `irdl.all_of` distributed over its `irdl.any_of` arguments.
+DEFAULT_DNF_BUDGET = 16
+
+
+def get_patterns_by_op_type(
+    dag: ConstraintDAG,
+    statistics: OptimizationStatistics,
+    dnf_budget: int = DEFAULT_DNF_BUDGET,
+) -> dict[type[Operation], list[RewritePattern]]:
+    """
+    Get the patterns applied to each operation type, in order, after
+    `RemoveUnusedOpPattern`. The first pattern rewriting an operation stops the
+    matching of the following ones.
+    """
+    return {
+        irdl.AllOfOp: [
+            AllOfSinglePattern(),
+            AllOfAnyPattern(),
+            AllOfBaseBasePattern(),
+            AllOfParametricBasePattern(),
+            AllOfParametricParametricPattern(),
+            AllOfIdenticalPattern(),
+            AllOfNestedPattern(),
+            NestAllOfInAnyOfPattern(dag, dnf_budget, statistics),
+            AllOfEquivPattern(dag),
+            AllOfIsPattern(dag),
+            RemoveAllOfContradictionPatterns(dag),
+            RemoveBaseFromAllOfInNestedAnyOfPattern(dag),
+        ],
+        irdl.AnyOfOp: [
+            AnyOfSinglePattern(),
+            AnyOfNestedPattern(),
+            AnyOfEquivPattern(dag),
+            RemoveDuplicateAnyOfAllOfPattern(),
+        ],
+        irdl_extension.EqOp: [RemoveEqOpPattern()],
+        irdl_extension.CheckSubsetOp: [RemoveDuplicateMatchOpPattern(dag)],
+        irdl.IsOp: [CSEIsParametricPattern(dag)],
+        irdl.ParametricOp: [CSEIsParametricPattern(dag)],
+    }
+
+
+@dataclass
+class _WorklistDriver:
+    """
+    Apply the optimization patterns until none applies. After a rewrite, only
+    the operations whose patterns may have been enabled are matched again: the
+    created and modified operations, their users, and the operands of the
+    erased operations.
+    """
+
+    dnf_budget: int = DEFAULT_DNF_BUDGET
+    """See `NestAllOfInAnyOfPattern.budget`."""
+
+    statistics: OptimizationStatistics = field(default_factory=OptimizationStatistics)
+
+    worklist: list[Operation] = field(default_factory=list)
+    """The operations to match, used as a stack."""
+
+    in_worklist: set[Operation] = field(default_factory=set)
+
+    dag: ConstraintDAG = field(default_factory=ConstraintDAG)
+    """The structural numbers of the values, kept up to date after rewrites."""
+
+    patterns_by_op_type: dict[type[Operation], list[RewritePattern]] = field(init=False)
+
+    def __post_init__(self):
+        self.patterns_by_op_type = get_patterns_by_op_type(
+            self.dag, self.statistics, self.dnf_budget
         )
 
-        walker.rewrite_op(op)
+    def push(self, op: Operation):
+        # Erased operations are detached from their block
+        if op.parent is None or op in self.in_worklist:
+            return
+        self.in_worklist.add(op)
+        self.worklist.append(op)
+
+    def push_users(self, values: Iterable[SSAValue]):
+        for value in values:
+            for use in value.uses:
+                self.push(use.operation)
+
+    def rewrite(self, op: Operation) -> bool:
+        """Apply the first pattern that matches an operation."""
+        rewriter = PatternRewriter(op)
+        inserted: list[Operation] = []
+        modified: list[Operation] = []
+        new_values: list[SSAValue] = []
+        operand_values: list[SSAValue] = []
+
+        def handle_removal(removed: Operation):
+            operand_values.extend(removed.operands)
+            self.dag.forget(removed)
+
+        def handle_replacement(_: Operation, values: Sequence[SSAValue | None]):
+            new_values.extend(value for value in values if value is not None)
+
+        rewriter.operation_insertion_handler.append(inserted.append)
+        rewriter.operation_modification_handler.append(modified.append)
+        rewriter.operation_removal_handler.append(handle_removal)
+        rewriter.operation_replacement_handler.append(handle_replacement)
+
+        patterns = self.patterns_by_op_type.get(type(op), [])
+        for pattern in [REMOVE_UNUSED_OP_PATTERN, *patterns]:
+            pattern.match_and_rewrite(op, rewriter)
+            if rewriter.has_done_action:
+                break
+        else:
+            return False
+
+        # Some patterns update the operands of users without the rewriter, so
+        # users are only collected once the pattern is done.
+        # The cached properties of the operations whose operands changed, and of
+        # the values whose uses changed, are forgotten, and computed again when
+        # needed.
+        changed_values = [*new_values]
+        used_values = [*new_values, *operand_values]
+        for new_op in inserted:
+            changed_values.extend(new_op.results)
+            used_values.extend(new_op.operands)
+        for modified_op in modified:
+            self.dag.invalidate(modified_op)
+        for value in changed_values:
+            for use in value.uses:
+                self.dag.invalidate(use.operation)
+        for value in used_values:
+            self.dag.invalidate_uses(value)
+
+        for new_op in [*inserted, *modified, op]:
+            self.push(new_op)
+            self.push_users(new_op.results)
+        self.push_users(new_values)
+        # Patterns depend on the number of uses of values, so the definition
+        # and the remaining users of the operands of erased operations are
+        # matched again
+        for value in operand_values:
+            if isinstance(value.owner, Operation):
+                self.push(value.owner)
+        self.push_users(operand_values)
+        return True
+
+    def run(self, root: Operation) -> OptimizationStatistics:
+        """
+        Optimize the operations nested in an operation. Patterns may depend on
+        operations that are not direct operands or users, so all operations are
+        matched again until no pattern applies to any of them.
+        """
+        while True:
+            # The operations are pushed in reverse, to be matched in order
+            for op in reversed(_get_optimized_ops(root)):
+                self.push(op)
+            num_rewrites = self.statistics.num_rewrites
+            while self.worklist:
+                op = self.worklist.pop()
+                self.in_worklist.remove(op)
+                if op.parent is None:
+                    continue
+                self.statistics.num_iterations += 1
+                if self.rewrite(op):
+                    self.statistics.num_rewrites += 1
+            if self.statistics.num_rewrites == num_rewrites:
+                return self.statistics
+
+
+def _get_optimized_ops(op: Operation) -> list[Operation]:
+    """
+    Get the operations to optimize: the constraints of the
+    `irdl_ext.check_subset` operations, followed by the operations themselves,
+    so that their `irdl_ext.match` are deduplicated once the constraints are
+    merged. If there are none, such as when optimizing the IRDL definitions
+    themselves, all operations are optimized.
+    """
+    check_subsets = [
+        nested
+        for nested in op.walk()
+        if isinstance(nested, irdl_extension.CheckSubsetOp)
+    ]
+    if not check_subsets:
+        return [nested for nested in op.walk() if nested is not op]
+    ops: list[Operation] = []
+    for check_subset in check_subsets:
+        ops.extend(
+            nested for nested in check_subset.walk() if nested is not check_subset
+        )
+        ops.append(check_subset)
+    return ops
+
+
+def optimize_irdl(
+    op: Operation, dnf_budget: int = DEFAULT_DNF_BUDGET
+) -> OptimizationStatistics:
+    """
+    Simplify the IRDL constraints of the `irdl_ext.check_subset` operations
+    nested in an operation, with a worklist of the operations to match.
+    `dnf_budget` bounds the size of the disjunctive normal forms created by
+    `NestAllOfInAnyOfPattern`.
+    """
+    num_ops_before = sum(1 for _ in op.walk())
+    statistics = _WorklistDriver(dnf_budget).run(op)
+    statistics.num_ops_before = num_ops_before
+    statistics.num_ops_after = sum(1 for _ in op.walk())
+    return statistics
+
+
+@dataclass(frozen=True)
+class OptimizeIRDL(ModulePass):
+    dnf_budget: int = DEFAULT_DNF_BUDGET
+
+    def apply(self, ctx: MLContext, op: ModuleOp):
+        optimize_irdl(op, self.dnf_budget)
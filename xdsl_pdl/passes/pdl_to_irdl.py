@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from xdsl.ir import OpResult, Operation, Region, SSAValue, MLContext
+from xdsl.ir import Attribute, OpResult, Operation, Region, SSAValue, MLContext
 from xdsl.passes import ModulePass
 from xdsl.rewriter import InsertPoint, Rewriter
 from xdsl.pattern_rewriter import (
@@ -30,7 +30,6 @@ from xdsl.dialects.builtin import (
     StringAttr,
     SymbolRefAttr,
     ModuleOp,
-    UnitAttr,
     DictionaryAttr,
 )
 from xdsl.dialects import irdl
@@ -71,6 +70,10 @@ def convert_pattern_to_check_subset(program: PatternOp) -> CheckSubsetOp:
     applied to the matching part of the rewrite.
     Returns this as a `irdl_extension.check_subset` operation, with PDL operations in
     both regions.
+    The rhs is a copy of the whole pattern, so the constraints of the operations
+    the rewrite leaves untouched are quantified again in the rhs. Only
+    `pattern_to_z3` binds these to their lhs terms, as the correspondence
+    between both regions is lost once they are optimized separately.
     """
 
     # Move the pdl pattern to the lhs of a check_subset operation
@@ -285,56 +288,244 @@ class PDLToIRDLNativeConstraintPattern(RewritePattern):
         rewriter.erase_matched_op()
 
 
+@dataclass(frozen=True)
+class ConstraintTemplate:
+    """An IRDL constraint operation, with its operands given as value slots."""
+
+    op_type: type[Operation]
+    operands: tuple[int, ...]
+    """The slot of each operand, which is the index of the constraint defining it."""
+
+    attributes: dict[str, Attribute]
+    properties: dict[str, Attribute]
+    result_type: Attribute
+    name_hint: str | None
+
+    @staticmethod
+    def from_constraint(
+        constraint: Operation, slots: dict[SSAValue, int]
+    ) -> "ConstraintTemplate":
+        assert len(constraint.results) == 1 and not constraint.regions
+        return ConstraintTemplate(
+            type(constraint),
+            tuple(slots[operand] for operand in constraint.operands),
+            dict(constraint.attributes),
+            dict(constraint.properties),
+            constraint.results[0].type,
+            constraint.results[0].name_hint,
+        )
+
+    def create(self, ops: list[Operation]) -> Operation:
+        """Create the constraint, given the constraints of the previous slots."""
+        return self.op_type.create(
+            operands=[ops[slot].results[0] for slot in self.operands],
+            result_types=[self.result_type],
+            attributes=self.attributes,
+            properties=self.properties,
+        )
+
+
+@dataclass(frozen=True)
+class OperationTemplate:
+    """
+    The constraints of an `irdl.operation`, as a flat list of constraint
+    templates that can be instantiated without cloning the definition.
+    """
+
+    constraints: tuple[ConstraintTemplate, ...]
+    operands: tuple[int, ...]
+    """The slot of the constraint of each operand."""
+
+    results: tuple[int, ...]
+    """The slot of the constraint of each result."""
+
+    @staticmethod
+    def from_operation(irdl_op: irdl.OperationOp) -> "OperationTemplate":
+        slots: dict[SSAValue, int] = {}
+        constraints: list[ConstraintTemplate] = []
+        operands: tuple[int, ...] = ()
+        results: tuple[int, ...] = ()
+        for constraint in irdl_op.body.ops:
+            if isinstance(constraint, irdl.OperandsOp):
+                operands = tuple(slots[arg] for arg in constraint.args)
+                continue
+            if isinstance(constraint, irdl.ResultsOp):
+                results = tuple(slots[arg] for arg in constraint.args)
+                continue
+            constraints.append(ConstraintTemplate.from_constraint(constraint, slots))
+            slots[constraint.results[0]] = len(constraints) - 1
+        return OperationTemplate(tuple(constraints), operands, results)
+
+    def instantiate(self, name_prefix: str | None) -> list[Operation]:
+        """
+        Create new constraint operations, with the name hints of the definition.
+        If a name prefix is given, it is added to the name hints.
+        """
+        ops: list[Operation] = []
+        for constraint in self.constraints:
+            op = constraint.create(ops)
+            if name_prefix is not None and constraint.name_hint is not None:
+                op.results[0].name_hint = name_prefix + "_" + constraint.name_hint
+            else:
+                op.results[0].name_hint = constraint.name_hint
+            ops.append(op)
+        return ops
+
+
+@dataclass(frozen=True)
+class AttributeTemplate:
+    """
+    The parameter constraints of an `irdl.attribute` or `irdl.type`, as a flat
+    list of constraint templates. References to other definitions are made
+    relative to the top-level, so the constraints can be used outside of the
+    dialect.
+    """
+
+    base_type: SymbolRefAttr
+    """The reference to the definition from the top-level."""
+
+    constraints: tuple[ConstraintTemplate, ...]
+    parameters: tuple[int, ...]
+    """The slot of the constraint of each parameter."""
+
+    @staticmethod
+    def from_definition(
+        attr_def: irdl.AttributeOp | irdl.TypeOp,
+    ) -> "AttributeTemplate":
+        slots: dict[SSAValue, int] = {}
+        constraints: list[ConstraintTemplate] = []
+        parameters: tuple[int, ...] = ()
+        for constraint in attr_def.body.ops:
+            if isinstance(constraint, irdl.ParametersOp):
+                parameters = tuple(slots[arg] for arg in constraint.args)
+                continue
+            template = ConstraintTemplate.from_constraint(constraint, slots)
+            if isinstance(constraint, irdl.BaseOp) and constraint.base_ref is not None:
+                template.attributes["base_ref"] = get_op_ref_outside_dialect(
+                    constraint.base_ref, constraint
+                )
+            if isinstance(constraint, irdl.ParametricOp):
+                template.attributes["base_type"] = get_op_ref_outside_dialect(
+                    constraint.base_type, constraint
+                )
+            constraints.append(template)
+            slots[constraint.results[0]] = len(constraints) - 1
+
+        parent_dialect = attr_def.parent_op()
+        assert isinstance(parent_dialect, irdl.DialectOp)
+        base_type = SymbolRefAttr(parent_dialect.sym_name, [attr_def.sym_name])
+        return AttributeTemplate(base_type, tuple(constraints), parameters)
+
+    def instantiate(self) -> tuple[list[Operation], irdl.ParametricOp]:
+        """
+        Create new parameter constraints, and the `irdl.parametric` constraint
+        using them.
+        """
+        ops: list[Operation] = []
+        for constraint in self.constraints:
+            ops.append(constraint.create(ops))
+        param_op = irdl.ParametricOp(
+            self.base_type, [ops[slot].results[0] for slot in self.parameters]
+        )
+        return ops, param_op
+
+
+@dataclass
+class IRDLLibrary:
+    """
+    An IRDL specification, parsed and indexed once, that PDL patterns are
+    converted against. The specification is not part of the converted programs,
+    so it can be shared by the programs of all patterns.
+    """
+
+    module: ModuleOp
+
+    operations: dict[str, irdl.OperationOp]
+    """The operation definitions, indexed by their full name."""
+
+    attributes: dict[str, irdl.AttributeOp | irdl.TypeOp]
+    """The attribute and type definitions, indexed by their full name."""
+
+    templates: dict[str, OperationTemplate] = field(default_factory=dict)
+    """The template of each operation definition, created on first use."""
+
+    attribute_templates: dict[SymbolRefAttr, AttributeTemplate] = field(
+        default_factory=dict
+    )
+    """
+    The template of each attribute or type definition, indexed by the reference
+    used to unfold it, and created on first use.
+    """
+
+    @staticmethod
+    def from_module(module: ModuleOp) -> "IRDLLibrary":
+        """Index the IRDL definitions found in a module."""
+        operations: dict[str, irdl.OperationOp] = {}
+        attributes: dict[str, irdl.AttributeOp | irdl.TypeOp] = {}
+        for def_op in module.walk():
+            if not isinstance(
+                def_op, irdl.OperationOp | irdl.AttributeOp | irdl.TypeOp
+            ):
+                continue
+            assert isinstance((parent := def_op.parent_op()), irdl.DialectOp)
+            name = parent.sym_name.data + "." + def_op.sym_name.data
+            if isinstance(def_op, irdl.OperationOp):
+                operations[name] = def_op
+            else:
+                attributes[name] = def_op
+        return IRDLLibrary(module, operations, attributes)
+
+    def get_template(self, op_name: str) -> OperationTemplate:
+        if (template := self.templates.get(op_name)) is None:
+            if op_name not in self.operations:
+                raise Exception("Operation not found in IRDL: " + op_name)
+            template = OperationTemplate.from_operation(self.operations[op_name])
+            self.templates[op_name] = template
+        return template
+
+    def lookup_attribute(self, ref: SymbolRefAttr) -> irdl.AttributeOp | irdl.TypeOp:
+        """Get the attribute or type definition referenced from the top-level."""
+        attr_def = SymbolTable.lookup_symbol(self.module, ref)
+        assert isinstance(attr_def, irdl.AttributeOp | irdl.TypeOp)
+        return attr_def
+
+    def get_attribute_template(self, ref: SymbolRefAttr) -> AttributeTemplate:
+        if (template := self.attribute_templates.get(ref)) is None:
+            template = AttributeTemplate.from_definition(self.lookup_attribute(ref))
+            self.attribute_templates[ref] = template
+        return template
+
+
 @dataclass
 class PDLToIRDLOperationPattern(RewritePattern):
     """Replace `pdl.operation` to its constraints."""
 
-    irdl_ops: dict[str, irdl.OperationOp]
+    library: IRDLLibrary
 
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: OperationOp, rewriter: PatternRewriter, /):
         if op.opName is None:
             raise Exception("All PDL operations are expected to have a name.")
-        if op.opName.data not in self.irdl_ops:
-            raise Exception("Operation not found in IRDL: " + op.opName.data)
-        irdl_op = self.irdl_ops[op.opName.data]
-
-        # Grab the constraints corresponding to the operands and results
-        irdl_operands = []
-        irdl_results = []
-
-        # Clone all the operation constraints
-        cloned_op = irdl_op.clone()
-        for cloned_constraint, constraint in zip(
-            list(cloned_op.body.ops), irdl_op.body.ops
-        ):
-            if isinstance(cloned_constraint, irdl.OperandsOp):
-                irdl_operands = cloned_constraint.args
-                continue
-            if isinstance(cloned_constraint, irdl.ResultsOp):
-                irdl_results = cloned_constraint.args
-                continue
-            cloned_constraint.detach()
-            rewriter.insert_op_before_matched_op(cloned_constraint)
-            if (op_hint := op.op.name_hint) is not None and (
-                hint := constraint.results[0].name_hint
-            ) is not None:
-                cloned_constraint.results[0].name_hint = op_hint + "_" + hint
+        template = self.library.get_template(op.opName.data)
 
-        cloned_op.erase()
+        # Instantiate the operation constraints
+        constraints = template.instantiate(op.op.name_hint)
+        irdl_operands = [constraints[slot].results[0] for slot in template.operands]
+        irdl_results = [constraints[slot].results[0] for slot in template.results]
 
         operand_matches = list(zip(irdl_operands, op.operand_values, strict=True))
         results_matches = list(zip(irdl_results, op.type_values, strict=True))
 
         # Merge irdl_operand and pdl_operand
+        new_ops: list[Operation] = [*constraints]
         for irdl_operand, pdl_operand in [*operand_matches, *results_matches]:
-            merge_op = EqOp([irdl_operand, pdl_operand])
-            rewriter.insert_op_before_matched_op(merge_op)
+            new_ops.append(EqOp([irdl_operand, pdl_operand]))
 
             # Mark irdl_operand as matched.
             # This ensures that the constraint will not be deleted, and will match
             # an actual attribute (instead of holding no value).
-            rewriter.insert_op_before_matched_op(MatchOp(irdl_operand))
+            new_ops.append(MatchOp(irdl_operand))
+        rewriter.insert_op_before_matched_op(new_ops)
 
         for uses in list(op.op.uses):
             if not isinstance(uses.operation, ResultOp):
@@ -404,9 +595,7 @@ class PDLToIRDLNativeRewritePattern(RewritePattern):
         raise Exception(f"Unknown native rewrite {op.constraint_name}")
 
 
-def convert_pdl_match_to_irdl_match(
-    program: Operation, irdl_ops: dict[str, irdl.OperationOp]
-):
+def convert_pdl_match_to_irdl_match(program: Operation, library: IRDLLibrary):
     """
     Convert PDL operations to IRDL operations in the given program.
     """
@@ -417,7 +606,7 @@ def convert_pdl_match_to_irdl_match(
                 PDLToIRDLOperandPattern(),
                 PDLToIRDLAttributePattern(),
                 PDLToIRDLNativeConstraintPattern(),
-                PDLToIRDLOperationPattern(irdl_ops),
+                PDLToIRDLOperationPattern(library),
                 PDLToIRDLNativeRewritePattern(),
             ]
         )
@@ -438,117 +627,128 @@ def get_op_ref_outside_dialect(
     return new_ref
 
 
-def create_param_attr_constraint_from_definition(
-    attr_def: irdl.TypeOp | irdl.AttributeOp,
-    rewriter: PatternRewriter,
-) -> irdl.ParametricOp:
-    """Clone the constraints on an attribute parameters at a given location."""
-    cloned_attr_def = attr_def.clone()
-    parameters = []
-    for cloned_op, op in zip(
-        cloned_attr_def.body.walk(), attr_def.body.walk(), strict=True
-    ):
-        cloned_op.detach()
-        if isinstance(cloned_op, irdl.BaseOp) and cloned_op.base_ref is not None:
-            cloned_op.base_ref = get_op_ref_outside_dialect(cloned_op.base_ref, op)
-        if isinstance(cloned_op, irdl.ParametricOp):
-            cloned_op.base_type = get_op_ref_outside_dialect(cloned_op.base_type, op)
-        if isinstance(cloned_op, irdl.ParametersOp):
-            parameters = cloned_op.args
-            cloned_op.erase()
-            continue
-        rewriter.insert_op_before_matched_op(cloned_op)
-    cloned_attr_def.erase()
+@dataclass
+class UnfoldingStatistics:
+    """How much unfolding attribute definitions grew a query."""
 
-    parent_dialect = attr_def.parent_op()
-    assert isinstance(parent_dialect, irdl.DialectOp)
+    num_unfolded: int = 0
+    """Number of `irdl.base` and `irdl.parametric` constraints unfolded."""
 
-    param_op = irdl.ParametricOp(
-        SymbolRefAttr(parent_dialect.sym_name, [attr_def.sym_name]), parameters
-    )
-    rewriter.insert_op_before_matched_op(param_op)
-    return param_op
+    num_truncated: int = 0
+    """Number of constraints left folded because of the depth bound."""
+
+    max_depth: int = 0
+    """Deepest nesting of unfolded definitions."""
+
+    num_ops_before: int = 0
+    num_ops_after: int = 0
 
 
 @dataclass
 class EmbedIRDLAttrPattern(RewritePattern):
+    """
+    Add to `irdl.base` and `irdl.parametric` constraints the parameter
+    constraints of the definition they reference. The constraints created this
+    way are unfolded in turn, up to `max_depth` nested definitions.
+    """
+
+    library: IRDLLibrary
+
+    max_depth: int | None = None
+    """The maximum number of nested unfoldings, or None for no bound."""
+
+    statistics: UnfoldingStatistics = field(default_factory=UnfoldingStatistics)
+
+    depths: dict[Operation, int] = field(default_factory=dict)
+    """
+    The number of unfoldings each constraint was created by. Constraints that
+    are not in the dictionary were not created by an unfolding.
+    """
+
+    unfolded: set[Operation] = field(default_factory=set)
+    """The constraints that are already unfolded, or should not be."""
+
     @op_type_rewrite_pattern
     def match_and_rewrite(
         self, op: irdl.BaseOp | irdl.ParametricOp, rewriter: PatternRewriter, /
     ):
-        if "processed" in op.attributes:
+        if op in self.unfolded:
             return
         if isinstance(op, irdl.BaseOp):
             # We cannot unfold attributes that are not from the IRDL module
             if op.base_name is not None:
                 return
             assert op.base_ref is not None
-            attr_def = SymbolTable.lookup_symbol(op, op.base_ref)
-            assert attr_def is not None
-            assert isinstance(attr_def, irdl.AttributeOp | irdl.TypeOp)
-            param_op = create_param_attr_constraint_from_definition(attr_def, rewriter)
-            param_op.attributes["processed"] = UnitAttr()
-            op.attributes["processed"] = UnitAttr()
-            cloned_op = op.clone()
-            rewriter.insert_op_before_matched_op(cloned_op)
-            rewriter.replace_matched_op(
-                irdl.AllOfOp([cloned_op.output, param_op.output])
-            )
+            ref = op.base_ref
+        else:
+            ref = op.base_type
+
+        depth = self.depths.get(op, 0)
+        if self.max_depth is not None and depth >= self.max_depth:
+            self.unfolded.add(op)
+            self.statistics.num_truncated += 1
             return
 
-        attr_def = SymbolTable.lookup_symbol(op, op.base_type)
-        assert attr_def is not None
-        assert isinstance(attr_def, irdl.AttributeOp | irdl.TypeOp)
-        param_op = create_param_attr_constraint_from_definition(attr_def, rewriter)
-        param_op.attributes["processed"] = UnitAttr()
-        op.attributes["processed"] = UnitAttr()
+        constraints, param_op = self.library.get_attribute_template(ref).instantiate()
+        for constraint in constraints:
+            self.depths[constraint] = depth + 1
         cloned_op = op.clone()
-        rewriter.insert_op_before_matched_op(cloned_op)
+        self.unfolded.update((param_op, cloned_op))
+        self.statistics.num_unfolded += 1
+        self.statistics.max_depth = max(self.statistics.max_depth, depth + 1)
+        rewriter.insert_op_before_matched_op([*constraints, param_op, cloned_op])
         rewriter.replace_matched_op(irdl.AllOfOp([cloned_op.output, param_op.output]))
-        return
 
 
-def embed_irdl_attr_verifiers(op: Operation):
-    walker = PatternRewriteWalker(
-        GreedyRewritePatternApplier(
-            [
-                EmbedIRDLAttrPattern(),
-            ]
-        )
-    )
+def embed_irdl_attr_verifiers(
+    op: Operation, library: IRDLLibrary, max_depth: int | None = None
+) -> UnfoldingStatistics:
+    """
+    Unfold the attribute definitions referenced by the constraints of an
+    operation, and return how much the operation grew.
+    """
+    pattern = EmbedIRDLAttrPattern(library, max_depth)
+    pattern.statistics.num_ops_before = sum(1 for _ in op.walk())
+    walker = PatternRewriteWalker(GreedyRewritePatternApplier([pattern]))
     walker.rewrite_op(op)
+    pattern.statistics.num_ops_after = sum(1 for _ in op.walk())
+    return pattern.statistics
 
 
-class PDLToIRDLPass(ModulePass):
-    def apply(self, ctx: MLContext, op: ModuleOp):
-        # Grab the rewrite operation which should be the last one
-        rewrite = op.ops.last
-        if not isinstance(rewrite, PatternOp):
-            raise Exception(
-                "Error: expected a PDL pattern operation as "
-                "the last operation in the program",
-            )
+def convert_pattern_to_irdl(
+    program: ModuleOp, library: IRDLLibrary, max_unfolding_depth: int | None = None
+) -> UnfoldingStatistics:
+    """
+    Convert the PDL pattern, which should be the last operation of the program,
+    to an `irdl_extension.check_subset` operation using the definitions of the
+    IRDL library. Attribute definitions are unfolded up to
+    `max_unfolding_depth` nested definitions.
+    """
+    # Grab the rewrite operation which should be the last one
+    rewrite = program.ops.last
+    if not isinstance(rewrite, PatternOp):
+        raise Exception(
+            "Error: expected a PDL pattern operation as "
+            "the last operation in the program",
+        )
 
-        # Grab the IRDL operations that exist in the program
-        irdl_ops: dict[str, irdl.OperationOp] = {}
-        for op_op in op.walk():
-            if not isinstance(op_op, irdl.OperationOp):
-                continue
-            assert isinstance((parent := op_op.parent_op()), irdl.DialectOp)
-            name = parent.sym_name.data + "." + op_op.sym_name.data
-            irdl_ops[name] = op_op
+    # Add `pdl.result` operation for each `pdl.operation` result.
+    # This simplifies the following transformations.
+    add_missing_pdl_result(rewrite)
+
+    # Convert the PDL pattern to a `irdl_extension.check_subset`
+    # operation that still uses PDL operations.
+    # This executes the rewrite on PDL itself
+    check_subset = convert_pattern_to_check_subset(rewrite)
+    Rewriter.replace_op(rewrite, check_subset)
 
-        # Add `pdl.result` operation for each `pdl.operation` result.
-        # This simplifies the following transformations.
-        add_missing_pdl_result(rewrite)
+    # Convert the remaining PDL operations to IRDL operations
+    convert_pdl_match_to_irdl_match(check_subset, library)
 
-        # Convert the PDL pattern to a `irdl_extension.check_subset`
-        # operation that still uses PDL operations.
-        # This executes the rewrite on PDL itself
-        check_subset = convert_pattern_to_check_subset(rewrite)
-        Rewriter.replace_op(rewrite, check_subset)
+    return embed_irdl_attr_verifiers(check_subset, library, max_unfolding_depth)
 
-        # Convert the remaining PDL operations to IRDL operations
-        convert_pdl_match_to_irdl_match(check_subset, irdl_ops)
 
-        embed_irdl_attr_verifiers(check_subset)
+class PDLToIRDLPass(ModulePass):
+    def apply(self, ctx: MLContext, op: ModuleOp):
+        # The IRDL definitions are in the program itself
+        convert_pattern_to_irdl(op, IRDLLibrary.from_module(op))
@@ -4,14 +4,50 @@ dialects.
 """
 
 import argparse
+import multiprocessing
 import sys
+import time
+from dataclasses import dataclass
+from io import StringIO
+from pathlib import Path
+from typing import Iterable, Iterator
 import z3
 
 from xdsl.ir import MLContext
 from xdsl.parser import Parser
-from xdsl.rewriter import Rewriter
-from xdsl_pdl.analysis.check_subset_to_z3 import check_subset_to_z3
-from xdsl_pdl.dialects.irdl_extension import IRDLExtension
+from xdsl_pdl.analysis.base_analysis import check_subset_with_bases
+from xdsl_pdl.analysis.check_subset_to_z3 import (
+    AttributeSort,
+    check_subset_to_z3,
+    create_attribute_sort,
+    get_attribute_definitions,
+    get_string_literals,
+)
+from xdsl_pdl.analysis.concrete_evaluator import find_counterexample
+from xdsl_pdl.analysis.pdl_to_z3 import pattern_to_z3
+from xdsl_pdl.analysis.irdl_slice import (
+    get_pattern_operation_names,
+    get_reachable_definitions,
+)
+from xdsl_pdl.analysis.query_statistics import QueryStatistics
+from xdsl_pdl.analysis.smt_backend import (
+    ExternalSolverBackend,
+    InProcessBackend,
+    SMTBackend,
+    SolverVerdict,
+)
+from xdsl_pdl.analysis.solver_portfolio import (
+    DEFAULT_PORTFOLIO_DELAY,
+    PortfolioBackend,
+)
+from xdsl_pdl.analysis.structural_check import check_subset_structurally
+from xdsl_pdl.analysis.verdict_cache import (
+    CachedVerdict,
+    VerdictCache,
+    default_cache_dir,
+    get_query_key,
+)
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, IRDLExtension
 from xdsl_pdl.dialects.transfer import Transfer
 
 from xdsl.dialects.builtin import (
@@ -20,8 +56,491 @@ from xdsl.dialects.builtin import (
 )
 from xdsl.dialects.irdl import IRDL
 from xdsl.dialects.pdl import PDL, PatternOp
-from xdsl_pdl.passes.optimize_irdl import OptimizeIRDL
-from xdsl_pdl.passes.pdl_to_irdl import PDLToIRDLPass
+from xdsl_pdl.passes.optimize_irdl import DEFAULT_DNF_BUDGET, optimize_irdl
+from xdsl_pdl.passes.pdl_to_irdl import IRDLLibrary, convert_pattern_to_irdl
+
+
+def time_encoding(
+    program: ModuleOp,
+    attribute_sort: AttributeSort | None,
+    quantifier_free: bool,
+    int_width: int | None = None,
+) -> tuple[z3.CheckSatResult, float]:
+    """
+    Encode and solve a check_subset program in a new solver.
+    Return the verdict and the time it took.
+    """
+    start = time.perf_counter()
+    solver = z3.Solver()
+    check_subset_to_z3(program, solver, attribute_sort, quantifier_free, int_width)
+    result = solver.check()
+    return result, time.perf_counter() - start
+
+
+def create_context() -> MLContext:
+    ctx = MLContext()
+    ctx.load_dialect(Builtin)
+    ctx.load_dialect(IRDL)
+    ctx.load_dialect(IRDLExtension)
+    ctx.load_dialect(PDL)
+    ctx.load_dialect(Transfer)
+    return ctx
+
+
+@dataclass
+class PatternResult:
+    """The result of checking a single PDL pattern."""
+
+    output: str
+    """The report printed for this pattern."""
+
+    may_break_invariants: bool
+
+    quantified_time: float = 0.0
+    """Time to solve the query with the quantified encoding, if compared."""
+
+    quantifier_free_time: float = 0.0
+    """Time to solve the query with the quantifier-free encoding, if compared."""
+
+    statistics: QueryStatistics | None = None
+
+    decided_structurally: bool = False
+    """Whether the query was decided by the structural fast path."""
+
+    decided_by_bases: bool = False
+    """Whether the query was decided by the base analysis."""
+
+    decided_by_evaluation: bool = False
+    """Whether a counterexample was found by evaluating the query concretely."""
+
+    engines_disagree: bool = False
+    """Whether the direct engine found another verdict, in differential mode."""
+
+
+@dataclass
+class _Query:
+    """A pattern being checked, from its conversion to its verdict."""
+
+    pattern: PatternOp
+    """The checked pattern, which is not modified."""
+
+    program: ModuleOp
+    """
+    The program of the query, which is the converted pattern with the IR
+    engine, and the pattern itself with the direct engine.
+    """
+
+    out: StringIO
+    """The report printed for this pattern."""
+
+    statistics: QueryStatistics
+    definitions: tuple[tuple[str, int], ...]
+    """The attribute definitions of the datatype the query is encoded with."""
+
+    cache_key: str | None = None
+    verdict: CachedVerdict | None = None
+
+
+class PatternChecker:
+    """
+    Check PDL patterns against an IRDL specification.
+    The IRDL library, the attribute datatype in incremental mode, and the verdict
+    cache are created once, and shared by all patterns checked by this object.
+    """
+
+    def __init__(self, args: argparse.Namespace, string_literals: set[str]):
+        self.args = args
+        self.ctx = create_context()
+
+        # Parse the IRDL program
+        with open(args.irdl_file) as f:
+            self.irdl_program = Parser(self.ctx, f.read()).parse_module()
+
+        # The IRDL program is optimized and indexed once, and referenced by the
+        # program of each pattern instead of being copied in it.
+        optimize_irdl(self.irdl_program)
+        self.library = IRDLLibrary.from_module(self.irdl_program)
+        self.attribute_definitions = get_attribute_definitions(self.irdl_program)
+
+        # In incremental mode, the attribute datatype only depends on the IRDL
+        # program, so it is shared by all patterns that are checked in one solver.
+        # We use a tactic-based solver, as the default solver switches to its
+        # incremental core after the first `push`, which is much slower on our
+        # quantified queries.
+        self.attribute_sort: AttributeSort | None = None
+        self.incremental_solver: z3.Solver | None = None
+        if args.incremental:
+            self.attribute_sort = create_attribute_sort(
+                self.irdl_program, args.bitvector_width, string_literals
+            )
+            self.incremental_solver = z3.Tactic("default").solver()
+
+        # Queries are solved in this process with the z3 API, unless an external
+        # backend or the portfolio is used.
+        self.backend: SMTBackend
+        if args.backend == "external":
+            backend = ExternalSolverBackend(
+                args.solver_command,
+                args.solver_jobs,
+                args.timeout,
+                args.solver_memory_limit,
+            )
+            self.backend = backend
+            solver_name = "external: " + " ".join(backend.command)
+        elif args.portfolio:
+            self.backend = PortfolioBackend(args.portfolio_delay, timeout=args.timeout)
+            solver_name = "portfolio"
+        else:
+            self.backend = InProcessBackend(args.timeout)
+            solver_name = "incremental" if args.incremental else "default"
+
+        self.quantifier_free = args.encoding == "quantifier-free"
+        self.cache = None if args.cache_dir is None else VerdictCache(args.cache_dir)
+        self.solver_config = {
+            "encoding": args.encoding,
+            "bitvector_width": str(args.bitvector_width),
+            "solver": solver_name,
+        }
+
+    def _prepare(self, pattern_op: PatternOp) -> _Query:
+        """
+        Convert a pattern to a query, and decide it without the solver if
+        possible.
+        """
+        args = self.args
+        out = StringIO()
+
+        print("Pattern ", pattern_op.sym_name, file=out)
+        program = ModuleOp([pattern_op.clone()])
+        pattern_name = pattern_op.sym_name.data if pattern_op.sym_name else ""
+        statistics = QueryStatistics(args.input_file, pattern_name, "")
+
+        # The direct engine encodes the pattern without converting it, so the
+        # query can only be decided by the solver
+        if args.engine == "direct":
+            return _Query(
+                pattern_op, program, out, statistics, self.attribute_definitions
+            )
+
+        unfolding = convert_pattern_to_irdl(program, self.library, args.unfolding_depth)
+        if args.debug:
+            print("Converted IRDL program before optimization:", file=out)
+            print(program, file=out)
+        optimization = optimize_irdl(program, args.dnf_budget)
+        if args.debug:
+            print("Converted IRDL program after optimization:", file=out)
+            print(program, file=out)
+            print(
+                f"Optimization matched {optimization.num_iterations} operations "
+                f"and applied {optimization.num_rewrites} rewrites",
+                file=out,
+            )
+            print(
+                f"Optimization changed the query from {optimization.num_ops_before} "
+                f"to {optimization.num_ops_after} operations, with "
+                f"{optimization.num_expansions} all_of distributed over an any_of "
+                f"and {optimization.num_expansions_over_budget} over the budget",
+                file=out,
+            )
+
+        statistics.num_unfolded_definitions = unfolding.num_unfolded
+        statistics.num_truncated_unfoldings = unfolding.num_truncated
+        statistics.unfolding_depth = unfolding.max_depth
+        statistics.num_ops_before_unfolding = unfolding.num_ops_before
+        statistics.num_ops_after_unfolding = unfolding.num_ops_after
+        statistics.num_optimization_iterations = optimization.num_iterations
+        statistics.num_optimization_rewrites = optimization.num_rewrites
+        statistics.num_ops_before_optimization = optimization.num_ops_before
+        statistics.num_ops_after_optimization = optimization.num_ops_after
+        statistics.num_dnf_expansions = optimization.num_expansions
+        statistics.num_dnf_expansions_over_budget = (
+            optimization.num_expansions_over_budget
+        )
+        # Only keep the attribute definitions the query can reference, unless the
+        # datatype is shared by all queries, or the references are not known
+        assert isinstance(check_subset := program.ops.last, CheckSubsetOp)
+        definitions = self.attribute_definitions
+        names = None
+        if not args.no_slicing and self.attribute_sort is None:
+            names = get_reachable_definitions(
+                self.library,
+                get_pattern_operation_names(pattern_op),
+                check_subset.walk(),
+            )
+        if names is not None:
+            definitions = tuple(
+                definition for definition in definitions if definition[0] in names
+            )
+        query = _Query(pattern_op, program, out, statistics, definitions)
+
+        # Decide obvious queries without creating an SMT query
+        if not args.no_fast_path:
+            structural_verdict = check_subset_structurally(check_subset)
+            if structural_verdict is not None:
+                query.verdict = CachedVerdict(
+                    structural_verdict.result, reason=structural_verdict.reason
+                )
+                statistics.decided_structurally = True
+                if args.debug:
+                    print(
+                        f"Decided structurally: {structural_verdict.reason}", file=out
+                    )
+        if query.verdict is None and not args.no_base_analysis:
+            bases_verdict = check_subset_with_bases(check_subset)
+            if bases_verdict is not None:
+                query.verdict = CachedVerdict(
+                    bases_verdict.result, reason=bases_verdict.reason
+                )
+                statistics.decided_by_bases = True
+                if args.debug:
+                    print(f"Decided by base analysis: {bases_verdict.reason}", file=out)
+        if query.verdict is None and args.samples > 0:
+            counterexample = find_counterexample(
+                check_subset, query.definitions, args.samples
+            )
+            if counterexample is not None:
+                query.verdict = CachedVerdict(
+                    "sat", reason=f"counterexample: {counterexample}"
+                )
+                statistics.decided_by_evaluation = True
+                if args.debug:
+                    print(
+                        "Found a counterexample after "
+                        f"{counterexample.num_samples} samples",
+                        file=out,
+                    )
+
+        if query.verdict is None and self.cache is not None:
+            query.cache_key = get_query_key(
+                program, self.solver_config, definitions=query.definitions
+            )
+            query.verdict = self.cache.lookup(query.cache_key)
+            statistics.cached = query.verdict is not None
+            if args.debug and query.verdict is not None:
+                print("Using cached verdict", file=out)
+        return query
+
+    def _get_attribute_sort(self, query: _Query, sliced: bool = True) -> AttributeSort:
+        """
+        Get the attribute datatype of a query, which depends on the IRDL
+        definitions it references and on the strings used in the query.
+        If `sliced` is False, the datatype has all IRDL definitions, and the
+        strings of the unconverted pattern.
+        """
+        if self.attribute_sort is not None:
+            return self.attribute_sort
+        if not sliced:
+            return create_attribute_sort(
+                self.irdl_program,
+                self.args.bitvector_width,
+                get_string_literals(query.program) | get_string_literals(query.pattern),
+            )
+        return create_attribute_sort(
+            self.irdl_program,
+            self.args.bitvector_width,
+            get_string_literals(query.program),
+            {name for name, _ in query.definitions},
+        )
+
+    def _encode(self, query: _Query) -> z3.Solver:
+        """
+        Encode a query in a solver. In incremental mode, the solver scope
+        should be popped once the query is solved.
+        """
+        args = self.args
+        encoding_start = time.perf_counter()
+        if self.incremental_solver is not None:
+            solver = self.incremental_solver
+            solver.push()
+        else:
+            solver = z3.Solver()
+        if args.engine == "direct":
+            query_info = pattern_to_z3(
+                query.pattern,
+                self.library,
+                solver,
+                self._get_attribute_sort(query),
+                self.quantifier_free,
+                args.unfolding_depth,
+            )
+        else:
+            query_info = check_subset_to_z3(
+                query.program,
+                solver,
+                self._get_attribute_sort(query),
+                self.quantifier_free,
+                args.bitvector_width,
+            )
+        statistics = query.statistics
+        statistics.encoding_time = time.perf_counter() - encoding_start
+        statistics.num_quantified_constants = query_info.num_quantified_constants
+        statistics.num_constraints = query_info.num_constraints
+        statistics.num_constructors = query_info.num_constructors
+
+        if args.debug:
+            print("SMT program:", file=query.out)
+            print(solver.to_smt2(), file=query.out)
+        return solver
+
+    def _set_backend_verdict(self, query: _Query, verdict: SolverVerdict):
+        query.verdict = CachedVerdict(verdict.result, verdict.model)
+        query.statistics.solve_time = verdict.solve_time
+        query.statistics.solver_statistics = verdict.solver_statistics
+        if self.args.debug and verdict.config is not None:
+            print(f"Solved by {verdict.config}", file=query.out)
+        self._store(query)
+
+    def _store(self, query: _Query):
+        # Unknown results are not cached, as they may be solved later
+        if self.cache is None or query.cache_key is None:
+            return
+        assert query.verdict is not None
+        if query.verdict.result != "unknown":
+            self.cache.store(query.cache_key, query.verdict)
+
+    def check(self, pattern_op: PatternOp) -> PatternResult:
+        [result] = self.check_all([pattern_op])
+        return result
+
+    def check_all(self, pattern_ops: Iterable[PatternOp]) -> Iterator[PatternResult]:
+        """
+        Check patterns, and return their results in order.
+        With an external backend, the next queries are prepared while the
+        previous ones are being solved, by up to one solver process per job.
+        """
+        queries: dict[int, _Query] = {}
+        next_index = 0
+
+        def queries_to_solve() -> Iterator[tuple[int, z3.Solver]]:
+            for index, pattern_op in enumerate(pattern_ops):
+                query = self._prepare(pattern_op)
+                queries[index] = query
+                if query.verdict is None:
+                    solver = self._encode(query)
+                    # The backend is done with the solver once it asks for the
+                    # next query, so the incremental scope can be popped then.
+                    try:
+                        yield index, solver
+                    finally:
+                        if self.incremental_solver is not None:
+                            solver.pop()
+
+        def finished_results() -> Iterator[PatternResult]:
+            nonlocal next_index
+            while next_index in queries and queries[next_index].verdict is not None:
+                yield self._finish(queries.pop(next_index))
+                next_index += 1
+
+        for index, verdict in self.backend.solve_all(queries_to_solve()):
+            self._set_backend_verdict(queries[index], verdict)
+            yield from finished_results()
+        yield from finished_results()
+
+    def _finish(self, query: _Query) -> PatternResult:
+        """Report the verdict of a query."""
+        args = self.args
+        out = query.out
+        program = query.program
+        statistics = query.statistics
+        verdict = query.verdict
+        assert verdict is not None
+
+        # A pattern that could not be checked is reported as possibly breaking
+        # the invariants, as they could not be proven.
+        statistics.verdict = verdict.result
+        pattern_result = PatternResult("", verdict.result != "unsat")
+        pattern_result.statistics = statistics
+        pattern_result.decided_structurally = statistics.decided_structurally
+        pattern_result.decided_by_bases = statistics.decided_by_bases
+        pattern_result.decided_by_evaluation = statistics.decided_by_evaluation
+        if verdict.result == "sat":
+            print("sat: PDL rewrite may break IRDL invariants", file=out)
+            if verdict.reason is not None:
+                print("reason: ", verdict.reason, file=out)
+            else:
+                print("model: ", verdict.model, file=out)
+        elif verdict.result == "unknown":
+            print("unknown: PDL rewrite may break IRDL invariants", file=out)
+        else:
+            print("unsat: PDL rewrite will not break IRDL invariants", file=out)
+
+        if args.compare_encodings:
+            attribute_sort = self._get_attribute_sort(query)
+            quantified_result, quantified_time = time_encoding(
+                program, attribute_sort, False, args.bitvector_width
+            )
+            quantifier_free_result, quantifier_free_time = time_encoding(
+                program, attribute_sort, True, args.bitvector_width
+            )
+            pattern_result.quantified_time = quantified_time
+            pattern_result.quantifier_free_time = quantifier_free_time
+            print(
+                f"encoding time: quantified {quantified_time:.3f}s, "
+                f"quantifier-free {quantifier_free_time:.3f}s "
+                f"({quantified_time / quantifier_free_time:.1f}x speedup)",
+                file=out,
+            )
+            if quantified_result != quantifier_free_result:
+                print(
+                    f"error: encodings disagree ({quantified_result} with the "
+                    f"quantified encoding, {quantifier_free_result} with the "
+                    "quantifier-free encoding)",
+                    file=out,
+                )
+
+        if args.differential:
+            direct_result = self._solve_directly(query)
+            if {verdict.result, direct_result} == {"sat", "unsat"}:
+                pattern_result.engines_disagree = True
+                print(
+                    f"error: engines disagree ({verdict.result} with the IR "
+                    f"engine, {direct_result} with the direct engine)",
+                    file=out,
+                )
+
+        pattern_result.output = out.getvalue()
+        return pattern_result
+
+    def _solve_directly(self, query: _Query) -> str:
+        """Solve a query with the direct engine, in a new solver."""
+        args = self.args
+        solver = z3.Solver()
+        if args.timeout is not None:
+            solver.set("timeout", int(args.timeout * 1000))
+        pattern_to_z3(
+            query.pattern,
+            self.library,
+            solver,
+            self._get_attribute_sort(query, sliced=False),
+            self.quantifier_free,
+            args.unfolding_depth,
+        )
+        return str(solver.check())
+
+
+# The pattern checker of a worker process, created once per worker so the IRDL
+# program is only parsed once.
+_worker_checker: PatternChecker | None = None
+
+
+def _init_worker(args: argparse.Namespace, string_literals: set[str]):
+    global _worker_checker
+    _worker_checker = PatternChecker(args, string_literals)
+
+
+def _check_in_worker(pattern: str) -> PatternResult:
+    """Check a pattern, given in its textual form, in a worker process."""
+    assert _worker_checker is not None
+    pattern_program = Parser(_worker_checker.ctx, pattern).parse_module()
+    assert isinstance(pattern_op := pattern_program.ops.first, PatternOp)
+    return _worker_checker.check(pattern_op)
+
+
+def print_results(results: Iterable[PatternResult]) -> Iterator[PatternResult]:
+    """Print the output of each pattern as soon as it is checked."""
+    for result in results:
+        print(result.output, end="", flush=True)
+        yield result
 
 
 def main():
@@ -33,58 +552,277 @@ def main():
     arg_parser.add_argument("input_file", type=str, help="path to input file")
     arg_parser.add_argument("irdl_file", type=str, help="path to IRDL file")
     arg_parser.add_argument("--debug", action="store_true", help="enable debug mode")
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="declare the attribute datatype once per IRDL file, and check all "
+        "patterns in a single solver using push/pop",
+    )
+    arg_parser.add_argument(
+        "--encoding",
+        choices=["quantified", "quantifier-free"],
+        default="quantified",
+        help="encoding of the rhs of the queries. quantifier-free instantiates the "
+        "rhs values with lhs terms and splits irdl.any_of into cases",
+    )
+    arg_parser.add_argument(
+        "--compare-encodings",
+        action="store_true",
+        help="solve each query with both encodings, and report the speedup of the "
+        "quantifier-free encoding",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        nargs="?",
+        const=default_cache_dir(),
+        default=None,
+        help="read and write the verdicts of queries in an on-disk cache, in this "
+        "directory, or in the user cache directory if none is given",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes checking patterns in parallel",
+    )
+    arg_parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="time limit in seconds for each query. Queries that are not solved "
+        "in time have an unknown verdict",
+    )
+    arg_parser.add_argument(
+        "--portfolio",
+        action="store_true",
+        help="race several z3 configurations in parallel processes on the "
+        "queries that are not solved quickly, and keep the first definite answer",
+    )
+    arg_parser.add_argument(
+        "--portfolio-delay",
+        type=float,
+        default=DEFAULT_PORTFOLIO_DELAY,
+        help="time limit in seconds for solving a query in this process, before "
+        "racing the portfolio on it",
+    )
+    arg_parser.add_argument(
+        "--bitvector-width",
+        type=int,
+        default=None,
+        help="encode integers and strings as bit-vectors of this width. Queries "
+        "with more values than there are strings that are not literals of the "
+        "program are rejected",
+    )
+    arg_parser.add_argument(
+        "--stats-file",
+        type=str,
+        default=None,
+        help="write the encoding and solving statistics of each pattern to this "
+        "file, as one JSON record per line",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print how much the unfolding and the optimization of the queries "
+        "changed them, and how many queries were decided without the solver",
+    )
+    arg_parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="send every query to the solver, even the ones that can be decided "
+        "by only looking at their structure",
+    )
+    arg_parser.add_argument(
+        "--no-base-analysis",
+        action="store_true",
+        help="do not decide queries by comparing the bases of the values yielded "
+        "by both sides",
+    )
+    arg_parser.add_argument(
+        "--no-slicing",
+        action="store_true",
+        help="encode each query with every attribute definition of the IRDL "
+        "program, instead of only the ones it can reference",
+    )
+    arg_parser.add_argument(
+        "--engine",
+        choices=["ir", "direct"],
+        default="ir",
+        help="convert patterns to IRDL, optimize, and encode the result (ir), or "
+        "encode patterns directly without the IRDL conversion (direct). The "
+        "direct engine does not use the fast paths nor the verdict cache. Only "
+        "the direct engine binds the values the rewrite leaves untouched to "
+        "their matched terms instead of quantifying them again",
+    )
+    arg_parser.add_argument(
+        "--differential",
+        action="store_true",
+        help="also solve each query with the direct engine, and report the "
+        "patterns where both engines disagree",
+    )
+    arg_parser.add_argument(
+        "--unfolding-depth",
+        type=int,
+        default=None,
+        help="maximum number of nested attribute definitions unfolded in a "
+        "query. Deeper constraints only constrain the attribute base, so the "
+        "verdict may be wrong. Unbounded by default",
+    )
+    arg_parser.add_argument(
+        "--dnf-budget",
+        type=int,
+        default=DEFAULT_DNF_BUDGET,
+        help="maximum number of all_of in the disjunctive normal form of an "
+        "all_of distributed over its any_of arguments. Constraints are only "
+        "distributed when it removes a contradiction. 0 disables it",
+    )
+    arg_parser.add_argument(
+        "--samples",
+        type=int,
+        default=0,
+        help="number of small concrete values to evaluate each query on, looking "
+        "for a counterexample before calling the solver. Disabled by default",
+    )
+    arg_parser.add_argument(
+        "--backend",
+        choices=["in-process", "external"],
+        default="in-process",
+        help="solve queries with the z3 Python API, or with external solver "
+        "processes reading SMT-LIB2 files",
+    )
+    arg_parser.add_argument(
+        "--solver-command",
+        type=str,
+        default=None,
+        help="command of the external solver, to which the path of the query is "
+        "appended. Defaults to the z3 binary",
+    )
+    arg_parser.add_argument(
+        "--solver-jobs",
+        type=int,
+        default=1,
+        help="number of external solver processes running in parallel",
+    )
+    arg_parser.add_argument(
+        "--solver-memory-limit",
+        type=int,
+        default=None,
+        help="memory limit in megabytes of each external solver process",
+    )
     args = arg_parser.parse_args()
-
-    # Setup the xDSL context
-    ctx = MLContext()
-    ctx.load_dialect(Builtin)
-    ctx.load_dialect(IRDL)
-    ctx.load_dialect(IRDLExtension)
-    ctx.load_dialect(PDL)
-    ctx.load_dialect(Transfer)
+    if args.portfolio and args.jobs > 1:
+        arg_parser.error("--portfolio cannot be combined with -j")
+    if args.portfolio and args.backend == "external":
+        arg_parser.error("--portfolio cannot be combined with --backend external")
+    if args.engine == "direct" and (args.differential or args.compare_encodings):
+        arg_parser.error("--differential and --compare-encodings require the IR engine")
 
     # Parse the input program
+    ctx = create_context()
     with open(args.input_file) as f:
         all_patterns_program = Parser(ctx, f.read()).parse_module()
+    pattern_ops = [op for op in all_patterns_program.ops if isinstance(op, PatternOp)]
 
-    # Parse the IRDL program
-    with open(args.irdl_file) as f:
-        irdl_program = Parser(ctx, f.read()).parse_module()
+    # The string literals of the patterns, needed by the bounded encoding when
+    # the attribute datatype is shared by all patterns.
+    string_literals = get_string_literals(all_patterns_program)
 
-    has_broken_pattern = False
-    for pattern_op in (
-        op for op in all_patterns_program.ops if isinstance(op, PatternOp)
-    ):
-        print("Pattern ", pattern_op.sym_name)
-        program = ModuleOp([pattern_op.clone()])
+    if args.jobs > 1:
+        # Each worker has its own xDSL context and z3 context, and parses the
+        # IRDL program once. Patterns are sent in their textual form, and the
+        # results are received in the original pattern order.
+        patterns = [str(ModuleOp([op.clone()])) for op in pattern_ops]
+        pool = multiprocessing.get_context("spawn").Pool(
+            args.jobs, initializer=_init_worker, initargs=(args, string_literals)
+        )
+        with pool:
+            results = pool.imap(_check_in_worker, patterns)
+            pattern_results = list(print_results(results))
+    else:
+        checker = PatternChecker(args, string_literals)
+        results = checker.check_all(pattern_ops)
+        pattern_results = list(print_results(results))
 
-        # Move the IRDL file at the beginning of the program
-        Rewriter.inline_block_at_start(
-            irdl_program.clone().regions[0].block, program.regions[0].block
+    if args.stats_file is not None:
+        with open(args.stats_file, "w") as f:
+            for result in pattern_results:
+                if result.statistics is not None:
+                    result.statistics.write(f)
+
+    if args.compare_encodings:
+        total_quantified_time = sum(r.quantified_time for r in pattern_results)
+        total_quantifier_free_time = sum(
+            r.quantifier_free_time for r in pattern_results
         )
+        if total_quantifier_free_time > 0:
+            print(
+                f"Total encoding time: quantified {total_quantified_time:.3f}s, "
+                f"quantifier-free {total_quantifier_free_time:.3f}s "
+                f"({total_quantified_time / total_quantifier_free_time:.1f}x "
+                "speedup)"
+            )
 
-        PDLToIRDLPass().apply(ctx, program)
-        if args.debug:
-            print("Converted IRDL program before optimization:")
-            print(program)
-        OptimizeIRDL().apply(ctx, program)
-        if args.debug:
-            print("Converted IRDL program after optimization:")
-            print(program)
-        solver = z3.Solver()
-        check_subset_to_z3(program, solver)
+    if args.stats:
+        query_statistics = [
+            r.statistics for r in pattern_results if r.statistics is not None
+        ]
+        num_ops_before = sum(s.num_ops_before_unfolding or 0 for s in query_statistics)
+        num_ops_after = sum(s.num_ops_after_unfolding or 0 for s in query_statistics)
+        print(
+            "Unfolding attribute definitions grew queries from "
+            f"{num_ops_before} to {num_ops_after} operations "
+            f"({sum(s.num_unfolded_definitions for s in query_statistics)} "
+            "definitions unfolded, "
+            f"{sum(s.num_truncated_unfoldings for s in query_statistics)} "
+            "left folded)"
+        )
+        print(
+            "Optimizing queries matched "
+            f"{sum(s.num_optimization_iterations for s in query_statistics)} "
+            "operations and applied "
+            f"{sum(s.num_optimization_rewrites for s in query_statistics)} rewrites"
+        )
+        num_ops_before = sum(
+            s.num_ops_before_optimization or 0 for s in query_statistics
+        )
+        num_ops_after = sum(s.num_ops_after_optimization or 0 for s in query_statistics)
+        print(
+            f"Optimization changed queries from {num_ops_before} to {num_ops_after} "
+            "operations "
+            f"({sum(s.num_dnf_expansions for s in query_statistics)} all_of "
+            "distributed over an any_of, "
+            f"{sum(s.num_dnf_expansions_over_budget for s in query_statistics)} over "
+            f"the budget of {args.dnf_budget})"
+        )
 
-        if args.debug:
-            print("SMT program:")
-            print(solver.to_smt2())
-        if solver.check() == z3.sat:
-            print("sat: PDL rewrite may break IRDL invariants")
-            print("model: ", solver.model())
-            has_broken_pattern = True
-        else:
-            print("unsat: PDL rewrite will not break IRDL invariants")
+        if not args.no_fast_path:
+            num_decided = sum(r.decided_structurally for r in pattern_results)
+            print(
+                f"Structural fast path decided {num_decided} of "
+                f"{len(pattern_results)} queries"
+            )
+        if not args.no_base_analysis:
+            num_decided = sum(r.decided_by_bases for r in pattern_results)
+            print(
+                f"Base analysis decided {num_decided} of {len(pattern_results)} queries"
+            )
+        if args.samples > 0:
+            num_decided = sum(r.decided_by_evaluation for r in pattern_results)
+            print(
+                f"Concrete evaluation decided {num_decided} of {len(pattern_results)} "
+                "queries"
+            )
+
+    if args.differential:
+        num_disagree = sum(r.engines_disagree for r in pattern_results)
+        print(
+            f"Direct engine disagreed on {num_disagree} of {len(pattern_results)} "
+            "queries"
+        )
 
-    if has_broken_pattern:
+    if any(result.may_break_invariants for result in pattern_results):
         print("Some patterns may break IRDL invariants")
         sys.exit(1)
 
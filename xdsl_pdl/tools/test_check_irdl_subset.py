@@ -4,10 +4,13 @@ Check if a group of IRDL variables represent a subset of other IRDL variables.
 
 import argparse
 import sys
+import time
+from pathlib import Path
 import z3
 
 from xdsl.dialects.builtin import (
     Builtin,
+    ModuleOp,
 )
 from xdsl.dialects.func import Func
 from xdsl.dialects.irdl import IRDL
@@ -15,7 +18,74 @@ from xdsl.dialects.irdl import IRDL
 from xdsl.ir import MLContext
 from xdsl.parser import Parser
 from xdsl_pdl.analysis.check_subset_to_z3 import check_subset_to_z3
-from xdsl_pdl.dialects.irdl_extension import IRDLExtension
+from xdsl_pdl.analysis.query_statistics import QueryStatistics, get_solver_statistics
+from xdsl_pdl.analysis.verdict_cache import (
+    CachedVerdict,
+    VerdictCache,
+    default_cache_dir,
+    get_query_key,
+)
+from xdsl_pdl.dialects.irdl_extension import CheckSubsetOp, IRDLExtension
+
+
+def write_statistics(stats_file: str | None, all_statistics: list[QueryStatistics]):
+    if stats_file is None:
+        return
+    with open(stats_file, "w") as f:
+        for statistics in all_statistics:
+            statistics.write(f)
+
+
+def check_query(
+    program: ModuleOp,
+    check_subset: CheckSubsetOp,
+    cache: VerdictCache | None,
+    verbose: bool,
+    statistics: QueryStatistics,
+) -> CachedVerdict:
+    """
+    Check a single `irdl_ext.check_subset` query of a program, and fill its
+    statistics.
+    The SMT program is printed if `verbose` is set, even if the verdict is
+    cached, so the output does not depend on the cache.
+    """
+    cache_key = get_query_key(program, {"encoding": "quantified"}, check_subset)
+    cached_verdict = cache.lookup(cache_key) if cache is not None else None
+    if cached_verdict is not None and not verbose:
+        statistics.cached = True
+        statistics.verdict = cached_verdict.result
+        return cached_verdict
+
+    encoding_start = time.perf_counter()
+    solver = z3.Solver()
+    query_info = check_subset_to_z3(program, solver, check_subset=check_subset)
+    statistics.encoding_time = time.perf_counter() - encoding_start
+    statistics.num_quantified_constants = query_info.num_quantified_constants
+    statistics.num_constraints = query_info.num_constraints
+    statistics.num_constructors = query_info.num_constructors
+
+    if verbose:
+        print("SMT program:")
+        print(solver)
+    if cached_verdict is not None:
+        statistics.cached = True
+        statistics.verdict = cached_verdict.result
+        return cached_verdict
+
+    solve_start = time.perf_counter()
+    result = solver.check()
+    statistics.solve_time = time.perf_counter() - solve_start
+    statistics.solver_statistics = get_solver_statistics(solver)
+    if result == z3.sat:
+        verdict = CachedVerdict("sat", str(solver.model()))
+    elif result == z3.unsat:
+        verdict = CachedVerdict("unsat")
+    else:
+        verdict = CachedVerdict("unknown")
+    if cache is not None and result != z3.unknown:
+        cache.store(cache_key, verdict)
+    statistics.verdict = verdict.result
+    return verdict
 
 
 def main():
@@ -25,7 +95,27 @@ def main():
         "subset of other IRDL variables.",
     )
     arg_parser.add_argument(
-        "input_file", type=str, nargs="?", help="path to input file"
+        "input_files",
+        type=str,
+        nargs="*",
+        help="paths to input files. Each file may contain multiple "
+        "irdl_ext.check_subset operations",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        nargs="?",
+        const=default_cache_dir(),
+        default=None,
+        help="read and write the verdicts of queries in an on-disk cache, in this "
+        "directory, or in the user cache directory if none is given",
+    )
+    arg_parser.add_argument(
+        "--stats-file",
+        type=str,
+        default=None,
+        help="write the encoding and solving statistics of each query to this "
+        "file, as one JSON record per line",
     )
     args = arg_parser.parse_args()
 
@@ -36,26 +126,58 @@ def main():
     ctx.load_dialect(IRDL)
     ctx.load_dialect(IRDLExtension)
 
-    # Grab the input program from the command line or a file
-    if args.input_file is None:
-        f = sys.stdin
-    else:
-        f = open(args.input_file)
+    # Grab the input programs from the command line or a file
+    programs: list[tuple[str, ModuleOp]] = []
+    if not args.input_files:
+        programs.append(("<stdin>", Parser(ctx, sys.stdin.read()).parse_module()))
+    for input_file in args.input_files:
+        with open(input_file) as f:
+            programs.append((input_file, Parser(ctx, f.read()).parse_module()))
 
-    #
-    with f:
-        program = Parser(ctx, f.read()).parse_module()
+    queries = [
+        (file_name, index, program, op)
+        for file_name, program in programs
+        for index, op in enumerate(
+            op for op in program.ops if isinstance(op, CheckSubsetOp)
+        )
+    ]
+    if not queries:
+        arg_parser.error("the input has no irdl_ext.check_subset operation")
 
-    solver = z3.Solver()
-    check_subset_to_z3(program, solver)
+    cache = None if args.cache_dir is None else VerdictCache(args.cache_dir)
+    all_statistics = [
+        QueryStatistics(file_name, str(index), "") for file_name, index, _, _ in queries
+    ]
 
-    print("SMT program:")
-    print(solver)
-    if solver.check() == z3.sat:
-        print("sat: lhs is not a subset of rhs")
-        print("model: ", solver.model())
-    else:
-        print("unsat: lhs is a subset of rhs")
+    # A single query is reported with its SMT program and model
+    if len(queries) == 1:
+        _, _, program, check_subset = queries[0]
+        verdict = check_query(program, check_subset, cache, True, all_statistics[0])
+        if verdict.result == "sat":
+            print("sat: lhs is not a subset of rhs")
+            print("model: ", verdict.model)
+        elif verdict.result == "unsat":
+            print("unsat: lhs is a subset of rhs")
+        else:
+            print("unknown: subset check was inconclusive")
+        write_statistics(args.stats_file, all_statistics)
+        return
+
+    # Multiple queries are reported in a table, with one line per query
+    file_width = max([len("file")] + [len(name) for name, _, _, _ in queries])
+    print(f"{'file':<{file_width}}  query  verdict  time")
+    for (file_name, index, program, check_subset), statistics in zip(
+        queries, all_statistics
+    ):
+        start = time.perf_counter()
+        verdict = check_query(program, check_subset, cache, False, statistics)
+        duration = time.perf_counter() - start
+        print(
+            f"{file_name:<{file_width}}  {index:<5}  {verdict.result:<7}  "
+            f"{duration:.3f}s"
+        )
+
+    write_statistics(args.stats_file, all_statistics)
 
 
 if "__main__" == __name__: